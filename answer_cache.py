@@ -0,0 +1,193 @@
+# answer_cache.py
+"""Semantic cache for DocumentSearch answers.
+
+A DocumentSearch call costs one LLM call for the MultiQuery variants, several hybrid retrievals
+and one "stuff" LLM call. The researcher often asks (almost) the same question again, in the
+same run or in the next run on a related topic, so answers are cached:
+
+    1. exact hit:     the normalized question text was asked before
+    2. semantic hit:  cosine(question embedding, cached question embedding) >= threshold
+
+Entries expire after a TTL, the cache is bounded (least recently used entries are evicted first)
+and every entry carries the corpus version it was answered from. When ingestion changes the
+corpus, the old entries stop matching and are deleted.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join(base_dir, "cache", "answers.sqlite"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+def normalize_question(question):
+    """Lower case, collapsed whitespace, no surrounding punctuation."""
+    question = re.sub(r"\s+", " ", str(question).lower()).strip()
+    return question.strip(" ?!.,;:\"'")
+
+
+class SemanticAnswerCache:
+    """Answers of the RAG chain keyed on the question text and on its embedding."""
+
+    def __init__(self, embeddings, corpus_version, path=ANSWER_CACHE_PATH, threshold=ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.corpus_version = str(corpus_version)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                norm_key TEXT NOT NULL,
+                corpus_version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                UNIQUE (norm_key, corpus_version)
+            )""")
+        # corpus changed -> everything answered from the old corpus is invalid
+        self._db.execute("DELETE FROM answers WHERE corpus_version != ?", (self.corpus_version,))
+        self._db.commit()
+
+        # in-memory copy of the question embeddings, one vectorized dot product per lookup
+        self._ids = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._last_id = 0
+        self._sync()
+
+    def _sync(self):
+        """Pulls entries added since the last sync (possibly by other workers) into the matrix."""
+        rows = self._db.execute(
+            "SELECT id, embedding FROM answers WHERE corpus_version = ? AND id > ? ORDER BY id",
+            (self.corpus_version, self._last_id),
+        ).fetchall()
+        if not rows:
+            return
+        vectors = np.stack([np.frombuffer(blob, dtype=np.float16).astype(np.float32) for _, blob in rows])
+        self._matrix = vectors if self._matrix.size == 0 else np.vstack([self._matrix, vectors])
+        self._ids.extend(row_id for row_id, _ in rows)
+        self._last_id = rows[-1][0]
+
+    def _embed(self, question):
+        vec = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _load(self, row_id, question):
+        row = self._db.execute(
+            "SELECT answer, sources, created_at FROM answers WHERE id = ?", (row_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        answer, sources, created_at = row
+        if time.time() - created_at > self.ttl_seconds:
+            self._db.execute("DELETE FROM answers WHERE id = ?", (row_id,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), row_id))
+        self._db.commit()
+        return {
+            "query": question,
+            "result": answer,
+            "source_documents": [Document(page_content=s["page_content"], metadata=s["metadata"]) for s in json.loads(sources)],
+        }
+
+    def lookup(self, question):
+        """Returns a cached RetrievalQA-style result ({'query', 'result', 'source_documents'}) or None."""
+        norm_key = normalize_question(question)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM answers WHERE norm_key = ? AND corpus_version = ?", (norm_key, self.corpus_version)
+            ).fetchone()
+            if row is not None:
+                result = self._load(row[0], question)
+                if result is not None:
+                    self._counters["exact_hits"] += 1
+                    return result
+
+            self._sync()
+
+        if self._matrix.size:
+            query_vec = self._embed(question)
+            with self._lock:
+                scores = self._matrix @ query_vec
+                # best candidates first; expired/evicted rows are skipped
+                for position in np.argsort(scores)[::-1][:5]:
+                    if scores[position] < self.threshold:
+                        break
+                    result = self._load(self._ids[position], question)
+                    if result is not None:
+                        self._counters["semantic_hits"] += 1
+                        return result
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def store(self, question, result):
+        """Stores a RetrievalQA result for `question`."""
+        sources = json.dumps([
+            {"page_content": doc.page_content, "metadata": doc.metadata}
+            for doc in result.get("source_documents", [])
+        ], ensure_ascii=False)
+        embedding = self._embed(question).astype(np.float16).tobytes()
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                """INSERT OR REPLACE INTO answers
+                   (norm_key, corpus_version, question, embedding, answer, sources, created_at, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (normalize_question(question), self.corpus_version, question, embedding,
+                 str(result.get("result", "")), sources, now, now),
+            )
+            self._evict()
+            self._db.commit()
+            self._counters["stores"] += 1
+            self._rebuild_if_needed()
+
+    def _evict(self):
+        self._db.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def _rebuild_if_needed(self):
+        # INSERT OR REPLACE / eviction leave dead rows in the matrix; rebuild when they pile up
+        live = self._db.execute("SELECT COUNT(*) FROM answers WHERE corpus_version = ?", (self.corpus_version,)).fetchone()[0]
+        if len(self._ids) > 2 * max(live, 16):
+            self._ids, self._matrix, self._last_id = [], np.zeros((0, 0), dtype=np.float32), 0
+        self._sync()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["entries"] = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = counters["exact_hits"] + counters["semantic_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["exact_hits"] + counters["semantic_hits"]) / lookups, 4) if lookups else None
+        counters["corpus_version"] = self.corpus_version
+        return counters
@@ -2,17 +2,32 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 from typing import List
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
 import sys
 import os
 import json
+import asyncio
+import uuid
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 try:
-    from workflow import app as agent_graph 
+    # the checkpointed graph: every run can be resumed from its last completed node (checkpoints.py)
+    # compiled on first use, see workflow.get_durable_app()
+    from workflow import get_durable_app
+    from checkpoints import RESUMABLE_STATUSES, get_checkpoint_store
 except ImportError:
-    agent_graph = None
+    get_durable_app = None
+
+try:
+    from resources import registry
+except ImportError:
+    registry = None
+
+from artifacts import get_artifact_store, download_url
+from llm_cache import llm_cache_stats
+from rate_limit import rate_limit_stats
+from metrics import RunMetrics
 
 
     
@@ -27,21 +42,115 @@ class ResearchResponse(BaseModel):
     message: str
     file_path: str | None = None
 
-def research_stream_generator(topic: str):
+# How many research runs one worker carries at the same time. Runs are async (no thread is
+# pinned while waiting on Gemini/Tavily), so this is about API quota and memory, not threads.
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "32"))
+run_slots = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+
+# nodes whose LLM output is streamed token by token ({"token", "node", "call"} events)
+STREAM_TOKEN_NODES = {node.strip() for node in os.getenv("STREAM_TOKEN_NODES", "writer").split(",") if node.strip()}
+
+def _chunk_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    # a list of content blocks
+    return "".join(block if isinstance(block, str) else block.get("text", "") for block in content
+                   if isinstance(block, str) or block.get("type") == "text")
+
+def _token_event(message, metadata):
+    node = metadata.get("langgraph_node")
+    if node not in STREAM_TOKEN_NODES or not isinstance(message, (AIMessage, AIMessageChunk)):
+        return None
+    text = _chunk_text(message.content)
+    if not text:
+        return None
+    # `call` tells concurrent LLM calls of one node apart (the writer patches sections in parallel)
+    return {"token": text, "node": node, "call": message.id}
+
+async def research_stream_generator(topic: str, resume_run_id: str | None = None):
     """
-    It triggers the LangGraph structure. Because this process takes a long time, 
-    it is generally recommended to perform it with BackgroundTasks or asynchronously.
+    It triggers the LangGraph structure asynchronously (agent_graph.astream), so a long run
+    only holds the event loop while it is actually doing work.
+
+    With `resume_run_id` the run continues from its last checkpoint instead of starting over.
     """
-    print(f"🚀 Agent started to work: {topic}")
-    
-    query = HumanMessage(content= topic)
-    inputs = {"messages": [query]}
-    
-    for event in agent_graph.stream(inputs):
-        for node_name, _ in event.items():
-            yield json.dumps({"current_agent": node_name}) + "\n"
-            
-    yield json.dumps({"status": "completed", "file_path": "output/student_number_homeworkname.docx"}) + "\n"
+    if run_slots.locked():
+        yield json.dumps({"status": "queued", "max_concurrent_runs": MAX_CONCURRENT_RUNS}) + "\n"
+
+    async with run_slots:
+        agent_graph = get_durable_app()
+        checkpoint_store = get_checkpoint_store()
+        document_path = None
+        rewrite_iterations = 0
+        if resume_run_id is None:
+            run_id = uuid.uuid4().hex
+            print(f"🚀 Agent started to work: {topic} (run {run_id})")
+            query = HumanMessage(content= topic)
+            inputs = {"messages": [query], "run_id": run_id}
+            await asyncio.to_thread(checkpoint_store.start, run_id, topic)
+            yield json.dumps({"status": "started", "run_id": run_id}) + "\n"
+        else:
+            run_id = resume_run_id
+            snapshot = await agent_graph.aget_state(checkpoint_store.config(run_id))
+            rewrite_iterations = snapshot.values.get("rewriter_counter", 0)
+            print(f"🔁 Agent resumed: {topic} (run {run_id}, next: {', '.join(snapshot.next)})")
+            inputs = None  # None = continue from the checkpoint
+            await asyncio.to_thread(checkpoint_store.start, run_id, topic)
+            yield json.dumps({"status": "resumed", "run_id": run_id, "next": list(snapshot.next)}) + "\n"
+
+        # wall time, tokens, tool and retrieval timings per node (see metrics.py)
+        run_metrics = RunMetrics()
+        
+        try:
+            # "messages" adds the LLM output of the nodes token by token, "updates" the node transitions
+            async for mode, chunk in agent_graph.astream(inputs, config=checkpoint_store.config(run_id, callbacks=[run_metrics]),
+                                                         stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    token_event = _token_event(*chunk)
+                    if token_event:
+                        yield json.dumps(token_event) + "\n"
+                    continue
+
+                for node_name, update in chunk.items():
+                    event = {"current_agent": node_name, "metrics": run_metrics.pop_node(node_name)}
+                    if isinstance(update, dict):
+                        if update.get("document_path"):
+                            document_path = update["document_path"]
+                        rewrite_iterations = update.get("rewriter_counter", rewrite_iterations)
+                        if node_name in STREAM_TOKEN_NODES and update.get("writer_result"):
+                            # the complete draft of this round (patch rounds stream only the rewritten sections)
+                            event["draft"] = update["writer_result"]
+                        if update.get("research_turns"):
+                            event["research_turn"] = update["research_turns"][-1]
+                    yield json.dumps(event) + "\n"
+        except BaseException as e:
+            run_metrics.finish("error", rewrite_iterations)
+            # the checkpoints stay: POST /runs/{run_id}/resume continues after the last completed node
+            error = f"{type(e).__name__}: {e}"
+            if isinstance(e, Exception):
+                await asyncio.to_thread(checkpoint_store.finish, run_id, "failed", error=error)
+            else:
+                # client gone / server stopping: synchronous, a generator closed by GeneratorExit (or a
+                # cancelled task) cannot await anymore
+                checkpoint_store.finish(run_id, "interrupted", error=error)
+            raise
+
+        if document_path is None:
+            await asyncio.to_thread(checkpoint_store.finish, run_id, "failed", error="The report could not be created.")
+            summary = run_metrics.finish("failed", rewrite_iterations)
+            yield json.dumps({"status": "failed", "run_id": run_id, "detail": "The report could not be created.", "metrics": summary}) + "\n"
+            return
+
+        # deletes the run's checkpoints too: off the event loop, like start()
+        await asyncio.to_thread(checkpoint_store.finish, run_id, "completed")
+        name = os.path.basename(document_path)
+        yield json.dumps({
+            "status": "completed",
+            "run_id": run_id,
+            "file_path": document_path,
+            "download_url": download_url(run_id, name),
+            "metrics": run_metrics.finish("completed", rewrite_iterations),
+        }) + "\n"
 
 # --- API (Endpoint) ---
 
@@ -51,9 +160,101 @@ async def start_research_stream(request: ResearchRequest):
     This endpoint initiates the complex Agent workflow. 
     The Agent searches, writes, checks, and produces a .docx file.r.
     """
-    if not agent_graph:
+    if not get_durable_app:
         raise HTTPException(status_code=500, detail="Agent workflow failed to load.")
 
     return StreamingResponse(research_stream_generator(request.topic), media_type = "application/x-ndjson")
-        
-        
\ No newline at end of file
+
+
+@router.get("/runs", summary="Recent runs and whether they can be resumed")
+def list_runs(status: str | None = None):
+    if not get_durable_app:
+        raise HTTPException(status_code=500, detail="Agent workflow failed to load.")
+
+    agent_graph = get_durable_app()
+    checkpoint_store = get_checkpoint_store()
+    runs = checkpoint_store.list(status)
+    for run in runs:
+        run["next"] = list(checkpoint_store.next_nodes(agent_graph, run["run_id"])) if run["status"] != "completed" else []
+    return runs
+
+
+@router.post("/runs/{run_id}/resume", summary="Resumes a failed or interrupted research run")
+async def resume_research_stream(run_id: str, force: bool = False):
+    """
+    Continues the run from its last completed node (the research and drafts done before the failure
+    are not repeated) and streams the same events as /start-research-stream. A run that is still marked
+    as running (its process died without recording it) needs `force=true`.
+    """
+    if not get_durable_app:
+        raise HTTPException(status_code=500, detail="Agent workflow failed to load.")
+
+    checkpoint_store = get_checkpoint_store()
+    run = await asyncio.to_thread(checkpoint_store.get, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found.")
+    if run["status"] not in RESUMABLE_STATUSES and not (force and run["status"] == "running"):
+        raise HTTPException(status_code=409, detail=f"Run is {run['status']}.")
+    if not await asyncio.to_thread(checkpoint_store.next_nodes, get_durable_app(), run_id):
+        raise HTTPException(status_code=409, detail="Run has no checkpoint to resume from.")
+
+    return StreamingResponse(research_stream_generator(run["topic"], resume_run_id=run_id), media_type="application/x-ndjson")
+
+
+@router.post("/warmup", summary="Loads the embedding model, vector db, BM25 and RAG chain now")
+def warmup():
+    """
+    Builds every lazy resource of this worker instead of waiting for the first research request.
+    Returns how long each startup phase took.
+    """
+    if not registry:
+        raise HTTPException(status_code=500, detail="Resource registry failed to load.")
+
+    return registry.warmup()
+
+
+@router.get("/ready", summary="Readiness probe")
+def ready():
+    """Returns 200 when all resources are loaded, 503 otherwise (with the per resource status)."""
+    if not registry:
+        raise HTTPException(status_code=500, detail="Resource registry failed to load.")
+
+    status = registry.status()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+
+@router.get("/cache-stats", summary="Hit/miss counters of the caches in this worker")
+def cache_stats():
+    if not registry:
+        raise HTTPException(status_code=500, detail="Resource registry failed to load.")
+
+    caches = {
+        "embeddings": registry.peek('embedding_model'),
+        "answers": registry.peek('answer_cache'),
+        "search": registry.peek('search_cache'),
+        "rerank": registry.peek('reranker'),
+        "research_memory": registry.peek('research_memory'),
+    }
+    stats = {name: cache.stats() if cache is not None else None for name, cache in caches.items()}
+    stats["llm"] = llm_cache_stats()
+    stats["rate_limit"] = rate_limit_stats()
+    return stats
+
+
+@router.get("/artifacts/{run_id}/{name}", summary="Downloads a report produced by a run")
+def get_artifact(run_id: str, name: str):
+    """Streams the artifact in chunks, so the frontend doesn't need to share a filesystem with the backend."""
+    store = get_artifact_store()
+    try:
+        if not store.exists(run_id, name):
+            raise HTTPException(status_code=404, detail="Artifact not found.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        store.iter_chunks(run_id, name),
+        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
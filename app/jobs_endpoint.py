@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+import sys
+import os
+import json
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from job_queue import TERMINAL_STATUSES, get_job_queue
+
+# The API only talks to the queue (get_job_queue(), opened on the first request).
+# Runs are executed by `python job_queue.py worker` processes.
+
+router = APIRouter()
+
+
+class JobRequest(BaseModel):
+    topic: str
+
+
+def _get_job_or_404(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+
+@router.post("", summary="Submits a research run to the job queue")
+def submit_job(request: JobRequest):
+    queue = get_job_queue()
+    job_id = queue.submit(request.topic)
+    return queue.get(job_id)
+
+
+@router.get("/stats", summary="Queue depth and wait times")
+def job_stats():
+    return get_job_queue().stats()
+
+
+@router.get("/{job_id}", summary="Status of a research job")
+def job_status(job_id: str):
+    return _get_job_or_404(job_id)
+
+
+@router.get("/{job_id}/result", summary="Result of a finished research job")
+def job_result(job_id: str):
+    job = _get_job_or_404(job_id)
+    if job["status"] not in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+    return {"status": job["status"], "result": job["result"], "error": job["error"]}
+
+
+@router.post("/{job_id}/cancel", summary="Cancels a queued or running job")
+def cancel_job(job_id: str):
+    _get_job_or_404(job_id)
+    outcome = get_job_queue().cancel(job_id)
+    if outcome is None:
+        raise HTTPException(status_code=409, detail="Job already finished.")
+    return {"job_id": job_id, "status": outcome}
+
+
+@router.post("/{job_id}/retry", summary="Re-queues a failed or cancelled job")
+def retry_job(job_id: str):
+    """The worker that picks it up continues from the job's last completed node (see checkpoints.py)."""
+    _get_job_or_404(job_id)
+    queue = get_job_queue()
+    if not queue.retry(job_id):
+        raise HTTPException(status_code=409, detail="Only failed or cancelled jobs can be retried.")
+    return queue.get(job_id)
+
+
+async def job_event_stream(job_id: str, after: int, follow: bool):
+    """Replays the event log after `after`, then (with follow) tails it until the job is finished."""
+    queue = get_job_queue()
+    last_seq = after
+    while True:
+        events = await asyncio.to_thread(queue.events, job_id, last_seq)
+        for event in events:
+            last_seq = event["seq"]
+            yield json.dumps(event) + "\n"
+
+        if not follow:
+            return
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job["status"] in TERMINAL_STATUSES and not events:
+            return
+        await asyncio.sleep(1.0)
+
+
+@router.get("/{job_id}/events", summary="NDJSON event log of a job (re-attachable)")
+async def job_events(job_id: str, after: int = 0, follow: bool = True):
+    """
+    Streams the job's events (node transitions, status changes). Pass the last `seq` you saw as
+    `after` to re-attach after a dropped connection without missing or repeating events.
+    """
+    await asyncio.to_thread(_get_job_or_404, job_id)
+    return StreamingResponse(job_event_stream(job_id, after, follow), media_type="application/x-ndjson")
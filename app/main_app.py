@@ -1,7 +1,14 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+import os
+import sys
+import threading
 # router dosyasından 'router' değişkenini 'process_router' adıyla alıyoruz
 from router import router as agent_router
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from metrics import metrics
+
 app = FastAPI(
     title="Autonomous AI Research Agent API",
     description="LangGraph tabanlı araştırma, yazma ve formatlama yapan otonom sistem.",
@@ -11,6 +18,28 @@ app = FastAPI(
 # Endpoint'leri ana uygulamaya dahil et
 app.include_router(agent_router, prefix="/agent", tags=["Research Agent"])
 
+@app.on_event("startup")
+def prune_checkpoints():
+    # checkpoints of runs past CHECKPOINT_RETENTION_HOURS; importing the graph no longer does this
+    try:
+        from checkpoints import prune_old_runs
+    except ImportError:
+        return
+    prune_old_runs()
+
+@app.on_event("startup")
+def warmup_resources():
+    # WARMUP_ON_STARTUP=1 loads the RAG resources in the background so the first request doesn't pay for it.
+    # Without it everything is built lazily on first use (or through POST /agent/events/warmup).
+    if os.getenv("WARMUP_ON_STARTUP") == "1":
+        from resources import registry
+        threading.Thread(target=registry.warmup, daemon=True).start()
+
 @app.get("/")
 def root():
-    return {"message": "Research Agent API is running! Go to /docs to use it."}
\ No newline at end of file
+    return {"message": "Research Agent API is running! Go to /docs to use it."}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # per-node latency / token / tool / retrieval histograms of the runs served by this process
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,7 @@
 from fastapi import APIRouter
 import endpoint
+import jobs_endpoint
 
 router = APIRouter()
-router.include_router(endpoint.router, prefix= "/events",tags = ["events"])
\ No newline at end of file
+router.include_router(endpoint.router, prefix= "/events",tags = ["events"])
+router.include_router(jobs_endpoint.router, prefix= "/jobs",tags = ["jobs"])
\ No newline at end of file
@@ -0,0 +1,129 @@
+# artifacts.py
+"""Per-run artifact storage for generated reports.
+
+Every run writes into its own folder, so concurrent runs can no longer overwrite each other:
+
+    artifacts/
+        blobs/ab/ab12...ef.docx          content addressed (sha256), stored once
+        runs/<run_id>/<name>             hard link to the blob (a copy if links are not supported)
+        runs/<run_id>/manifest.json      name -> sha256, size, created_at
+
+Identical outputs (e.g. a re-run of the same topic replayed from the caches) share one blob.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+ARTIFACTS_PATH = os.getenv("ARTIFACTS_PATH", os.path.join(base_dir, "artifacts"))
+CHUNK_SIZE = 64 * 1024
+# where app/endpoint.py serves artifacts (GET <prefix>/<run_id>/<name>)
+ARTIFACT_URL_PREFIX = "/agent/events/artifacts"
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.\-]*$")
+
+
+def _check_name(value, what):
+    if not value or not _SAFE_NAME.match(value) or ".." in value:
+        raise ValueError(f"Invalid {what}: {value!r}")
+    return value
+
+
+class ArtifactStore:
+
+    def __init__(self, root=ARTIFACTS_PATH):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.run_dir = os.path.join(root, "runs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    def path(self, run_id, name):
+        return os.path.join(self.run_dir, _check_name(run_id, "run id"), _check_name(name, "artifact name"))
+
+    def exists(self, run_id, name):
+        return os.path.exists(self.path(run_id, name))
+
+    def put_file(self, run_id, name, src_path):
+        """Moves `src_path` into the store as artifact `name` of `run_id`. Returns the run-scoped path."""
+        digest = hashlib.sha256()
+        with open(src_path, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+
+        blob_path = os.path.join(self.blob_dir, sha256[:2], sha256 + os.path.splitext(name)[1])
+        if os.path.exists(blob_path):
+            os.remove(src_path)  # dedupe: same bytes already stored
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            shutil.move(src_path, blob_path)
+
+        target = self.path(run_id, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(blob_path, target)
+        except OSError:
+            shutil.copyfile(blob_path, target)
+
+        self._update_manifest(run_id, name, {
+            "sha256": sha256,
+            "size": os.path.getsize(blob_path),
+            "created_at": time.time(),
+        })
+        return target
+
+    def put_bytes(self, run_id, name, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=os.path.splitext(name)[1])
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return self.put_file(run_id, name, tmp_path)
+
+    def new_temp_path(self, suffix=""):
+        """A temp file on the same filesystem as the store (so put_file is a rename, not a copy)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=suffix)
+        os.close(fd)
+        return tmp_path
+
+    def _update_manifest(self, run_id, name, entry):
+        manifest_path = os.path.join(self.run_dir, run_id, "manifest.json")
+        manifest = self.manifest(run_id)
+        manifest[name] = entry
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def manifest(self, run_id):
+        manifest_path = os.path.join(self.run_dir, _check_name(run_id, "run id"), "manifest.json")
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def iter_chunks(self, run_id, name, chunk_size=CHUNK_SIZE):
+        """Yields the artifact in chunks (for streaming it over HTTP)."""
+        with open(self.path(run_id, name), 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                yield block
+
+
+def download_url(run_id, name):
+    return f"{ARTIFACT_URL_PREFIX}/{run_id}/{name}"
+
+
+artifact_store = None
+
+def get_artifact_store():
+    global artifact_store
+    if artifact_store is None:
+        artifact_store = ArtifactStore()
+    return artifact_store
@@ -0,0 +1,219 @@
+# batch_research.py
+"""Runs many research topics in one process, over resources that are loaded once.
+
+    python batch_research.py topics.txt                       # one topic per line, '#' comments
+    python batch_research.py topics.txt --concurrency 8 --out batches/nightly
+    python batch_research.py topics.txt --out batches/nightly # again: only what is not completed yet
+
+The embedding model, BM25, Chroma, the RAG chain and the LLM clients are loaded once (registry.warmup())
+and shared by up to --concurrency graphs running at the same time on one event loop.
+
+Every topic gets a stable run id (<batch>-<hash of the topic>) and runs on the checkpointed graph
+(workflow.durable_app), so re-running the same command skips completed topics and resumes failed or
+interrupted ones from their last completed node. The report of each topic is copied to
+<out>/<nnn>-<slug>.docx, and <out>/summary.json (rewritten after every topic) has the status, latency
+and token usage per topic.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import statistics
+import time
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+
+def read_topics(path):
+    """Topics from a text file (one per line, blank lines and '#' comments skipped), duplicates dropped."""
+    topics = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and line not in topics:
+                topics.append(line)
+    return topics
+
+
+def slugify(text, length=40):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:length].rstrip("-") or "topic"
+
+
+def run_id_for(batch, topic):
+    return f"{batch}-{hashlib.sha256(topic.encode('utf-8')).hexdigest()[:12]}"
+
+
+class BatchSummary:
+    """summary.json of a batch: one entry per topic, written atomically after every change."""
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, "summary.json")
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = {entry["run_id"]: entry for entry in json.load(f)["topics"]}
+
+    def update(self, run_id, **fields):
+        self.entries.setdefault(run_id, {"run_id": run_id}).update(fields)
+        self.save()
+
+    def totals(self):
+        entries = list(self.entries.values())
+        done = [e for e in entries if e.get("status") == "completed"]
+        seconds = [e["seconds"] for e in done if e.get("seconds") is not None]
+        return {
+            "topics": len(entries),
+            "completed": len(done),
+            "failed": sum(1 for e in entries if e.get("status") == "failed"),
+            "p50_seconds": round(statistics.median(seconds), 1) if seconds else None,
+            "max_seconds": round(max(seconds), 1) if seconds else None,
+            "input_tokens": sum(e.get("input_tokens") or 0 for e in entries),
+            "output_tokens": sum(e.get("output_tokens") or 0 for e in entries),
+            "tool_calls": sum(e.get("tool_calls") or 0 for e in entries),
+        }
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"totals": self.totals(), "topics": sorted(self.entries.values(), key=lambda e: e["index"])},
+                      f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+async def run_topic(graph, checkpoint_store, summary, out_dir, index, topic, run_id, slots):
+    from langchain_core.messages import HumanMessage
+
+    from metrics import RunMetrics
+
+    async with slots:
+        inputs = {"messages": [HumanMessage(content=topic)], "run_id": run_id}
+        rewrite_iterations = 0
+        next_nodes = await asyncio.to_thread(checkpoint_store.next_nodes, graph, run_id)
+        if next_nodes:
+            # an earlier attempt of this batch got this far
+            inputs = None
+            snapshot = await graph.aget_state(checkpoint_store.config(run_id))
+            rewrite_iterations = snapshot.values.get("rewriter_counter", 0)
+        else:
+            # an earlier attempt that reached END without a report (or nothing at all): start from an empty
+            # thread, otherwise the topic is appended to the old messages and the old rewrite counter is kept
+            await asyncio.to_thread(checkpoint_store.saver.delete_thread, run_id)
+        print(f"--- BATCH [{index}] {'RESUMED at ' + ', '.join(next_nodes) if next_nodes else 'STARTED'}: {topic[:60]!r} ---")
+        await asyncio.to_thread(checkpoint_store.start, run_id, topic)
+        earlier = dict(summary.entries[run_id]) if next_nodes else {}  # usage of the attempts this one continues
+        summary.update(run_id, status="running", resumed=bool(next_nodes))
+
+        run_metrics = RunMetrics()
+        document_path = None
+        try:
+            async for update in graph.astream(inputs, config=checkpoint_store.config(run_id, callbacks=[run_metrics]),
+                                              stream_mode="updates"):
+                for node_name, values in update.items():
+                    run_metrics.pop_node(node_name)
+                    if isinstance(values, dict):
+                        document_path = values.get("document_path") or document_path
+                        rewrite_iterations = values.get("rewriter_counter", rewrite_iterations)
+        except Exception as e:
+            await asyncio.to_thread(checkpoint_store.finish, run_id, "failed", error=f"{type(e).__name__}: {e}")
+            summary.update(run_id, status="failed", error=f"{type(e).__name__}: {e}",
+                           **_usage(run_metrics.finish("error", rewrite_iterations), earlier))
+            print(f"❌ BATCH [{index}] FAILED: {type(e).__name__}: {e}")
+            return
+        except BaseException as e:
+            # cancelled / shutting down: record it synchronously, an await here could be cancelled itself
+            checkpoint_store.finish(run_id, "interrupted", error=f"{type(e).__name__}: {e}")
+            summary.update(run_id, status="interrupted")
+            raise
+
+        if not document_path:
+            await asyncio.to_thread(checkpoint_store.finish, run_id, "failed", error="The report could not be created.")
+            summary.update(run_id, status="failed", error="The report could not be created.",
+                           **_usage(run_metrics.finish("failed", rewrite_iterations), earlier))
+            return
+
+        report = os.path.join(out_dir, f"{index:03d}-{slugify(topic)}{os.path.splitext(document_path)[1]}")
+        shutil.copyfile(document_path, report)
+        # on completion this also deletes the run's checkpoints, off the event loop the other topics share
+        await asyncio.to_thread(checkpoint_store.finish, run_id, "completed")
+        usage = _usage(run_metrics.finish("completed", rewrite_iterations), earlier)
+        summary.update(run_id, status="completed", error=None, report=report, document_path=document_path, **usage)
+        print(f"✅ BATCH [{index}] COMPLETED in {usage['seconds']:.0f}s "
+              f"({usage['input_tokens']} in / {usage['output_tokens']} out tokens): {report}")
+
+
+USAGE_FIELDS = ("seconds", "llm_calls", "input_tokens", "output_tokens", "tool_calls")
+
+
+def _usage(run_summary, earlier):
+    """This attempt's usage plus that of the earlier attempts it resumes (they are part of the topic's cost)."""
+    usage = {field: round((earlier.get(field) or 0) + run_summary[field], 3) for field in USAGE_FIELDS}
+    usage["rewrite_iterations"] = run_summary["rewrite_iterations"]
+    return usage
+
+
+async def run_batch(topics, out_dir, concurrency=BATCH_CONCURRENCY, batch=None, rerun_failed=True):
+    from checkpoints import get_checkpoint_store
+    from resources import registry
+    from workflow import get_durable_app
+
+    os.makedirs(out_dir, exist_ok=True)
+    batch = batch or slugify(os.path.basename(os.path.abspath(out_dir)), 24)
+    summary = BatchSummary(out_dir)
+    checkpoint_store = get_checkpoint_store()
+    graph = get_durable_app()
+
+    pending = []
+    for index, topic in enumerate(topics, 1):
+        run_id = run_id_for(batch, topic)
+        entry = summary.entries.get(run_id)
+        if entry and entry.get("status") == "completed":
+            continue
+        if entry and entry.get("status") == "failed" and not rerun_failed:
+            continue
+        summary.entries.setdefault(run_id, {"run_id": run_id}).update(index=index, topic=topic, status="pending")
+        pending.append((index, topic, run_id))
+    summary.save()
+    print(f"--- BATCH {batch}: {len(topics)} topics, {len(topics) - len(pending)} already done, "
+          f"{len(pending)} to run with concurrency {concurrency} ---")
+    if not pending:
+        return summary
+
+    start = time.perf_counter()
+    status = await asyncio.to_thread(registry.warmup)
+    print(f"--- BATCH resources loaded in {status['total_seconds']:.1f}s ---")
+
+    slots = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*(
+        run_topic(graph, checkpoint_store, summary, out_dir, index, topic, run_id, slots)
+        for index, topic, run_id in pending
+    ))
+    print(f"--- BATCH {batch} finished in {time.perf_counter() - start:.0f}s ---")
+    return summary
+
+
+def print_summary(summary):
+    print(f"\n{'#':>3}  {'status':<11} {'seconds':>8} {'in tok':>8} {'out tok':>8} {'tools':>5}  topic")
+    for entry in sorted(summary.entries.values(), key=lambda e: e["index"]):
+        seconds = f"{entry['seconds']:.0f}" if entry.get("seconds") is not None else "-"
+        print(f"{entry['index']:>3}  {entry['status']:<11} {seconds:>8} {entry.get('input_tokens', '-'):>8} "
+              f"{entry.get('output_tokens', '-'):>8} {entry.get('tool_calls', '-'):>5}  {entry['topic'][:60]}")
+    print(json.dumps(summary.totals(), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a file of research topics concurrently over shared resources.")
+    parser.add_argument("topics", help="text file, one topic per line")
+    parser.add_argument("--out", help="output folder (default: batches/<topics file name>)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--skip-failed", action="store_true", help="don't retry topics that failed in an earlier run")
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join(base_dir, "batches", os.path.splitext(os.path.basename(args.topics))[0])
+    result = asyncio.run(run_batch(read_topics(args.topics), out_dir, args.concurrency, rerun_failed=not args.skip_failed))
+    print_summary(result)
@@ -0,0 +1,84 @@
+# benchmarks/bm25_bench.py
+"""Startup and per-query latency: BM25Retriever.from_documents vs the memory-mapped BM25 index.
+
+Also checks that both return the same top-k (k=7) for every query.
+
+    python benchmarks/bm25_bench.py [--queries 200]
+"""
+
+import argparse
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_community.retrievers import BM25Retriever
+from bm25_index import build_bm25_index, MmapBM25Retriever
+
+QUERIES = [
+    "How to effectively evaluate the memory module?",
+    "What is the difference between planning and reasoning in LLM agents?",
+    "retrieval augmented generation tool use",
+    "feedback learning from environment",
+    "long-term memory storage and reflection",
+    "task decomposition with chain of thought",
+    "How do augmented language models call external tools?",
+    "memory writing reading management",
+]
+
+
+def timed(fn, repeat=1):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(__file__), "..", "all_chunk_data.pkl"))
+    parser.add_argument("--index", default=None, help="existing index dir (a temporary one is built otherwise)")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.chunks, 'rb') as file:
+        all_chunk = pickle.load(file)
+
+    def build_old():
+        retriever = BM25Retriever.from_documents(all_chunk)
+        retriever.k = 7
+        return retriever
+
+    old, old_startup = timed(build_old, repeat=3)
+
+    index_dir = args.index
+    if index_dir is None:
+        index_dir = tempfile.mkdtemp(prefix="bm25_bench_")
+        _, build_time = timed(lambda: build_bm25_index([d.page_content for d in all_chunk], index_dir))
+        print(f"index build (one-off, ingestion time): {build_time[0] * 1000:.1f} ms")
+
+    new, new_startup = timed(lambda: MmapBM25Retriever.load(index_dir, all_chunk, k=7), repeat=3)
+
+    mismatches = [q for q in QUERIES if old.invoke(q) != new.invoke(q)]
+
+    queries = (QUERIES * (args.queries // len(QUERIES) + 1))[:args.queries]
+    _, old_query = timed(lambda: [old.invoke(q) for q in queries])
+    _, new_query = timed(lambda: [new.invoke(q) for q in queries])
+
+    print(f"chunks: {len(all_chunk)}")
+    print(f"startup  BM25Retriever.from_documents: {statistics.median(old_startup) * 1000:8.1f} ms")
+    print(f"startup  MmapBM25Retriever.load:       {statistics.median(new_startup) * 1000:8.1f} ms")
+    print(f"query    BM25Retriever:                {old_query[0] / len(queries) * 1000:8.3f} ms/query")
+    print(f"query    MmapBM25Retriever:            {new_query[0] / len(queries) * 1000:8.3f} ms/query")
+    print("top-k identical" if not mismatches else f"❌ top-k differs for: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/dense_index_bench.py
+"""Recall and latency of the NumPy DenseIndex (float16 / int8) vs Chroma HNSW, both against exact search.
+
+Uses synthetic normalized vectors of the MiniLM size (384); queries are noisy copies of corpus rows, so
+their neighbourhoods look like real near-duplicate chunks. Chroma runs in an ephemeral in-memory client.
+
+    python benchmarks/dense_index_bench.py [--sizes 865 5000 20000] [--queries 200] [--k 7]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dense_index import DenseIndex, _normalize, build_dense_index
+
+
+def recall(found, exact):
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)]))
+
+
+def per_query_ms(search, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query[None, :])
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def chroma_collection(vectors):
+    import chromadb
+
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(f"bench_{len(vectors)}", metadata={"hnsw:space": "l2"})
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), 5000):
+        collection.add(ids=ids[start:start + 5000], embeddings=vectors[start:start + 5000].tolist())
+    return collection
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[865, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--no-chroma", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>7} {'backend':>8} {'recall@' + str(args.k):>9} {'1 query':>9} {'5 batched':>10} {'disk':>9}")
+    for size in args.sizes:
+        corpus = _normalize(rng.standard_normal((size, args.dim)))
+        picks = rng.integers(0, size, args.queries)
+        queries = _normalize(corpus[picks] + 0.08 * rng.standard_normal((args.queries, args.dim)))
+        exact = np.argsort(-(queries @ corpus.T), axis=1, kind='stable')[:, :args.k]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for dtype in ("float16", "int8"):
+                out = os.path.join(tmp, dtype)
+                build_dense_index(corpus, out, dtype=dtype)
+                index = DenseIndex(out)
+                found, _ = index.search(queries, args.k)
+                single = per_query_ms(lambda q: index.search(q, args.k), queries)
+                batched = per_query_ms(lambda q: index.search(np.repeat(q, 5, axis=0), args.k), queries)
+                disk = sum(os.path.getsize(os.path.join(out, name)) for name in os.listdir(out))
+                print(f"{size:>7} {dtype:>8} {recall(found, exact):>9.3f} {single:>7.2f}ms {batched:>8.2f}ms "
+                      f"{disk / 1024:>7.0f}kB")
+
+        if not args.no_chroma:
+            collection = chroma_collection(corpus)
+            result = collection.query(query_embeddings=queries.tolist(), n_results=args.k)
+            found = [[int(i) for i in ids] for ids in result["ids"]]
+            single = per_query_ms(lambda q: collection.query(query_embeddings=q.tolist(), n_results=args.k), queries)
+            batched = per_query_ms(
+                lambda q: collection.query(query_embeddings=np.repeat(q, 5, axis=0).tolist(), n_results=args.k), queries)
+            print(f"{size:>7} {'chroma':>8} {recall(found, exact):>9.3f} {single:>7.2f}ms {batched:>8.2f}ms {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
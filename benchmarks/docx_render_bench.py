@@ -0,0 +1,58 @@
+# benchmarks/docx_render_bench.py
+"""Native python-docx renderer vs pypandoc.convert_text on the sample reports in output/.
+
+The sample .docx files are turned back into Markdown once (with pandoc), then each report is
+rendered --repeat times by both paths.
+
+    python benchmarks/docx_render_bench.py [--repeat 20]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pypandoc
+from docx_renderer import render_markdown_to_docx
+
+
+def bench(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--samples", default=os.path.join(os.path.dirname(__file__), "..", "output", "*.docx"))
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix="docx_bench_")
+    total_pandoc = total_native = 0.0
+    print(f"{'report':45} {'md chars':>9} {'pandoc ms':>10} {'native ms':>10} {'speedup':>8}")
+    for path in sorted(glob.glob(args.samples)):
+        markdown = pypandoc.convert_file(path, 'md')
+        pandoc_file = os.path.join(out_dir, "pandoc.docx")
+        native_file = os.path.join(out_dir, "native.docx")
+
+        pandoc_time = bench(lambda: pypandoc.convert_text(markdown, 'docx', format='md', outputfile=pandoc_file), args.repeat)
+        native_time = bench(lambda: render_markdown_to_docx(markdown, native_file), args.repeat)
+        total_pandoc += pandoc_time
+        total_native += native_time
+        print(f"{os.path.basename(path)[:45]:45} {len(markdown):9d} {pandoc_time * 1000:10.1f} {native_time * 1000:10.1f} {pandoc_time / native_time:7.1f}x")
+
+    if total_native:
+        print(f"{'total':45} {'':9} {total_pandoc * 1000:10.1f} {total_native * 1000:10.1f} {total_pandoc / total_native:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
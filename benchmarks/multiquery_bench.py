@@ -0,0 +1,89 @@
+# benchmarks/multiquery_bench.py
+"""Retrieval latency of one MultiQuery call: sequential MultiQueryRetriever vs ParallelMultiQueryRetriever.
+
+Both get the same query variants (no LLM involved) and must return the same documents in the same order.
+
+    python benchmarks/multiquery_bench.py [--repeat 20]                 # the real BM25 index + rag_db
+    python benchmarks/multiquery_bench.py --fake-embeddings             # temporary Chroma, hash embeddings
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_classic.retrievers import EnsembleRetriever, MultiQueryRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+from parallel_multiquery import ParallelMultiQueryRetriever
+
+VARIANTS = [
+    "How to effectively evaluate the memory module?",
+    "What methods exist for evaluating memory in LLM agents?",
+    "memory module evaluation metrics",
+    "How is the memory of an agent benchmarked?",
+    "Which experiments assess long-term memory of language agents?",
+]
+
+
+def build_ensemble(fake_embeddings):
+    if not fake_embeddings:
+        from tools import registry
+        return registry.get('ensemble_retriver')
+
+    from langchain_community.vectorstores import Chroma
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from bm25_index import MmapBM25Retriever
+    from chunk_store import load_chunks
+
+    base_dir = os.path.join(os.path.dirname(__file__), "..")
+    docs = load_chunks(os.path.join(base_dir, "chunk_store"))
+    bm25 = MmapBM25Retriever.load(os.path.join(base_dir, "bm25_index"), docs=docs, k=7)
+    vector_db = Chroma.from_texts(
+        [doc.page_content for doc in docs], DeterministicFakeEmbedding(size=384), metadatas=[doc.metadata for doc in docs])
+    dense = vector_db.as_retriever(search_type="similarity", search_kwargs={'k': 7})
+    return EnsembleRetriever(retrievers=[bm25, dense], weights=[0.3, 0.7])
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    ensemble = build_ensemble(args.fake_embeddings)
+    llm = GenericFakeChatModel(messages=iter([]))
+    sequential = MultiQueryRetriever.from_llm(llm=llm, retriever=ensemble)
+    parallel = ParallelMultiQueryRetriever.from_llm(llm=llm, retriever=ensemble)
+    run_manager = CallbackManagerForRetrieverRun.get_noop_manager()
+
+    # warm both paths (first Chroma query, embedding cache)
+    sequential.retrieve_documents(VARIANTS, run_manager)
+    parallel.retrieve_documents(VARIANTS, run_manager)
+
+    seq_docs, seq_time = timed(lambda: sequential.unique_union(sequential.retrieve_documents(VARIANTS, run_manager)), args.repeat)
+    par_docs, par_time = timed(lambda: parallel.unique_union(parallel.retrieve_documents(VARIANTS, run_manager)), args.repeat)
+
+    identical = [(d.page_content, d.metadata) for d in seq_docs] == [(d.page_content, d.metadata) for d in par_docs]
+    print(f"variants: {len(VARIANTS)}  documents: {len(seq_docs)}  identical: {identical}")
+    print(f"sequential  {seq_time * 1000:8.1f} ms")
+    print(f"parallel    {par_time * 1000:8.1f} ms  ({seq_time / par_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
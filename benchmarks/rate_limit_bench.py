@@ -0,0 +1,114 @@
+# benchmarks/rate_limit_bench.py
+"""Concurrent fake research runs against a local fake provider with a hard quota, with and without
+the rate limiter of rate_limit.py.
+
+The fake provider (tests/fake_provider.py, also used by tests/test_rate_limit.py) allows
+--provider-rps requests per second and --provider-tpm tokens per minute (sliding windows) and answers
+anything above that with a 429, as Gemini does. Every fake run is a
+small LangGraph graph making the calls of a research run (researcher rounds, writer, controller),
+so the calls carry their node like in the real graph. Without the scheduler a run fails on its first
+429, as the graphs did; with it calls wait or are retried, and controller calls go before new
+researcher calls.
+
+    python benchmarks/rate_limit_bench.py [--runs 10] [--provider-rps 5] [--provider-tpm 120000]
+    python benchmarks/rate_limit_bench.py --limit-factor 1.5   # scheduler limits above the quota: retries
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import TypedDict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.messages import HumanMessage
+from langgraph.graph import END, StateGraph
+
+import rate_limit
+from rate_limit import RateLimitScheduler
+from tests.fake_provider import FakeGemini, FakeProvider, QuotaExceeded, ScheduledFakeGemini
+
+
+class RunState(TypedDict):
+    rounds: int
+
+
+def fake_run_graph(model, latencies, research_rounds):
+    """researcher x research_rounds -> writer -> controller, each one model call of a growing prompt."""
+
+    def node(name, prompt_tokens):
+        async def call(state):
+            start = time.monotonic()
+            await model.ainvoke([HumanMessage(content="x " * (2 * prompt_tokens))])
+            latencies[name].append(time.monotonic() - start)
+            return {"rounds": state["rounds"] + (name == "researcher")}
+        return call
+
+    graph = StateGraph(RunState)
+    graph.add_node("researcher", node("researcher", 800))
+    graph.add_node("writer", node("writer", 2500))
+    graph.add_node("controller", node("controller", 3000))
+    graph.set_entry_point("researcher")
+    graph.add_conditional_edges(
+        "researcher", lambda state: "researcher" if state["rounds"] < research_rounds else "writer")
+    graph.add_edge("writer", "controller")
+    graph.add_edge("controller", END)
+    return graph.compile()
+
+
+async def bench(scheduled, args):
+    provider = FakeProvider(args.provider_rps, args.provider_tpm, args.latency)
+    model = (ScheduledFakeGemini if scheduled else FakeGemini)(provider=provider)
+    latencies = defaultdict(list)
+    graph = fake_run_graph(model, latencies, args.research_rounds)
+
+    async def run(index):
+        await asyncio.sleep(index * args.stagger)
+        try:
+            await graph.ainvoke({"rounds": 0})
+            return True
+        except QuotaExceeded:
+            return False
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(run(i) for i in range(args.runs)))
+    seconds = time.monotonic() - start
+
+    print(f"\n{'scheduler' if scheduled else 'no scheduler'}: {sum(results)}/{len(results)} runs completed "
+          f"in {seconds:.1f}s, provider served {provider.served} calls and answered {provider.rejected} with 429")
+    for name in ("researcher", "writer", "controller"):
+        samples = latencies[name]
+        if samples:
+            print(f"  {name:<11} {len(samples):>3} calls  p50 {statistics.median(samples):6.2f}s  "
+                  f"max {max(samples):6.2f}s")
+    if scheduled:
+        print(f"  {rate_limit.scheduler.stats()['providers']['fake']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--research-rounds", type=int, default=3)
+    parser.add_argument("--provider-rps", type=float, default=5)
+    parser.add_argument("--provider-tpm", type=float, default=120000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake call")
+    parser.add_argument("--stagger", type=float, default=0.2, help="seconds between run starts")
+    parser.add_argument("--limit-factor", type=float, default=0.9,
+                        help="scheduler limits as a fraction of the provider quota")
+    args = parser.parse_args()
+
+    asyncio.run(bench(False, args))
+    with tempfile.TemporaryDirectory() as tmp:
+        rate_limit.scheduler = RateLimitScheduler(
+            path=os.path.join(tmp, "rate_limit.sqlite"), enabled=True, backoff_seconds=0.5,
+            limits={"fake": (args.provider_rps * args.limit_factor, args.provider_tpm * args.limit_factor)})
+        asyncio.run(bench(True, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# bm25_index.py
+"""On-disk BM25 index built once at ingestion time and memory-mapped at startup.
+
+`BM25Retriever.from_documents` tokenizes and indexes the whole corpus in pure Python every time a
+process starts, and every worker keeps its own copy. This file writes the same BM25Okapi statistics
+(postings, document lengths, IDF) into flat .npy arrays instead. They are opened with
+`np.load(mmap_mode='r')`, so several workers share the same OS pages and startup is O(1).
+
+Scoring reproduces rank_bm25.BM25Okapi (k1=1.5, b=0.75, epsilon=0.25, `text.split()` tokens)
+operation by operation, so the top-k is the same as `bm25_retriver` from tools.py. meta.json records the
+chunk store's corpus_version, so an index built from other chunk texts is detected as stale.
+
+Build it with:
+    python bm25_index.py --chunks chunk_store --out bm25_index
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from typing import Any, Callable, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from chunk_store import load_chunks
+
+FORMAT_VERSION = 1
+
+
+def default_preprocessing_func(text: str) -> List[str]:
+    # same tokenizer as langchain_community.retrievers.bm25
+    return text.split()
+
+
+def build_bm25_index(texts, out_dir, preprocess_func=default_preprocessing_func, k1=1.5, b=0.75, epsilon=0.25,
+                     corpus_version=None):
+    """Tokenizes `texts` and writes the BM25 arrays into `out_dir`. Row i of the index is texts[i]."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    # --- same bookkeeping as BM25Okapi._initialize (dict order matters for the average idf) ---
+    doc_len = []
+    doc_freqs = []
+    nd = {}
+    for text in texts:
+        document = preprocess_func(text)
+        doc_len.append(len(document))
+        frequencies = {}
+        for word in document:
+            frequencies[word] = frequencies.get(word, 0) + 1
+        doc_freqs.append(frequencies)
+        for word in frequencies:
+            nd[word] = nd.get(word, 0) + 1
+
+    corpus_size = len(doc_len)
+    avgdl = sum(doc_len) / corpus_size if corpus_size else 0.0
+
+    # --- same as BM25Okapi._calc_idf ---
+    idf = {}
+    idf_sum = 0
+    negative_idfs = []
+    for word, freq in nd.items():
+        value = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+        idf[word] = value
+        idf_sum += value
+        if value < 0:
+            negative_idfs.append(word)
+    average_idf = idf_sum / len(idf) if idf else 0.0
+    eps = epsilon * average_idf
+    for word in negative_idfs:
+        idf[word] = eps
+
+    # --- flatten into arrays, vocabulary sorted by utf-8 bytes so it can be binary searched ---
+    encoded = sorted((word.encode('utf-8'), word) for word in nd)
+    term_id = {word: i for i, (_, word) in enumerate(encoded)}
+
+    vocab_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    vocab_offsets[1:] = np.cumsum([len(raw) for raw, _ in encoded])
+    vocab_blob = np.frombuffer(b''.join(raw for raw, _ in encoded), dtype=np.uint8)
+
+    postings = [[] for _ in encoded]
+    for doc_id, frequencies in enumerate(doc_freqs):
+        for word, tf in frequencies.items():
+            postings[term_id[word]].append((doc_id, tf))
+
+    term_ptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+    term_ptr[1:] = np.cumsum([len(p) for p in postings])
+    post_docs = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(term_ptr[-1]))
+    post_tf = np.fromiter((tf for p in postings for _, tf in p), dtype=np.int32, count=int(term_ptr[-1]))
+
+    np.save(os.path.join(out_dir, 'vocab_blob.npy'), vocab_blob)
+    np.save(os.path.join(out_dir, 'vocab_offsets.npy'), vocab_offsets)
+    np.save(os.path.join(out_dir, 'term_ptr.npy'), term_ptr)
+    np.save(os.path.join(out_dir, 'post_docs.npy'), post_docs)
+    np.save(os.path.join(out_dir, 'post_tf.npy'), post_tf)
+    np.save(os.path.join(out_dir, 'doc_len.npy'), np.asarray(doc_len, dtype=np.int32))
+    np.save(os.path.join(out_dir, 'idf.npy'), np.asarray([idf[word] for _, word in encoded], dtype=np.float64))
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "corpus_size": corpus_size,
+        "avgdl": avgdl,
+        "k1": k1,
+        "b": b,
+        "epsilon": epsilon,
+        "n_terms": len(encoded),
+        "corpus_version": corpus_version,
+    }
+    # meta.json is written last: its presence means the index is complete.
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class BM25Index:
+    """Read-only view over the arrays written by `build_bm25_index`."""
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format in {index_dir}: {self.meta.get('format_version')}")
+
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode='r')
+
+        self.vocab_blob = load('vocab_blob.npy')
+        self.vocab_offsets = load('vocab_offsets.npy')
+        self.term_ptr = load('term_ptr.npy')
+        self.post_docs = load('post_docs.npy')
+        self.post_tf = load('post_tf.npy')
+        self.doc_len = load('doc_len.npy')
+        self.idf = load('idf.npy')
+
+        self.corpus_size = self.meta["corpus_size"]
+        self.avgdl = self.meta["avgdl"]
+        self.k1 = self.meta["k1"]
+        self.b = self.meta["b"]
+
+    def __len__(self):
+        return self.corpus_size
+
+    @property
+    def corpus_version(self):
+        return self.meta.get("corpus_version")
+
+    def term_id(self, term):
+        """Binary search in the sorted vocabulary. Returns -1 for unknown terms."""
+        raw = term.encode('utf-8')
+        lo, hi = 0, self.meta["n_terms"]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = self.vocab_offsets[mid], self.vocab_offsets[mid + 1]
+            current = self.vocab_blob[start:end].tobytes()
+            if current < raw:
+                lo = mid + 1
+            elif current > raw:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def get_scores(self, query_tokens):
+        """BM25Okapi.get_scores, but only touching the postings of the query terms."""
+        scores = np.zeros(self.corpus_size)
+        for token in query_tokens:  # duplicates count twice, like rank_bm25
+            tid = self.term_id(token)
+            if tid < 0:
+                continue
+            start, end = self.term_ptr[tid], self.term_ptr[tid + 1]
+            docs = np.asarray(self.post_docs[start:end])
+            q_freq = np.asarray(self.post_tf[start:end], dtype=np.float64)
+            doc_len = np.asarray(self.doc_len[docs], dtype=np.float64)
+            # doc ids inside one posting list are unique, so fancy-index += is safe here
+            scores[docs] += self.idf[tid] * (q_freq * (self.k1 + 1) /
+                                             (q_freq + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)))
+        return scores
+
+    def top_n(self, query_tokens, n):
+        """Row ids of the n best documents, same ordering (and tie breaking) as BM25Okapi.get_top_n."""
+        scores = self.get_scores(query_tokens)
+        return np.argsort(scores)[::-1][:n]
+
+
+class MmapBM25Retriever(BaseRetriever):
+    """Drop-in replacement for BM25Retriever backed by a memory-mapped `BM25Index`.
+
+    `docs` only needs `__getitem__`, row i must be the document that was indexed as row i.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: Any
+    docs: Any
+    k: int = 4
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+
+    @classmethod
+    def load(cls, index_dir, docs, **kwargs):
+        return cls(index=BM25Index(index_dir), docs=docs, **kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        processed_query = self.preprocess_func(query)
+        return [self.docs[int(i)] for i in self.index.top_n(processed_query, self.k)]
+
+
+def load_bm25_retriever(index_dir, docs, k=4):
+    """MmapBM25Retriever over `index_dir`, or BM25Retriever.from_documents(docs) when the index is missing
+    or stale (built from another number of chunks, or from another corpus_version than `docs`)."""
+    if os.path.exists(os.path.join(index_dir, 'meta.json')):
+        retriever = MmapBM25Retriever.load(index_dir, docs=docs, k=k)
+        index = retriever.index
+        version = getattr(docs, 'corpus_version', None)
+        if len(index) == len(docs) and index.corpus_version == version:
+            return retriever
+        print(f"⚠️ BM25 index at {index_dir} is stale ({len(index)} chunks, corpus version {index.corpus_version}; "
+              f"chunk store: {len(docs)} chunks, corpus version {version}), rebuilding in memory.")
+
+    from langchain_community.retrievers import BM25Retriever
+
+    retriever = BM25Retriever.from_documents(documents=list(docs))
+    retriever.k = k
+    return retriever
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the memory-mapped BM25 index from the chunk store (or the chunk pickle).")
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--chunks", default=os.path.join(base_dir, "chunk_store"), help="chunk store dir or .pkl file")
+    parser.add_argument("--out", default=os.path.join(base_dir, "bm25_index"))
+    args = parser.parse_args()
+
+    if os.path.isdir(args.chunks):
+        all_chunk = load_chunks(store_dir=args.chunks)
+        texts = list(all_chunk.texts())
+    else:
+        all_chunk = load_chunks(pickle_path=args.chunks)
+        texts = [doc.page_content for doc in all_chunk]
+
+    start = time.perf_counter()
+    meta = build_bm25_index(texts, args.out, corpus_version=getattr(all_chunk, 'corpus_version', None))
+    print(f"✅ BM25 index with {meta['corpus_size']} chunks / {meta['n_terms']} terms written to {args.out} "
+          f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,187 @@
+# checkpoints.py
+"""Durable per-node checkpoints of the research graph in a local SQLite file, keyed by run id.
+
+`workflow.durable_app` is the graph compiled with this checkpointer; the API and the job workers run it
+with thread_id = run_id, so after every node the state is saved. When a run fails (a Gemini timeout in
+the third controller round, a pandoc error, a killed worker) it can be resumed from its last completed
+node instead of redoing the research and the drafts:
+
+    POST /agent/events/runs/{run_id}/resume     streams the rest of an API run
+    POST /agent/jobs/{job_id}/retry             re-queues a failed job; the worker resumes it
+
+A `runs` table next to LangGraph's own tables records topic, status and timestamps of every run.
+Retention:
+    completed runs   checkpoints deleted when the run completes (CHECKPOINT_KEEP_COMPLETED=1 keeps them)
+    everything else  deleted CHECKPOINT_RETENTION_HOURS after the last update (pruned when the API or a
+                     job worker starts, see prune_old_runs(), and by `python checkpoints.py prune`)
+
+    python checkpoints.py list [--status failed]
+    python checkpoints.py prune [--older-than-hours 24]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(base_dir, "checkpoints.sqlite"))
+CHECKPOINT_RETENTION_HOURS = float(os.getenv("CHECKPOINT_RETENTION_HOURS", "72"))
+CHECKPOINT_KEEP_COMPLETED = os.getenv("CHECKPOINT_KEEP_COMPLETED", "0") == "1"
+
+RESUMABLE_STATUSES = ("failed", "interrupted", "cancelled")
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """SqliteSaver whose async methods run the sync ones in a worker thread instead of raising,
+    so one checkpointer serves both app.stream (jobs, notebook) and app.astream (API)."""
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class CheckpointStore:
+    """The checkpointer plus the `runs` bookkeeping table, in one SQLite file."""
+
+    def __init__(self, path=CHECKPOINT_PATH, retention_hours=CHECKPOINT_RETENTION_HOURS,
+                 keep_completed=CHECKPOINT_KEEP_COMPLETED):
+        self.path = path
+        self.retention_hours = retention_hours
+        self.keep_completed = keep_completed
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self.saver = ThreadedSqliteSaver(sqlite3.connect(path, check_same_thread=False, timeout=30))
+        self.saver.setup()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                error TEXT
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated_at)")
+        self._db.commit()
+
+    @staticmethod
+    def config(run_id, **config):
+        """The RunnableConfig that makes durable_app checkpoint under `run_id`."""
+        config.setdefault("configurable", {})["thread_id"] = run_id
+        return config
+
+    def start(self, run_id, topic):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """INSERT INTO runs (run_id, topic, status, created_at, updated_at) VALUES (?, ?, 'running', ?, ?)
+                   ON CONFLICT (run_id) DO UPDATE SET status = 'running', updated_at = excluded.updated_at,
+                   attempts = attempts + 1, error = NULL""",
+                (run_id, topic, now, now),
+            )
+            self._db.commit()
+
+    def finish(self, run_id, status, error=None):
+        """Records the outcome; a completed run's checkpoints are deleted unless keep_completed."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE runs SET status = ?, updated_at = ?, error = ? WHERE run_id = ?",
+                (status, time.time(), error, run_id),
+            )
+            self._db.commit()
+        if status == "completed" and not self.keep_completed:
+            self.saver.delete_thread(run_id)
+
+    def get(self, run_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        query, args = "SELECT * FROM runs", ()
+        if status:
+            query, args = query + " WHERE status = ?", (status,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY updated_at DESC LIMIT ?", args + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def next_nodes(self, graph, run_id):
+        """The nodes a resume would run next; () when there is no checkpoint or the run already finished."""
+        snapshot = graph.get_state(self.config(run_id))
+        return tuple(snapshot.next) if snapshot and snapshot.values else ()
+
+    def prune(self, older_than_hours=None):
+        """Deletes runs (and their checkpoints) not updated for `older_than_hours`; returns how many."""
+        hours = self.retention_hours if older_than_hours is None else older_than_hours
+        cutoff = time.time() - hours * 3600
+        with self._lock:
+            run_ids = [row[0] for row in self._db.execute("SELECT run_id FROM runs WHERE updated_at < ?", (cutoff,))]
+        for run_id in run_ids:
+            self.saver.delete_thread(run_id)
+        with self._lock:
+            self._db.executemany("DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+            self._db.commit()
+        return len(run_ids)
+
+
+checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+def get_checkpoint_store():
+    """The process wide store. Opening it doesn't prune: a notebook or a batch must not delete
+    the runs of other processes as a side effect."""
+    global checkpoint_store
+    with _checkpoint_store_lock:
+        if checkpoint_store is None:
+            checkpoint_store = CheckpointStore()
+    return checkpoint_store
+
+
+def prune_old_runs():
+    """Prunes runs past the retention; called once when the API or a job worker starts."""
+    store = get_checkpoint_store()
+    pruned = store.prune()
+    if pruned:
+        print(f"--- CHECKPOINTS: pruned {pruned} runs older than {store.retention_hours}h ---")
+    return pruned
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpointed research runs")
+    parser.add_argument("--db", default=CHECKPOINT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="recent runs and their status")
+    list_parser.add_argument("--status")
+    prune_parser = sub.add_parser("prune", help="delete old runs and their checkpoints")
+    prune_parser.add_argument("--older-than-hours", type=float, default=CHECKPOINT_RETENTION_HOURS)
+    args = parser.parse_args()
+
+    store = CheckpointStore(args.db)
+    if args.command == "list":
+        print(json.dumps(store.list(args.status), indent=2))
+    else:
+        print(f"✅ Pruned {store.prune(args.older_than_hours)} runs")
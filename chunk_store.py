@@ -0,0 +1,149 @@
+# chunk_store.py
+"""Columnar, memory-mapped store for the RAG chunks (replaces loading all_chunk_data.pkl into every process).
+
+Layout of a store directory:
+    text.bin         every chunk's page_content, utf-8, back to back
+    offsets.npy      int64 [N+1], chunk i is text.bin[offsets[i]:offsets[i+1]]
+    source_ids.npy   int32 [N], index into sources.json
+    chunk_index.npy  int32 [N], the 'chunk_index' metadata
+    sources.json     distinct 'source' file names
+    meta.json        chunk count + corpus_version (content hash), written last
+
+Opening a store is O(1): nothing is read until a chunk is asked for, and `Document`s are only
+created for the ids that are actually used (a query touches ~7 of them).
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+
+import numpy as np
+from langchain_core.documents import Document
+
+FORMAT_VERSION = 1
+
+
+def write_chunk_store(documents, out_dir):
+    """Writes `documents` (anything with page_content and source/chunk_index metadata) into `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    sources = []
+    source_lookup = {}
+    offsets = [0]
+    source_ids = []
+    chunk_indexes = []
+    digest = hashlib.sha256()
+
+    with open(os.path.join(out_dir, 'text.bin'), 'wb') as text_file:
+        for doc in documents:
+            raw = doc.page_content.encode('utf-8')
+            text_file.write(raw)
+            offsets.append(offsets[-1] + len(raw))
+
+            source = doc.metadata.get('source', '')
+            if source not in source_lookup:
+                source_lookup[source] = len(sources)
+                sources.append(source)
+            source_ids.append(source_lookup[source])
+            chunk_indexes.append(doc.metadata.get('chunk_index', -1))
+
+            digest.update(source.encode('utf-8'))
+            digest.update(len(raw).to_bytes(8, 'little'))
+            digest.update(raw)
+
+    np.save(os.path.join(out_dir, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(out_dir, 'source_ids.npy'), np.asarray(source_ids, dtype=np.int32))
+    np.save(os.path.join(out_dir, 'chunk_index.npy'), np.asarray(chunk_indexes, dtype=np.int32))
+    with open(os.path.join(out_dir, 'sources.json'), 'w') as f:
+        json.dump(sources, f, ensure_ascii=False, indent=2)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "count": len(source_ids),
+        "corpus_version": digest.hexdigest()[:16],
+    }
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class ChunkStore:
+    """Read-only, list-like view over a chunk store directory. `store[i]` builds the i-th Document."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store format in {store_dir}: {self.meta.get('format_version')}")
+
+        with open(os.path.join(store_dir, 'sources.json')) as f:
+            self.sources = json.load(f)
+
+        self.offsets = np.load(os.path.join(store_dir, 'offsets.npy'), mmap_mode='r')
+        self.source_ids = np.load(os.path.join(store_dir, 'source_ids.npy'), mmap_mode='r')
+        self.chunk_indexes = np.load(os.path.join(store_dir, 'chunk_index.npy'), mmap_mode='r')
+
+        self._text = b''
+        if self.offsets[-1] > 0:  # mmap refuses empty files
+            with open(os.path.join(store_dir, 'text.bin'), 'rb') as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def corpus_version(self):
+        return self.meta["corpus_version"]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def text(self, i):
+        return self._text[int(self.offsets[i]):int(self.offsets[i + 1])].decode('utf-8')
+
+    def metadata(self, i):
+        return {'source': self.sources[self.source_ids[i]], 'chunk_index': int(self.chunk_indexes[i])}
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Document(page_content=self.text(i), metadata=self.metadata(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def texts(self):
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def ids_for_source(self, source):
+        if source not in self.sources:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.asarray(self.source_ids) == self.sources.index(source))
+
+
+def load_chunks(store_dir=None, pickle_path=None):
+    """Opens the chunk store if there is one, otherwise falls back to the old pickle."""
+    if store_dir and os.path.exists(os.path.join(store_dir, 'meta.json')):
+        return ChunkStore(store_dir)
+    with open(pickle_path, 'rb') as file:
+        return pickle.load(file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts the chunk pickle into a memory-mapped chunk store.")
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--chunks", default=os.path.join(base_dir, "all_chunk_data.pkl"))
+    parser.add_argument("--out", default=os.path.join(base_dir, "chunk_store"))
+    args = parser.parse_args()
+
+    with open(args.chunks, 'rb') as file:
+        all_chunk = pickle.load(file)
+    meta = write_chunk_store(all_chunk, args.out)
+    print(f"✅ {meta['count']} chunks written to {args.out} (corpus version {meta['corpus_version']})")
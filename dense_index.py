@@ -0,0 +1,182 @@
+# dense_index.py
+"""Brute-force dense index: normalized chunk embeddings in a memory-mapped float16 / int8 matrix.
+
+The RAG corpus is a few thousand MiniLM vectors. For that size one matrix-vector product is both exact
+and faster than Chroma's client + SQLite + HNSW, and a memory-mapped .npy is shared by all workers.
+
+    vectors.npy     (n, dim) float16, or int8 with a per-row scale in scales.npy
+    chunk_ids.npy   (n,) int32, row -> chunk id in the chunk store
+    meta.json       dtype, dim, model, corpus_version (written last)
+
+Scores are cosine similarities (rows and queries are L2-normalized), the same ranking as Chroma's
+default L2 distance on the (normalized) MiniLM embeddings.
+
+Build it with:
+    python dense_index.py --chunks chunk_store --out dense_index [--dtype int8]
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from chunk_store import load_chunks
+
+FORMAT_VERSION = 1
+BLOCK_ROWS = 16384  # rows converted to float32 at a time while scoring
+# float16 -> float32 conversion costs more than the matmul itself, so indexes up to this size keep their
+# converted blocks in memory (a per-process copy; larger ones convert block by block from the mmap)
+FLOAT32_CACHE_BYTES = int(os.getenv("DENSE_FLOAT32_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def build_dense_index(vectors, out_dir, chunk_ids=None, dtype="float16", model=None, corpus_version=None):
+    """Writes `vectors` (row i = chunk chunk_ids[i], default i) into `out_dir`."""
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"dtype must be float16 or int8, got {dtype!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    normalized = _normalize(vectors)
+    if chunk_ids is None:
+        chunk_ids = np.arange(len(normalized))
+
+    if dtype == "float16":
+        np.save(os.path.join(out_dir, 'vectors.npy'), normalized.astype(np.float16))
+    else:
+        # symmetric per-row quantization: row ~= q * scale
+        scales = np.abs(normalized).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(normalized / scales[:, None]), -127, 127).astype(np.int8)
+        np.save(os.path.join(out_dir, 'vectors.npy'), quantized)
+        np.save(os.path.join(out_dir, 'scales.npy'), scales.astype(np.float32))
+    np.save(os.path.join(out_dir, 'chunk_ids.npy'), np.asarray(chunk_ids, dtype=np.int32))
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "count": int(normalized.shape[0]),
+        "dim": int(normalized.shape[1]) if normalized.size else 0,
+        "dtype": dtype,
+        "model": model,
+        "corpus_version": corpus_version,
+    }
+    # meta.json is written last: its presence means the index is complete.
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class DenseIndex:
+    """Read-only view over the arrays written by `build_dense_index`."""
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dense index format in {index_dir}: {self.meta.get('format_version')}")
+
+        self.vectors = np.load(os.path.join(index_dir, 'vectors.npy'), mmap_mode='r')
+        self.chunk_ids = np.load(os.path.join(index_dir, 'chunk_ids.npy'), mmap_mode='r')
+        self.scales = None
+        if self.meta["dtype"] == "int8":
+            self.scales = np.load(os.path.join(index_dir, 'scales.npy'), mmap_mode='r')
+        self._cache_blocks = self.vectors.shape[0] * self.vectors.shape[1] * 4 <= FLOAT32_CACHE_BYTES
+        self._blocks = {}
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def corpus_version(self):
+        return self.meta.get("corpus_version")
+
+    def scores(self, queries):
+        """(n_queries, n_rows) cosine similarities; one matmul per block of rows."""
+        queries = _normalize(queries)
+        out = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            out[:, start:start + BLOCK_ROWS] = queries @ self._block(start).T
+        return out
+
+    def _block(self, start):
+        """Rows start:start+BLOCK_ROWS as float32 (int8 rows already multiplied by their scale)."""
+        block = self._blocks.get(start)
+        if block is None:
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            if self.scales is not None:
+                block *= self.scales[start:start + BLOCK_ROWS, None]
+            if self._cache_blocks:
+                self._blocks[start] = block
+        return block
+
+    def search(self, queries, k):
+        """Top-k for each query: (chunk ids, scores), both (n_queries, k), best first."""
+        scores = self.scores(queries)
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return np.zeros((scores.shape[0], 0), dtype=np.int64), np.zeros((scores.shape[0], 0), dtype=np.float32)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        rows = np.take_along_axis(top, order, axis=1)
+        return np.asarray(self.chunk_ids)[rows], np.take_along_axis(top_scores, order, axis=1)
+
+
+class DenseRetriever(BaseRetriever):
+    """Drop-in replacement for the Chroma similarity retriever backed by a memory-mapped `DenseIndex`.
+
+    `docs` only needs `__getitem__` (the chunk store), `embeddings` is the query embedding model.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: Any
+    docs: Any
+    embeddings: Any
+    k: int = 4
+
+    @classmethod
+    def load(cls, index_dir, docs, embeddings, **kwargs):
+        return cls(index=DenseIndex(index_dir), docs=docs, embeddings=embeddings, **kwargs)
+
+    def search_by_vectors(self, vectors) -> List[List[Document]]:
+        """One batched search for several query vectors (used by ParallelMultiQueryRetriever)."""
+        ids, _ = self.index.search(vectors, self.k)
+        return [[self.docs[int(i)] for i in row] for row in ids]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_by_vectors([self.embeddings.embed_query(query)])[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the memory-mapped dense index from the chunk store.")
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--chunks", default=os.path.join(base_dir, "chunk_store"), help="chunk store dir")
+    parser.add_argument("--out", default=os.path.join(base_dir, "dense_index"))
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    args = parser.parse_args()
+
+    from embeddings import CachedEmbeddings
+
+    all_chunk = load_chunks(store_dir=args.chunks)
+    embeddings = CachedEmbeddings()  # chunks embedded during ingestion come straight from the cache
+
+    start = time.perf_counter()
+    vectors = embeddings.embed_vectors(list(all_chunk.texts()))
+    meta = build_dense_index(vectors, args.out, dtype=args.dtype, model=embeddings.model_name,
+                             corpus_version=all_chunk.corpus_version)
+    print(f"✅ Dense index with {meta['count']} x {meta['dim']} {meta['dtype']} vectors written to {args.out} "
+          f"in {time.perf_counter() - start:.2f}s")
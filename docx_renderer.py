@@ -0,0 +1,285 @@
+# docx_renderer.py
+"""In-process Markdown -> DOCX renderer (python-docx), used by the formatter node instead of pandoc.
+
+pypandoc.convert_text starts an external pandoc process for every report. This module renders the
+Markdown the writer produces directly:
+
+    blocks   # headings (1-6), paragraphs, bullet and numbered lists (nested by indentation),
+             pipe tables, fenced code blocks, > block quotes, --- horizontal rules
+    inline   **bold**, __bold__, *italic*, _italic_, ***both***, `code`, [links](url)
+
+Anything it does not understand is written as plain paragraph text, so nothing is lost.
+"""
+
+import io
+import re
+
+from docx import Document as DocxDocument
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt, RGBColor
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+BULLET_RE = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+ORDERED_RE = re.compile(r"^(\s*)(\d+)[.)]\s+(.*)$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+HR_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{1,}:?\s*(\|\s*:?-{1,}:?\s*)*\|?\s*$")
+QUOTE_RE = re.compile(r"^\s*>\s?(.*)$")
+SETEXT_RE = re.compile(r"^\s*(=+|-+)\s*$")
+
+# order matters: links and code first (their content is not parsed), then the longest markers
+INLINE_RE = re.compile(
+    r"(?P<code>`[^`]+`)"
+    r"|(?P<link>\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)(?:\s+\"[^\"]*\")?\))"
+    r"|(?P<bolditalic>\*\*\*(?=\S)(?P<bi_text>.+?)(?<=\S)\*\*\*)"
+    r"|(?P<bold>(?P<b_mark>\*\*|__)(?=\S)(?P<b_text>.+?)(?<=\S)(?P=b_mark))"
+    r"|(?P<italic>(?<![\w*])\*(?=\S)(?P<i_text>.+?)(?<=\S)\*(?!\*)|(?<![\w_])_(?=\S)(?P<u_text>.+?)(?<=\S)_(?![\w_]))"
+)
+
+LIST_INDENT = 4  # spaces per nesting level (2 also works, see _list_level)
+
+
+def add_inline(paragraph, text, bold=False, italic=False):
+    """Adds `text` to `paragraph`, turning Markdown emphasis / code / links into runs."""
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > position:
+            _add_run(paragraph, text[position:match.start()], bold, italic)
+
+        if match.group('code'):
+            run = _add_run(paragraph, match.group('code')[1:-1], bold, italic)
+            run.font.name = 'Consolas'
+        elif match.group('link'):
+            _add_hyperlink(paragraph, match.group('link_text'), match.group('link_url'))
+        elif match.group('bolditalic'):
+            add_inline(paragraph, match.group('bi_text'), bold=True, italic=True)
+        elif match.group('bold'):
+            add_inline(paragraph, match.group('b_text'), bold=True, italic=italic)
+        else:
+            add_inline(paragraph, match.group('i_text') or match.group('u_text'), bold=bold, italic=True)
+        position = match.end()
+
+    if position < len(text):
+        _add_run(paragraph, text[position:], bold, italic)
+
+
+def _add_run(paragraph, text, bold, italic):
+    # backslash escapes (\*, \_, ...) are shown without the backslash
+    run = paragraph.add_run(re.sub(r"\\([\\`*_{}\[\]()#+\-.!|>])", r"\1", text))
+    run.bold = bold or None
+    run.italic = italic or None
+    return run
+
+
+def _add_hyperlink(paragraph, text, url):
+    part = paragraph.part
+    r_id = part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('r:id'), r_id)
+    new_run = OxmlElement('w:r')
+    properties = OxmlElement('w:rPr')
+    style = OxmlElement('w:rStyle')
+    style.set(qn('w:val'), 'Hyperlink')
+    properties.append(style)
+    color = OxmlElement('w:color')
+    color.set(qn('w:val'), '0563C1')
+    properties.append(color)
+    underline = OxmlElement('w:u')
+    underline.set(qn('w:val'), 'single')
+    properties.append(underline)
+    new_run.append(properties)
+    text_element = OxmlElement('w:t')
+    text_element.text = text
+    text_element.set(qn('xml:space'), 'preserve')
+    new_run.append(text_element)
+    hyperlink.append(new_run)
+    paragraph._p.append(hyperlink)
+
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip().replace('\\|', '|') for cell in re.split(r"(?<!\\)\|", line)]
+
+
+def _list_level(indent, unit):
+    return min(indent // unit, 2) if unit else 0
+
+
+class MarkdownDocxRenderer:
+
+    def __init__(self):
+        self.document = DocxDocument()
+
+    # --- blocks ---
+
+    def heading(self, level, text):
+        add_inline(self.document.add_heading('', level=level), text)
+
+    def paragraph(self, lines, style=None):
+        text = " ".join(line.strip() for line in lines)
+        if not text:
+            return
+        paragraph = self.document.add_paragraph(style=style)
+        # a Markdown hard line break (two trailing spaces / backslash) is rare in LLM output; ignored
+        add_inline(paragraph, text)
+
+    def list_item(self, ordered, level, number, text):
+        if ordered:
+            # numbers are written as-is: Word's 'List Number' would keep counting across separate lists
+            paragraph = self.document.add_paragraph(style='List Paragraph')
+            paragraph.paragraph_format.left_indent = Pt(18 * (level + 1))
+            paragraph.paragraph_format.first_line_indent = Pt(-14)
+            paragraph.add_run(f"{number}. ")
+        else:
+            style = 'List Bullet' if level == 0 else f'List Bullet {level + 1}'
+            paragraph = self.document.add_paragraph(style=style)
+        add_inline(paragraph, text)
+
+    def table(self, header, rows):
+        columns = max(len(header), *(len(row) for row in rows)) if rows else len(header)
+        table = self.document.add_table(rows=1, cols=columns)
+        table.style = 'Table Grid'
+        for i, cell_text in enumerate(header):
+            add_inline(table.rows[0].cells[i].paragraphs[0], cell_text, bold=True)
+        for row in rows:
+            cells = table.add_row().cells
+            for i, cell_text in enumerate(row[:columns]):
+                add_inline(cells[i].paragraphs[0], cell_text)
+
+    def code_block(self, lines):
+        paragraph = self.document.add_paragraph()
+        run = paragraph.add_run("\n".join(lines))
+        run.font.name = 'Consolas'
+        run.font.size = Pt(9)
+
+    def quote(self, lines):
+        self.paragraph(lines, style='Quote')
+
+    def horizontal_rule(self):
+        paragraph = self.document.add_paragraph()
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = paragraph.add_run("―" * 20)
+        run.font.color.rgb = RGBColor(0x99, 0x99, 0x99)
+
+    # --- parser ---
+
+    def render(self, markdown):
+        lines = markdown.replace('\r\n', '\n').replace('\t', '    ').split('\n')
+        i = 0
+        paragraph_lines = []
+        list_unit = None
+
+        def flush_paragraph():
+            if paragraph_lines:
+                self.paragraph(paragraph_lines)
+                paragraph_lines.clear()
+
+        while i < len(lines):
+            line = lines[i]
+
+            if not line.strip():
+                flush_paragraph()
+                i += 1
+                continue
+
+            if FENCE_RE.match(line):
+                flush_paragraph()
+                fence = FENCE_RE.match(line).group(1)
+                code = []
+                i += 1
+                while i < len(lines) and not lines[i].strip().startswith(fence):
+                    code.append(lines[i])
+                    i += 1
+                self.code_block(code)
+                i += 1
+                continue
+
+            heading = HEADING_RE.match(line)
+            if heading:
+                flush_paragraph()
+                self.heading(len(heading.group(1)), heading.group(2))
+                i += 1
+                continue
+
+            setext = SETEXT_RE.match(line)
+            if setext and paragraph_lines:
+                text = " ".join(l.strip() for l in paragraph_lines)
+                paragraph_lines.clear()
+                self.heading(1 if setext.group(1).startswith('=') else 2, text)
+                i += 1
+                continue
+
+            if HR_RE.match(line) and not paragraph_lines:
+                self.horizontal_rule()
+                i += 1
+                continue
+
+            # pipe table: header row followed by a --- separator row
+            if '|' in line and i + 1 < len(lines) and TABLE_SEPARATOR_RE.match(lines[i + 1]) and '-' in lines[i + 1]:
+                flush_paragraph()
+                header = _split_row(line)
+                rows = []
+                i += 2
+                while i < len(lines) and '|' in lines[i] and lines[i].strip():
+                    rows.append(_split_row(lines[i]))
+                    i += 1
+                self.table(header, rows)
+                continue
+
+            bullet = BULLET_RE.match(line)
+            ordered = ORDERED_RE.match(line)
+            if bullet or ordered:
+                flush_paragraph()
+                indent = len((bullet or ordered).group(1))
+                if indent and list_unit is None:
+                    list_unit = 2 if indent < LIST_INDENT else LIST_INDENT
+                level = _list_level(indent, list_unit)
+                text = bullet.group(2) if bullet else ordered.group(3)
+                i += 1
+                # lazy continuation lines belong to the same item
+                while i < len(lines) and lines[i].strip() and not (
+                        BULLET_RE.match(lines[i]) or ORDERED_RE.match(lines[i]) or HEADING_RE.match(lines[i])
+                        or FENCE_RE.match(lines[i]) or QUOTE_RE.match(lines[i])):
+                    text += " " + lines[i].strip()
+                    i += 1
+                if bullet:
+                    self.list_item(False, level, None, text)
+                else:
+                    self.list_item(True, level, ordered.group(2), text)
+                continue
+
+            quote = QUOTE_RE.match(line)
+            if quote:
+                flush_paragraph()
+                quoted = []
+                while i < len(lines) and QUOTE_RE.match(lines[i]):
+                    quoted.append(QUOTE_RE.match(lines[i]).group(1))
+                    i += 1
+                self.quote(quoted)
+                continue
+
+            paragraph_lines.append(line)
+            i += 1
+
+        flush_paragraph()
+        return self.document
+
+
+def render_markdown_to_docx(markdown, outputfile=None):
+    """Renders Markdown into a .docx. Writes `outputfile` if given, always returns the bytes."""
+    document = MarkdownDocxRenderer().render(markdown)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    data = buffer.getvalue()
+    if outputfile:
+        with open(outputfile, 'wb') as f:
+            f.write(data)
+    return data
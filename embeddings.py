@@ -0,0 +1,138 @@
+# embeddings.py
+"""Content-addressed embedding cache in front of HuggingFaceEmbeddings.
+
+Vectors are keyed by sha256(model name + text), so the same chunk or the same query is only
+encoded once, no matter whether it comes from ingestion or from a DocumentSearch call.
+
+Two tiers:
+    memory  an LRU of float16 vectors (EMBEDDING_CACHE_MEMORY_ITEMS, default 20000)
+    disk    a SQLite table of float16 blobs (EMBEDDING_CACHE_PATH), shared by all workers
+
+Misses are encoded in fixed-size CPU batches (EMBEDDING_BATCH_SIZE, default 32).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(base_dir, "cache", "embeddings.sqlite"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain `Embeddings` that checks memory, then disk, and only encodes what is left."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, cache_path=EMBEDDING_CACHE_PATH,
+                 batch_size=EMBEDDING_BATCH_SIZE, memory_items=EMBEDDING_CACHE_MEMORY_ITEMS, base_embeddings=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.memory_items = memory_items
+        self._base = base_embeddings
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "encoded_batches": 0, "encode_seconds": 0.0}
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @property
+    def base(self):
+        # the sentence-transformers model is only loaded when something actually has to be encoded
+        if self._base is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            self._base = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._base
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _remember(self, key, vec):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def embed_vectors(self, texts) -> np.ndarray:
+        """Same as embed_documents but returns a float32 matrix (one row per text)."""
+        keys = [self.key(text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._counters["memory_hits"] += 1
+
+            missing = list(dict.fromkeys(key for key in keys if key not in found))
+            for start in range(0, len(missing), 500):  # stay under SQLite's variable limit
+                part = missing[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float16)
+                    found[key] = vec
+                    self._remember(key, vec)
+                    self._counters["disk_hits"] += 1
+
+        to_encode = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                to_encode.setdefault(key, text)
+
+        if to_encode:
+            pending = list(to_encode.items())
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                t = time.perf_counter()
+                vectors = self.base.embed_documents([text for _, text in batch])
+                elapsed = time.perf_counter() - t
+
+                rows = []
+                with self._lock:
+                    self._counters["misses"] += len(batch)
+                    self._counters["encoded_batches"] += 1
+                    self._counters["encode_seconds"] += elapsed
+                    for (key, _), vector in zip(batch, vectors):
+                        vec = np.asarray(vector, dtype=np.float16)
+                        found[key] = vec
+                        self._remember(key, vec)
+                        rows.append((key, vec.tobytes(), time.time()))
+                    self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vec, created_at) VALUES (?, ?, ?)", rows)
+                    self._db.commit()
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_vectors(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_vectors([text])[0].tolist()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_items"] = len(self._memory)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["memory_hits"] + counters["disk_hits"]) / lookups, 4) if lookups else None
+        counters["encode_seconds"] = round(counters["encode_seconds"], 4)
+        return counters
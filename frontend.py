@@ -73,7 +73,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-API_URL = "http://127.0.0.1:8000/agent/events/start-research-stream"
+API_BASE = "http://127.0.0.1:8000"
+API_URL = API_BASE + "/agent/events/start-research-stream"
 
 def render_agents(current_node_name=None):
     node = str(current_node_name).lower().strip() if current_node_name else ""
@@ -150,6 +151,11 @@ if st.button("Start Research 🚀", type="primary"):
         st.warning("Please enter a topic.")
     else:
         log_container = st.expander("Detailed Logs", expanded=True)
+        draft_container = st.expander("Live Draft", expanded=True)
+        draft_placeholder = draft_container.empty()
+        # text streamed by the writer in the current round, per LLM call (patch rounds run several calls at once)
+        live_calls = {}
+        round_closed = True
         
         try:
             payload = {"topic": topic}
@@ -160,10 +166,41 @@ if st.button("Start Research 🚀", type="primary"):
                     try:
                         data = json.loads(line.decode('utf-8'))
                         
+                        if "token" in data:
+                            if round_closed:
+                                live_calls = {}
+                                round_closed = False
+                                with agent_placeholder:
+                                    render_agents(data["node"])
+                            live_calls[data["call"]] = live_calls.get(data["call"], "") + data["token"]
+                            draft_placeholder.markdown("\n\n---\n\n".join(live_calls.values()))
+                            continue
+
                         if "current_agent" in data:
                             agent_name = data["current_agent"]
+                            round_closed = True
+
+                            if data.get("draft"):
+                                # the complete draft of the round (a patch round only streamed its sections)
+                                draft_placeholder.markdown(data["draft"])
                             
-                            log_container.write(f"⚙️ Node: `{agent_name}`")
+                            node_metrics = data.get("metrics")
+                            if node_metrics:
+                                llm = node_metrics["llm"]
+                                log_container.write(
+                                    f"⚙️ Node: `{agent_name}` — {node_metrics['seconds']:.1f}s, "
+                                    f"{llm['calls']} LLM calls ({llm['input_tokens']} in / {llm['output_tokens']} out tokens), "
+                                    f"{sum(t['calls'] for t in node_metrics['tools'].values())} tool calls"
+                                )
+                            turn = data.get("research_turn")
+                            if turn:
+                                log_container.write(
+                                    f"🔎 Research turn {turn['turn']}: ~{turn['prompt_tokens']} prompt tokens "
+                                    f"(~{turn['uncompacted_prompt_tokens']} without digests)"
+                                    + (f" — stopped: {turn['stopped']}" if turn.get('stopped') else "")
+                                )
+                            else:
+                                log_container.write(f"⚙️ Node: `{agent_name}`")
                             
                             with agent_placeholder:
                                 render_agents(agent_name)
@@ -174,27 +211,25 @@ if st.button("Start Research 🚀", type="primary"):
                             with agent_placeholder:
                                 render_agents("DONE") 
                             
-                            raw_path = data.get('file_path') 
+                            # the backend streams the report to us, no shared filesystem needed
+                            file_response = requests.get(API_BASE + data["download_url"])
                             
-                            clean_path = raw_path.replace("output/", "").replace("output\\", "")
-                            
-                            final_path = os.path.join("app", clean_path)
-                            
-                            if os.path.exists(final_path):
+                            if file_response.status_code == 200:
                                 st.balloons() 
                                 
-                                with open(final_path, "rb") as file:
-                                    st.download_button(
-                                        label="📥 Download Report (.docx)",
-                                        data=file,
-                                        file_name=os.path.basename(final_path),
-                                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                                    )
+                                st.download_button(
+                                    label="📥 Download Report (.docx)",
+                                    data=file_response.content,
+                                    file_name=os.path.basename(data["download_url"]),
+                                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                                )
                                 
-                                st.code(f"File saved locally at: {final_path}")
+                                st.code(f"Run id: {data['run_id']}")
                             else:
-                                st.error(f"🚨 File path returned ({final_path}), but file not found.")
-                                st.warning("Hint: Check 'homework_agent/app/output' folder.")
+                                st.error(f"🚨 The report of run {data['run_id']} could not be downloaded ({file_response.status_code}).")
+                        
+                        if "status" in data and data["status"] == "failed":
+                            st.error(f"🚨 {data.get('detail', 'Research failed.')}")
                         
                     except json.JSONDecodeError:
                         continue
@@ -0,0 +1,359 @@
+# ingest.py
+"""Incremental PDF ingestion for the RAG database (the importable version of Rag.ipynb).
+
+    python ingest.py                       # ingest Database_for_RAG/ into chunk_store, bm25_index and rag_db
+                                           # (and dense_index, if it was built with `python dense_index.py`)
+    python ingest.py --dry-run             # only show what would change
+    python ingest.py --workers 4
+
+A manifest (ingest_manifest.json) remembers the content hash of every PDF that was ingested.
+On the next run only new or changed PDFs are parsed, chunked and embedded; PDFs that disappeared
+from the folder get their chunks removed from the vector store, the chunk store and the pickle.
+Parsing runs in a process pool because PyMuPDF is CPU bound.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+PDF_DIR = os.path.join(base_dir, "Database_for_RAG")
+CHUNK_STORE_PATH = os.path.join(base_dir, "chunk_store")
+BM25_INDEX_PATH = os.path.join(base_dir, "bm25_index")
+DENSE_INDEX_PATH = os.path.join(base_dir, "dense_index")
+PICKLE_PATH = os.path.join(base_dir, "all_chunk_data.pkl")
+DB_PATH = os.path.join(base_dir, "rag_db")
+MANIFEST_PATH = os.path.join(base_dir, "ingest_manifest.json")
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# These surveys have 2 pages of author lists / table of contents after the title page.
+SKIP_FRONT_PAGES = {
+    "A Survey on the Memory Mechanism of Large Language Model based Agents.pdf",
+    "The Rise and Potential of Large Language Model Based Agents.pdf",
+}
+
+
+#block[0]: The x0 coordinate (the left side of the block).
+#block[1]: The y0 coordinate (the top side of the block).
+#block[2]: The x1 coordinate (the right side of the block).
+#block[3]: The y1 coordinate (the bottom side of the block).
+#block[4]: The actual string of text contained in the block.
+#block[5]: The sequential number of the block on the page.
+#block[6]: The type of the block. 0 = a text block, 1 = an image block
+def get_all_blocks(pdf_path):
+    import fitz
+
+    all_blocks = []
+    try:
+        with fitz.open(pdf_path) as doc:
+            if os.path.basename(doc.name) in SKIP_FRONT_PAGES:
+                doc.delete_pages(from_page = 1, to_page = 2)
+
+            for page in doc:
+                blocks = page.get_text('blocks')
+                for block in blocks:
+                    if block[6] == 0:
+                        block_text = block[4].strip()
+                        all_blocks.append(block_text)
+    except Exception as e:
+        print(e)
+        return []
+    return all_blocks
+
+
+def filter_references(text_blocks: list[str]) -> list[str]:
+
+    REFERENCE_HEADING_REGEX = re.compile(r"^(references|bibliography|works cited)$", re.IGNORECASE)
+
+    clean_blocks = []
+    in_references_section = False
+
+    # everything after the references heading (including the appendix) is dropped
+    for block_text in text_blocks:
+        block_text_clean = block_text.strip()
+        block_text_lower = block_text_clean.lower()
+
+        if in_references_section:
+            continue
+
+        elif REFERENCE_HEADING_REGEX.match(block_text_lower):
+            in_references_section = True
+            continue
+
+        clean_blocks.append(block_text)
+
+    return clean_blocks
+
+
+def filter_noise_and_captions(text_blocks: list[str]) -> list[str]:
+
+    caption_regex = re.compile(r"^(Figure|Fig\.|Table)\s+\d+[:\.]?", re.IGNORECASE)
+
+    header_regex = re.compile(
+        r"^(Published in|Front\. Comput\. Sci\.|arXiv:|https|^\d+$)",
+        re.IGNORECASE
+    )
+
+    noise_regex = re.compile(r"^(\*|†|‡)")
+
+    heading_regex = re.compile(r"^\d+(\.\d+)*\s+[A-Za-z]")
+
+    figure_content_regex = re.compile(
+        r"^(<LM>|<<run:|<<<read:|tennis_balls =|calculate\.py|answer = tennis_balls)",
+        re.IGNORECASE
+    )
+
+    MIN_LENGTH = 25
+
+    final_clean_blocks = []
+
+    for block_text in text_blocks:
+
+        if (header_regex.match(block_text) or
+            noise_regex.match(block_text) or
+            figure_content_regex.match(block_text)):
+            continue
+
+        if caption_regex.match(block_text):
+            continue
+
+        if heading_regex.match(block_text):
+            final_clean_blocks.append(block_text)
+            continue
+
+        if len(block_text) < MIN_LENGTH:
+            continue
+
+        final_clean_blocks.append(block_text)
+
+    return final_clean_blocks
+
+
+def parse_and_chunk_pdf(pdf_path):
+    """Runs in a worker process: PDF -> cleaned text -> list of chunk strings."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    all_blocks = get_all_blocks(pdf_path)
+    main_blocks = filter_references(all_blocks)
+    final_clean_blocks = filter_noise_and_captions(main_blocks)
+    final_text = "\n\n".join(final_clean_blocks)
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        is_separator_regex=False
+    )
+    chunks = [chunk.page_content for chunk in text_splitter.create_documents([final_text])]
+    return os.path.basename(pdf_path), chunks, len(all_blocks)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def plan_changes(pdf_dir, manifest, prune_untracked=False, existing_sources=()):
+    """Compares the folder with the manifest. Returns (to_ingest, to_remove, unchanged, hashes)."""
+    hashes = {}
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith(".pdf"):
+            hashes[name] = file_sha256(os.path.join(pdf_dir, name))
+
+    tracked = manifest.get("files", {})
+    to_ingest = [name for name, sha in hashes.items() if tracked.get(name, {}).get("sha256") != sha]
+    unchanged = [name for name in hashes if name not in to_ingest]
+
+    # Only sources this pipeline ingested before are removed automatically. Chunks that came from
+    # the old notebook (not in the manifest) are kept unless --prune-untracked is given.
+    to_remove = [name for name in tracked if name not in hashes]
+    if prune_untracked:
+        to_remove += [name for name in existing_sources if name not in hashes and name not in tracked]
+    return to_ingest, to_remove, unchanged, hashes
+
+
+def _swap_dir(tmp_dir, final_dir):
+    """Replaces final_dir with tmp_dir. Workers that still mmap the old files keep working (unlinked inodes)."""
+    old_dir = final_dir + ".old"
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    if os.path.exists(final_dir):
+        os.rename(final_dir, old_dir)
+    os.rename(tmp_dir, final_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+
+def ingest(pdf_dir=PDF_DIR, chunk_store_path=CHUNK_STORE_PATH, bm25_index_path=BM25_INDEX_PATH,
+           dense_index_path=DENSE_INDEX_PATH, pickle_path=PICKLE_PATH, db_path=DB_PATH, manifest_path=MANIFEST_PATH,
+           workers=None, dry_run=False, prune_untracked=False, write_pickle=True):
+    from langchain_core.documents import Document
+    from chunk_store import ChunkStore, write_chunk_store
+    from bm25_index import build_bm25_index
+
+    timings = {}
+    start = time.perf_counter()
+
+    manifest = load_manifest(manifest_path)
+    store = ChunkStore(chunk_store_path) if os.path.exists(os.path.join(chunk_store_path, 'meta.json')) else None
+    existing_sources = store.sources if store is not None else []
+
+    to_ingest, to_remove, unchanged, hashes = plan_changes(pdf_dir, manifest, prune_untracked, existing_sources)
+    timings["scan"] = time.perf_counter() - start
+
+    print(f"--- INGEST PLAN: {len(to_ingest)} new/changed, {len(to_remove)} removed, {len(unchanged)} unchanged ---")
+    for name in to_ingest:
+        print(f"  + {name}")
+    for name in to_remove:
+        print(f"  - {name}")
+
+    if dry_run or (not to_ingest and not to_remove):
+        return {"ingested": to_ingest, "removed": to_remove, "unchanged": unchanged, "timings": timings}
+
+    # --- 1. parse + chunk the new/changed PDFs in parallel ---
+    t = time.perf_counter()
+    new_chunks = {}
+    if to_ingest:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths = [os.path.join(pdf_dir, name) for name in to_ingest]
+            for name, chunks, n_blocks in pool.map(parse_and_chunk_pdf, paths):
+                print(f"  parsed {name}: {n_blocks} blocks -> {len(chunks)} chunks")
+                new_chunks[name] = [
+                    Document(page_content=text, metadata={'source': name, 'chunk_index': i})
+                    for i, text in enumerate(chunks)
+                ]
+    timings["parse"] = time.perf_counter() - t
+
+    # --- 2. chunk store: keep the untouched sources' chunks as they are, append the new ones ---
+    t = time.perf_counter()
+    replaced = set(to_ingest) | set(to_remove)
+    kept = [store[i] for i in range(len(store)) if store.sources[store.source_ids[i]] not in replaced] if store else []
+    all_chunk = kept + [doc for name in to_ingest for doc in new_chunks[name]]
+
+    tmp_store = chunk_store_path + ".tmp"
+    if os.path.exists(tmp_store):
+        shutil.rmtree(tmp_store)
+    store_meta = write_chunk_store(all_chunk, tmp_store)
+    _swap_dir(tmp_store, chunk_store_path)
+
+    if write_pickle:
+        with open(pickle_path + ".tmp", "wb") as file:
+            pickle.dump(all_chunk, file)
+        os.replace(pickle_path + ".tmp", pickle_path)
+    timings["chunk_store"] = time.perf_counter() - t
+
+    # --- 3. BM25 is global (idf), so it is rebuilt from the chunk texts; this takes well under a second ---
+    t = time.perf_counter()
+    tmp_index = bm25_index_path + ".tmp"
+    if os.path.exists(tmp_index):
+        shutil.rmtree(tmp_index)
+    build_bm25_index([doc.page_content for doc in all_chunk], tmp_index, corpus_version=store_meta["corpus_version"])
+    _swap_dir(tmp_index, bm25_index_path)
+    timings["bm25"] = time.perf_counter() - t
+
+    # --- 4. vector store: delete vectors of replaced sources, embed only the new chunks ---
+    t = time.perf_counter()
+    from langchain_community.vectorstores import Chroma
+    from embeddings import CachedEmbeddings
+
+    # chunks that were embedded before (e.g. a re-ingested PDF with mostly unchanged text) come from the cache
+    embedding_model = CachedEmbeddings()
+    vector_db = Chroma(
+        persist_directory = db_path,
+        embedding_function = embedding_model
+    )
+    for name in replaced:
+        stale_ids = vector_db.get(where={"source": name})["ids"]
+        if stale_ids:
+            vector_db.delete(ids=stale_ids)
+            print(f"  removed {len(stale_ids)} vectors of {name}")
+
+    documents_to_embed = [doc for name in to_ingest for doc in new_chunks[name]]
+    if documents_to_embed:
+        vector_db.add_documents(documents_to_embed)
+    timings["embed"] = time.perf_counter() - t
+
+    # --- 4b. the NumPy dense index (only if one is in use): every chunk is in the embedding cache by now ---
+    if os.path.exists(os.path.join(dense_index_path, 'meta.json')):
+        t = time.perf_counter()
+        from dense_index import DenseIndex, build_dense_index
+        dtype = DenseIndex(dense_index_path).meta["dtype"]
+        tmp_dense = dense_index_path + ".tmp"
+        if os.path.exists(tmp_dense):
+            shutil.rmtree(tmp_dense)
+        build_dense_index(embedding_model.embed_vectors([doc.page_content for doc in all_chunk]), tmp_dense,
+                          dtype=dtype, model=embedding_model.model_name, corpus_version=store_meta["corpus_version"])
+        _swap_dir(tmp_dense, dense_index_path)
+        timings["dense_index"] = time.perf_counter() - t
+    print(f"   embedding cache: {embedding_model.stats()}")
+
+    # --- 5. manifest last, so a crash above just means the same work is redone next time ---
+    files = manifest.setdefault("files", {})
+    for name in to_remove:
+        files.pop(name, None)
+    for name in to_ingest:
+        files[name] = {"sha256": hashes[name], "chunks": len(new_chunks[name]), "ingested_at": time.time()}
+    manifest["corpus_version"] = store_meta["corpus_version"]
+    save_manifest(manifest, manifest_path)
+
+    timings["total"] = time.perf_counter() - start
+    print(f"✅ Ingestion finished: {len(all_chunk)} chunks, corpus version {store_meta['corpus_version']}")
+    print("   " + ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in timings.items()))
+    return {"ingested": to_ingest, "removed": to_remove, "unchanged": unchanged, "timings": timings}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingests the PDFs into the RAG database.")
+    parser.add_argument("--pdf-dir", default=PDF_DIR)
+    parser.add_argument("--chunk-store", default=CHUNK_STORE_PATH)
+    parser.add_argument("--bm25-index", default=BM25_INDEX_PATH)
+    parser.add_argument("--dense-index", default=DENSE_INDEX_PATH)
+    parser.add_argument("--pickle", default=PICKLE_PATH)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--prune-untracked", action="store_true",
+                        help="also delete chunks of sources that are not in the folder and were never in the manifest")
+    parser.add_argument("--no-pickle", action="store_true", help="don't rewrite all_chunk_data.pkl")
+    args = parser.parse_args()
+
+    ingest(
+        pdf_dir=args.pdf_dir,
+        chunk_store_path=args.chunk_store,
+        bm25_index_path=args.bm25_index,
+        dense_index_path=args.dense_index,
+        pickle_path=args.pickle,
+        db_path=args.db,
+        manifest_path=args.manifest,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        prune_untracked=args.prune_untracked,
+        write_pickle=not args.no_pickle,
+    )
@@ -0,0 +1,431 @@
+# job_queue.py
+"""SQLite backed job queue + worker pool for research runs.
+
+A research run takes minutes. Instead of living inside one streaming HTTP response (where a dropped
+connection throws the work away), the API only submits a job; worker processes pick jobs up,
+run `workflow.durable_app` and append every node transition to an event log that clients can re-attach to.
+
+The job id is the run's checkpoint thread (checkpoints.py): a job that is re-queued after its worker died,
+or retried after a failure, continues from its last completed node.
+
+    python job_queue.py worker --processes 4     # start a pool of workers
+    python job_queue.py stats                    # queue depth / wait times
+
+API processes and worker processes only share the SQLite file (JOB_DB_PATH), so they scale independently.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(base_dir, "jobs.sqlite"))
+# a running job whose worker has not written a heartbeat for this long is considered dead and re-queued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "1800"))
+# workers write the heartbeat of their job this often, from a background thread (also during long nodes)
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "60"))
+# a job whose worker died this many times is failed instead of re-queued again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLost(Exception):
+    """The job was re-queued (or taken over) while this worker was still running it."""
+
+
+class JobQueue:
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # autocommit mode; claim() opens its own IMMEDIATE transaction
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        # one connection shared by the API's threadpool requests; reentrant because methods call each other
+        # (submit -> append_event, claim -> requeue_stale / get)
+        self._lock = threading.RLock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL,
+                worker TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )""")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- API side ---
+
+    def submit(self, topic):
+        with self._lock:
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, topic, status, created_at) VALUES (?, ?, 'queued', ?)",
+                (job_id, topic, time.time()),
+            )
+            self.append_event(job_id, {"status": "queued"})
+            return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["cancel_requested"] = bool(job["cancel_requested"])
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+            now = time.time()
+            job["wait_seconds"] = round((job["started_at"] or now) - job["created_at"], 3)
+            if job["started_at"]:
+                job["run_seconds"] = round((job["finished_at"] or now) - job["started_at"], 3)
+            if job["status"] == "queued":
+                job["queue_position"] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (job["created_at"],)
+                ).fetchone()[0]
+            return job
+
+    def events(self, job_id, after_seq=0):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, created_at, payload FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq),
+            ).fetchall()
+            return [dict(json.loads(row["payload"]), seq=row["seq"], ts=row["created_at"]) for row in rows]
+
+    def cancel(self, job_id):
+        """Queued jobs are cancelled right away; running ones stop after their current node."""
+        with self._lock:
+            now = time.time()
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, cancel_requested = 1 WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            )
+            if cur.rowcount:
+                self.append_event(job_id, {"status": "cancelled"})
+                return "cancelled"
+            cur = self._db.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            )
+            return "cancel_requested" if cur.rowcount else None
+
+    def retry(self, job_id):
+        """Puts a failed / cancelled job back in the queue; the worker resumes it from its checkpoint."""
+        with self._lock:
+            cur = self._db.execute(
+                """UPDATE jobs SET status = 'queued', worker = NULL, finished_at = NULL, cancel_requested = 0,
+                   attempts = 0, result = NULL, error = NULL WHERE id = ? AND status IN ('failed', 'cancelled')""",
+                (job_id,),
+            )
+            if cur.rowcount:
+                self.append_event(job_id, {"status": "queued", "retry": True})
+            return bool(cur.rowcount)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            counts = {status: 0 for status in ("queued", "running") + TERMINAL_STATUSES}
+            for row in self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+                counts[row["status"]] = row["n"]
+            oldest = self._db.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            waits = [row[0] for row in self._db.execute(
+                "SELECT started_at - created_at FROM jobs WHERE started_at IS NOT NULL ORDER BY started_at DESC LIMIT 100"
+            )]
+            return {
+                "queue_depth": counts["queued"],
+                "running": counts["running"],
+                "counts": counts,
+                "oldest_queued_seconds": round(now - oldest, 3) if oldest else None,
+                "avg_wait_seconds_last_100": round(sum(waits) / len(waits), 3) if waits else None,
+                "max_wait_seconds_last_100": round(max(waits), 3) if waits else None,
+            }
+
+    # --- worker side ---
+
+    def append_event(self, job_id, payload):
+        with self._lock:
+            # seq is per job; (job_id, seq) is the primary key so concurrent writers can't interleave silently
+            self._db.execute(
+                """INSERT INTO job_events (job_id, seq, created_at, payload)
+                   VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?), ?, ?)""",
+                (job_id, job_id, time.time(), json.dumps(payload, ensure_ascii=False, default=str)),
+            )
+
+    def heartbeat(self, job_id, worker):
+        """Marks `worker` as alive on `job_id`; False when the job is no longer running on it."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND worker = ?",
+                (time.time(), job_id, worker),
+            )
+            return bool(cur.rowcount)
+
+    def claim(self, worker):
+        """Atomically moves the oldest queued job to 'running' and returns it (or None)."""
+        with self._lock:
+            self.requeue_stale()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._db.execute(
+                    """UPDATE jobs SET status = 'running', worker = ?, started_at = COALESCE(started_at, ?),
+                       heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?""",
+                    (worker, now, now, row["id"]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return self.get(row["id"])
+
+    def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        """Puts running jobs whose worker stopped writing heartbeats (crashed / killed) back in the queue,
+        or fails them once they have used up `max_attempts`."""
+        with self._lock:
+            now = time.time()
+            cutoff = now - stale_seconds
+            failed = [row[0] for row in self._db.execute(
+                """UPDATE jobs SET status = 'failed', finished_at = ?, error = ?
+                   WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ? RETURNING id""",
+                (now, f"The worker stopped responding on all {max_attempts} attempts.", cutoff, max_attempts),
+            )]
+            for job_id in failed:
+                self.append_event(job_id, {"status": "failed", "error": "worker lost", "attempts": max_attempts})
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+                (cutoff,),
+            )
+
+    def is_cancel_requested(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return bool(row and row[0])
+
+    def finish(self, job_id, status, result=None, error=None, worker=None):
+        """Records the outcome. With `worker`, only while the job still runs on that worker (a worker whose
+        job was re-queued must not overwrite the new attempt); returns whether it was recorded."""
+        with self._lock:
+            query = "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?"
+            args = (status, time.time(), json.dumps(result, default=str) if result is not None else None, error, job_id)
+            if worker is not None:
+                query, args = query + " AND status = 'running' AND worker = ?", args + (worker,)
+            if not self._db.execute(query, args).rowcount:
+                return False
+            payload = {"status": status}
+            if result is not None:
+                payload.update(result)
+            if error is not None:
+                payload["error"] = error
+            self.append_event(job_id, payload)
+            return True
+
+
+job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """The process wide queue on JOB_DB_PATH, opened on first use (importing the API doesn't create the file)."""
+    global job_queue
+    with _job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue()
+    return job_queue
+
+
+class Heartbeat:
+    """Writes the heartbeat of a running job every `interval` seconds from a background thread (with its own
+    connection), so a long node, e.g. a writer pass or calls waiting for the rate limiter, doesn't look
+    like a dead worker. `lost` is set once the job is no longer running on this worker."""
+
+    def __init__(self, db_path, job_id, worker, interval=JOB_HEARTBEAT_SECONDS):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        queue = JobQueue(self.db_path)
+        try:
+            while not self._stop.wait(self.interval):
+                if not queue.heartbeat(self.job_id, self.worker):
+                    self.lost.set()
+                    return
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(queue, job, graph, heartbeat=None):
+    """Runs one research graph for `job`, logging every node transition as an event.
+    Stops with JobLost after the node during which `heartbeat` found the job taken away."""
+    from langchain_core.messages import HumanMessage
+
+    from artifacts import download_url
+    from checkpoints import get_checkpoint_store
+    from metrics import RunMetrics
+
+    job_id = job["id"]
+    checkpoint_store = get_checkpoint_store()
+    # the job id doubles as the run id, so the report lands in artifacts/runs/<job_id>/
+    # and the checkpoints are stored under it
+    inputs = {"messages": [HumanMessage(content=job["topic"])], "run_id": job_id}
+    final_state = {}
+    next_nodes = checkpoint_store.next_nodes(graph, job_id)
+    if next_nodes:
+        # an earlier attempt got this far: continue after its last completed node
+        inputs = None
+        final_state = dict(graph.get_state(checkpoint_store.config(job_id)).values)
+        queue.append_event(job_id, {"status": "resumed", "next": list(next_nodes)})
+    else:
+        # a retried job whose last attempt reached END without a report: start from an empty thread instead
+        # of appending the topic to the old messages (and keeping the old rewrite counter)
+        checkpoint_store.saver.delete_thread(job_id)
+    checkpoint_store.start(job_id, job["topic"])
+    run_metrics = RunMetrics()
+
+    try:
+        for event in graph.stream(inputs, config=checkpoint_store.config(job_id, callbacks=[run_metrics])):
+            for node_name, update in event.items():
+                queue.append_event(job_id, {"current_agent": node_name, "metrics": run_metrics.pop_node(node_name)})
+                if isinstance(update, dict):
+                    final_state.update(update)
+            if heartbeat is not None and heartbeat.lost.is_set():
+                raise JobLost(job_id)
+            if queue.is_cancel_requested(job_id):
+                raise JobCancelled(job_id)
+    except JobLost:
+        # the run and its checkpoints belong to the worker that has the job now
+        raise
+    except BaseException as e:
+        run_metrics.finish("error", final_state.get("rewriter_counter"))
+        status = "cancelled" if isinstance(e, JobCancelled) else "failed" if isinstance(e, Exception) else "interrupted"
+        checkpoint_store.finish(job_id, status, error=f"{type(e).__name__}: {e}")
+        raise
+
+    document_path = final_state.get("document_path")
+    if not document_path:
+        checkpoint_store.finish(job_id, "failed", error="The report could not be created.")
+        run_metrics.finish("failed", final_state.get("rewriter_counter"))
+        raise RuntimeError("The report could not be created.")
+    checkpoint_store.finish(job_id, "completed")
+    return {
+        "run_id": job_id,
+        "document_path": document_path,
+        "download_url": download_url(job_id, os.path.basename(document_path)),
+        "metrics": run_metrics.finish("completed", final_state.get("rewriter_counter", 0)),
+    }
+
+
+def run_worker(db_path=JOB_DB_PATH, poll_interval=1.0, max_jobs=None):
+    """Worker loop: claim a job, run it, record the outcome. Loads the graph once per process."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(db_path)
+
+    from checkpoints import prune_old_runs
+    from workflow import get_durable_app
+
+    prune_old_runs()
+    graph = get_durable_app()
+
+    print(f"--- JOB WORKER {worker} READY ---")
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        print(f"--- JOB {job['id']} STARTED ({job['topic'][:60]!r}, attempt {job['attempts']}) ---")
+        queue.append_event(job["id"], {"status": "running", "worker": worker, "attempt": job["attempts"]})
+        try:
+            with Heartbeat(db_path, job["id"], worker) as heartbeat:
+                result = run_job(queue, job, graph, heartbeat)
+            queue.finish(job["id"], "completed", result=result, worker=worker)
+        except JobLost:
+            print(f"⚠️ JOB {job['id']} was re-queued while running here, dropped by {worker}")
+        except JobCancelled:
+            queue.finish(job["id"], "cancelled", worker=worker)
+        except Exception as e:
+            traceback.print_exc()
+            queue.finish(job["id"], "failed", error=f"{type(e).__name__}: {e}", worker=worker)
+        print(f"--- JOB {job['id']} FINISHED ---")
+        done += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Research job queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = sub.add_parser("worker", help="run a pool of worker processes")
+    worker_parser.add_argument("--processes", type=int, default=2)
+    worker_parser.add_argument("--db", default=JOB_DB_PATH)
+    worker_parser.add_argument("--poll-interval", type=float, default=1.0)
+
+    stats_parser = sub.add_parser("stats", help="print queue depth and wait times")
+    stats_parser.add_argument("--db", default=JOB_DB_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(JobQueue(args.db).stats(), indent=2))
+    else:
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(args.db, args.poll_interval), daemon=True)
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,97 @@
+# kv_store.py
+"""Small SQLite key/value store with per-entry TTL and size-based LRU eviction.
+
+Used by the caches that only need "bytes in, bytes out" (web search results, LLM responses).
+One file can be shared by several worker processes (WAL mode).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteKV:
+
+    def __init__(self, path, max_bytes=None, default_ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_used REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS kv_last_used ON kv (last_used)")
+        self._db.commit()
+
+    def get(self, key):
+        """Returns the stored bytes, or None if the key is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE kv SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return bytes(value)
+
+    def set(self, key, value, ttl=None):
+        """Stores `value` (bytes or str). `ttl` in seconds overrides the default; None means no expiry."""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO kv (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM kv")
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        if not self.max_bytes:
+            return
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM kv").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # drop least recently used entries until we are back under the limit
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM kv ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._db.executemany("DELETE FROM kv WHERE key = ?", doomed)
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM kv").fetchone()
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes}
@@ -0,0 +1,131 @@
+# llm_cache.py
+"""Prompt-hash memoization for the Gemini chat models (nodes.py and the RAG chain in tools.py).
+
+Plugged in through LangChain's own cache hook (`ChatGoogleGenerativeAI(cache=...)`), so every call
+path (invoke / ainvoke / batch, tool-calling agents, MultiQuery, RetrievalQA) is covered. The key is
+sha256 of the model configuration (model, temperature, bound tools, ...) and the canonical JSON of the
+messages; message ids are not part of it.
+
+LLM_CACHE_MODE
+    record   (default) serve from the cache, call the model on a miss and store the response
+    replay   serve only from the cache; a miss raises LLMCacheMiss (deterministic, offline re-runs)
+    off      no caching
+
+With SEARCH_CACHE_MODE=offline as well, a recorded graph run can be replayed without any network.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from kv_store import SqliteKV
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(base_dir, "cache", "llm.sqlite"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "record")
+
+
+class LLMCacheMiss(LookupError):
+    """Raised in replay mode when a prompt was never recorded."""
+
+
+def _canonical(text):
+    try:
+        return json.dumps(json.loads(text), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    except ValueError:
+        return text
+
+
+def _dump_generations(generations):
+    entries = []
+    for generation in generations:
+        entry = {"text": generation.text, "generation_info": generation.generation_info}
+        if isinstance(generation, ChatGeneration):
+            entry["message"] = message_to_dict(generation.message)
+        entries.append(entry)
+    return json.dumps(entries, ensure_ascii=False, default=str)
+
+
+def _load_generations(data):
+    generations = []
+    for entry in json.loads(data):
+        if "message" in entry:
+            message = messages_from_dict([entry["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=entry["generation_info"]))
+        else:
+            generations.append(Generation(text=entry["text"], generation_info=entry["generation_info"]))
+    return generations
+
+
+def llm_cache_key(prompt, llm_string):
+    digest = hashlib.sha256()
+    digest.update(_canonical(llm_string).encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(_canonical(prompt).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class KVLLMCache(BaseCache):
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES, mode=LLM_CACHE_MODE):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"KVLLMCache mode must be record or replay, got {mode!r}")
+        self.mode = mode
+        self.store = SqliteKV(path, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stored": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def lookup(self, prompt, llm_string):
+        key = llm_cache_key(prompt, llm_string)
+        cached = self.store.get(key)
+        if cached is not None:
+            self._count("hits")
+            return _load_generations(cached)
+
+        self._count("misses")
+        if self.mode == "replay":
+            raise LLMCacheMiss(f"LLM response not in cache (replay mode): {key}")
+        return None
+
+    def update(self, prompt, llm_string, return_val):
+        self.store.set(llm_cache_key(prompt, llm_string), _dump_generations(return_val))
+        self._count("stored")
+
+    def clear(self, **kwargs):
+        self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update(self.store.stats())
+        counters["mode"] = self.mode
+        return counters
+
+
+llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """The process wide cache, or None when LLM_CACHE_MODE=off (pass it as `cache=` to the chat models)."""
+    global llm_cache
+    if LLM_CACHE_MODE == "off":
+        return None
+    with _llm_cache_lock:
+        if llm_cache is None:
+            llm_cache = KVLLMCache()
+    return llm_cache
+
+
+def llm_cache_stats():
+    return llm_cache.stats() if llm_cache is not None else None
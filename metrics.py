@@ -0,0 +1,325 @@
+# metrics.py
+"""Per-node instrumentation of research runs + Prometheus-style aggregates.
+
+`RunMetrics` is a LangChain callback handler; pass it in the graph config
+(`graph.astream(inputs, config={"callbacks": [run_metrics]})`). LangGraph tags every run inside a node
+with the node name (metadata["langgraph_node"]), so LLM calls, tool calls and retriever calls are
+attributed to the node they happened in:
+
+    {"node": "researcher", "seconds": 4.2,
+     "llm": {"calls": 1, "input_tokens": 812, "output_tokens": 64, "seconds": 4.1},
+     "tools": {"tavily_search": {"calls": 2, "errors": 0, "seconds": 1.9}},
+     "retrieval": {"BM25Retriever": {"calls": 1, "seconds": 0.002}}}
+
+`pop_node(name)` hands the stream the metrics of the node invocation it just received an update for.
+Every finished node invocation is also added to the process wide `metrics` registry, which renders the
+Prometheus text format for GET /metrics.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict, deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 10)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(key + (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_label_text(key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.node_seconds = Histogram(
+            "homework_node_duration_seconds", "Wall time of one graph node invocation.", ("node",))
+        self.llm_seconds = Histogram(
+            "homework_llm_call_duration_seconds", "Latency of one LLM call.", ("node",))
+        self.llm_tokens = Counter(
+            "homework_llm_tokens_total", "LLM tokens by node and direction (input/output).", ("node", "direction"))
+        self.llm_call_tokens = Histogram(
+            "homework_llm_call_tokens", "Tokens of one LLM call.", ("node", "direction"), buckets=TOKEN_BUCKETS)
+        self.tool_seconds = Histogram(
+            "homework_tool_duration_seconds", "Latency of one tool call.", ("tool",))
+        self.tool_errors = Counter(
+            "homework_tool_errors_total", "Tool calls that raised.", ("tool",))
+        self.retrieval_seconds = Histogram(
+            "homework_retrieval_duration_seconds", "Latency of one retriever call.", ("retriever",))
+        self.rewrite_iterations = Histogram(
+            "homework_rewrite_iterations", "Writer/controller correction rounds per run.", buckets=COUNT_BUCKETS)
+        self.rate_limit_wait_seconds = Histogram(
+            "homework_rate_limit_wait_seconds", "Time a provider call waited for the rate limiter.", ("provider", "priority"))
+        self.rate_limit_retries = Counter(
+            "homework_rate_limit_retries_total", "Provider calls retried after quota / transient errors.",
+            ("provider", "reason"))
+        self.runs = Counter("homework_runs_total", "Finished research runs by outcome.", ("status",))
+        self.run_seconds = Histogram(
+            "homework_run_duration_seconds", "Wall time of a whole research run.", ("status",))
+
+    def observe_node(self, record):
+        node = record["node"]
+        self.node_seconds.observe(record["seconds"], node=node)
+        for direction in ("input", "output"):
+            self.llm_tokens.inc(record["llm"][f"{direction}_tokens"], node=node, direction=direction)
+
+    def observe_run(self, status, seconds, rewrite_iterations=None):
+        self.runs.inc(status=status)
+        self.run_seconds.observe(seconds, status=status)
+        if rewrite_iterations is not None:
+            self.rewrite_iterations.observe(rewrite_iterations)
+
+    def render(self):
+        lines = []
+        for metric in vars(self).values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def _empty_node(node):
+    return {
+        "node": node,
+        "seconds": None,
+        "llm": {"calls": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0},
+        "tools": {},
+        "retrieval": {},
+    }
+
+
+def _usage(response):
+    """(input, output) tokens of an LLMResult, from the messages' usage_metadata or llm_output."""
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                input_tokens += usage.get('input_tokens', 0)
+                output_tokens += usage.get('output_tokens', 0)
+    if not (input_tokens or output_tokens) and response.llm_output:
+        usage = response.llm_output.get('usage_metadata') or response.llm_output.get('token_usage') or {}
+        input_tokens = usage.get('input_tokens', usage.get('prompt_tokens', 0))
+        output_tokens = usage.get('output_tokens', usage.get('completion_tokens', 0))
+    return input_tokens, output_tokens
+
+
+class RunMetrics(BaseCallbackHandler):
+    """Collects per-node metrics for one graph run (one instance per run)."""
+
+    run_inline = True  # cheap bookkeeping only; keeps callbacks in order under astream
+
+    def __init__(self, registry=metrics):
+        self.registry = registry
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self._open = {}           # run id -> (kind, node, name, start)
+        self._nodes = {}          # run id of a node invocation -> record
+        self._finished = defaultdict(deque)  # node name -> finished records, oldest first
+        self.totals = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "tool_calls": 0}
+
+    # --- bookkeeping ---
+
+    def _start(self, kind, run_id, metadata, name):
+        node = (metadata or {}).get("langgraph_node")
+        with self._lock:
+            self._open[run_id] = (kind, node, name, time.perf_counter())
+
+    def _end(self, run_id):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is None:
+            return None, None, None, None
+        kind, node, name, start = opened
+        return kind, node, name, time.perf_counter() - start
+
+    def _record(self, node):
+        # the record of the node invocation currently open for `node` (LLM/tool calls happen inside it)
+        for record in reversed(list(self._nodes.values())):
+            if record["node"] == node:
+                return record
+        return _empty_node(node)
+
+    # --- graph nodes ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            with self._lock:
+                self._nodes[run_id] = _empty_node(node)
+            self._start("node", run_id, metadata, node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish_node(run_id)
+
+    def _finish_node(self, run_id):
+        with self._lock:
+            if run_id not in self._nodes:
+                return
+        _, node, _, seconds = self._end(run_id)
+        with self._lock:
+            record = self._nodes.pop(run_id)
+            record["seconds"] = round(seconds, 4)
+            record["llm"]["seconds"] = round(record["llm"]["seconds"], 4)
+            self._finished[node].append(record)
+        self.registry.observe_node(record)
+
+    # --- LLM calls ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start("llm", run_id, metadata, None)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start("llm", run_id, metadata, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        _, node, _, seconds = self._end(run_id)
+        if seconds is None:
+            return
+        input_tokens, output_tokens = _usage(response)
+        with self._lock:
+            llm = self._record(node)["llm"]
+            llm["calls"] += 1
+            llm["input_tokens"] += input_tokens
+            llm["output_tokens"] += output_tokens
+            llm["seconds"] += seconds
+            self.totals["llm_calls"] += 1
+            self.totals["input_tokens"] += input_tokens
+            self.totals["output_tokens"] += output_tokens
+        node = node or "-"
+        self.registry.llm_seconds.observe(seconds, node=node)
+        self.registry.llm_call_tokens.observe(input_tokens, node=node, direction="input")
+        self.registry.llm_call_tokens.observe(output_tokens, node=node, direction="output")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    # --- tools ---
+
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs):
+        self._start("tool", run_id, metadata, (serialized or {}).get("name") or kwargs.get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._tool_done(run_id, error=False)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._tool_done(run_id, error=True)
+
+    def _tool_done(self, run_id, error):
+        _, node, name, seconds = self._end(run_id)
+        if seconds is None:
+            return
+        with self._lock:
+            tool = self._record(node)["tools"].setdefault(name, {"calls": 0, "errors": 0, "seconds": 0.0})
+            tool["calls"] += 1
+            tool["errors"] += int(error)
+            tool["seconds"] = round(tool["seconds"] + seconds, 4)
+            self.totals["tool_calls"] += 1
+        self.registry.tool_seconds.observe(seconds, tool=name)
+        if error:
+            self.registry.tool_errors.inc(tool=name)
+
+    # --- retrievers ---
+
+    def on_retriever_start(self, serialized, query, *, run_id, metadata=None, **kwargs):
+        self._start("retriever", run_id, metadata, kwargs.get("name") or (serialized or {}).get("name") or "retriever")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._retrieval_done(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._retrieval_done(run_id)
+
+    def _retrieval_done(self, run_id):
+        _, node, name, seconds = self._end(run_id)
+        if seconds is None:
+            return
+        with self._lock:
+            retrieval = self._record(node)["retrieval"].setdefault(name, {"calls": 0, "seconds": 0.0})
+            retrieval["calls"] += 1
+            retrieval["seconds"] = round(retrieval["seconds"] + seconds, 4)
+        self.registry.retrieval_seconds.observe(seconds, retriever=name)
+
+    # --- for the stream ---
+
+    def pop_node(self, node):
+        """Metrics of the oldest finished, not yet reported invocation of `node` (None if there is none)."""
+        with self._lock:
+            finished = self._finished.get(node)
+            return finished.popleft() if finished else None
+
+    def finish(self, status, rewrite_iterations=None):
+        """Records the run in the aggregates and returns its summary."""
+        seconds = time.perf_counter() - self.started_at
+        self.registry.observe_run(status, seconds, rewrite_iterations)
+        with self._lock:
+            summary = dict(self.totals)
+        summary["seconds"] = round(seconds, 3)
+        summary["rewrite_iterations"] = rewrite_iterations
+        return summary
@@ -1,7 +1,6 @@
 from dotenv import load_dotenv
 load_dotenv()
-from langchain_google_genai import ChatGoogleGenerativeAI
-from tools import tools
+from tools import RateLimitedGemini, tools
 from langchain_core.messages import ToolMessage
 
 #from langgraph.prebuilt import create_react_agent #this is old.
@@ -9,19 +8,115 @@ from langchain.agents import create_agent
 from langgraph.prebuilt import ToolNode
 
 
-llm = ChatGoogleGenerativeAI(model = 'gemini-2.5-flash')
+from llm_cache import get_llm_cache
+
+# responses are memoized by prompt hash (LLM_CACHE_MODE=record|replay|off, see llm_cache.py);
+# calls that miss the cache go through the shared rate limiter (rate_limit.py)
+llm = RateLimitedGemini(model = 'gemini-2.5-flash', cache = get_llm_cache())
 
 llm_with_tools = llm.bind_tools(tools)
 
 tool_node = ToolNode(tools)
 
 from workflow import HomeworkState
+from langchain_core.messages import AIMessage, HumanMessage
+from research_compaction import compact_research, message_tokens, parse_source, researcher_view
+from research_memory import RESEARCH_MEMORY_ENABLED, prior_research_message
+from resources import registry
+import asyncio
+import hashlib
+import os
+import re
+import time
+
+RESEARCH_COMPACTION = os.getenv("RESEARCH_COMPACTION", "1") != "0"
+# hard limits of the researcher -> run_tools loop; when one is reached the research goes to compile_research
+RESEARCH_MAX_TOOL_ROUNDS = int(os.getenv("RESEARCH_MAX_TOOL_ROUNDS", "6"))
+RESEARCH_MAX_TOTAL_TOKENS = int(os.getenv("RESEARCH_MAX_TOTAL_TOKENS", "60000"))
+
+def _topic(messages) -> str:
+    return next((m.content for m in messages if isinstance(m, HumanMessage)), "")
+
+def _prior_research(state: HomeworkState) -> list:
+    """Passages of earlier runs on similar topics (research_memory.py): looked up on the researcher's
+    first turn, then carried in 'prior_research'."""
+    if state.get('prior_research') is not None or not RESEARCH_MEMORY_ENABLED:
+        return state.get('prior_research') or []
+    try:
+        prior = registry.get('research_memory').lookup(_topic(state['messages']))
+    except Exception as e:
+        print(f"⚠️ Research memory unavailable: {type(e).__name__}: {e}")
+        return []
+    print(f"--- RESEARCH MEMORY: {len(prior)} passages from earlier runs ---")
+    return prior
+
+def _researcher_turn(state: HomeworkState, prior: list):
+    """Builds the researcher's next prompt: older tool results as digests (research_compaction.researcher_view),
+    and the prior research right after the topic.
+    Returns (prompt, turn stats, stop reason or None when the loop may go on)."""
+    messages = state['messages']
+    turns = list(state.get('research_turns') or [])
+    tool_rounds = sum(1 for m in messages if isinstance(m, AIMessage) and m.tool_calls)
+    prompt, digested = researcher_view(messages)
+    prior_note = prior_research_message(prior)
+    if prior_note:
+        prompt.insert(1, HumanMessage(content=prior_note))
+    prior_tokens = message_tokens(prompt[1]) if prior_note else 0
+    prompt_tokens = sum(message_tokens(m) for m in prompt)
+    used_tokens = sum(t['prompt_tokens'] + t['output_tokens'] for t in turns)
+
+    stop = None
+    if tool_rounds >= RESEARCH_MAX_TOOL_ROUNDS:
+        stop = f"{tool_rounds} tool rounds (RESEARCH_MAX_TOOL_ROUNDS)"
+    elif used_tokens + prompt_tokens > RESEARCH_MAX_TOTAL_TOKENS:
+        stop = f"{used_tokens} tokens used, next prompt ~{prompt_tokens} (RESEARCH_MAX_TOTAL_TOKENS)"
+
+    turn = {
+        'turn': len(turns) + 1,
+        'tool_rounds': tool_rounds,
+        'prompt_tokens': prompt_tokens,
+        'uncompacted_prompt_tokens': sum(message_tokens(m) for m in messages) + prior_tokens,
+        'digested_results': digested,
+        'memory_passages': len(prior),
+        'output_tokens': 0,
+        'tool_calls': 0,
+        'seconds': 0.0,
+    }
+    return prompt, turn, stop
+
+def _researcher_result(state: HomeworkState, turn: dict, prior: list, response, start: float, stop=None) -> HomeworkState:
+    if stop:
+        turn['stopped'] = stop
+        turn['prompt_tokens'] = 0  # nothing was sent
+        print(f"--- RESEARCHER STOPPED: {stop} ---")
+    else:
+        usage = getattr(response, 'usage_metadata', None) or {}
+        turn['prompt_tokens'] = usage.get('input_tokens') or turn['prompt_tokens']
+        turn['output_tokens'] = _output_tokens(response)
+        turn['tool_calls'] = len(response.tool_calls or [])
+        turn['seconds'] = round(time.perf_counter() - start, 3)
+        print(f"--- RESEARCHER turn {turn['turn']}: {turn['prompt_tokens']} prompt tokens "
+              f"(~{turn['uncompacted_prompt_tokens']} without digests, {turn['digested_results']} results digested), "
+              f"{turn['tool_calls']} tool calls ---")
+    turns = list(state.get('research_turns') or [])
+    return {'messages': [response], 'research_turns': turns + [turn], 'prior_research': prior}
+
 def Researcher_agent(state: HomeworkState) -> HomeworkState:
-    """This search agent node recieves the topic and decides to search it on web."""
+    """This search agent node recieves the topic and decides to search it on web.
+
+    Tool results of earlier rounds are sent as digests (the state keeps them in full for
+    compile_research) and the loop ends after RESEARCH_MAX_TOOL_ROUNDS / RESEARCH_MAX_TOTAL_TOKENS.
+    Matching research of earlier runs is put in front of it, so it can search less or not at all."""
     
     print("--- RESEARCHER_agent WORKING ---")
     
-    message = state['messages']
+    start = time.perf_counter()
+    prior = _prior_research(state)
+    message, turn, stop = _researcher_turn(state, prior)
+    if stop:
+        # no tool_calls -> should_contunie goes to compile_research
+        response = AIMessage(content=f"Research stopped: {stop} limit reached.")
+        return _researcher_result(state, turn, prior, response, start, stop)
 
     response = llm_with_tools.invoke(message)
     #this will contain AIMessage about tool_call not answer of the llm query.
@@ -35,18 +130,67 @@ def Researcher_agent(state: HomeworkState) -> HomeworkState:
     #Senerio A: This results enough.
     #Senerio B: These are not enough I want to use the tool again. AIMessage(tool_calls=[...New_query...])
     print("--- REASEARCHER FINISHED DRAFT ---")
-    return {'messages':[response]}
+    return _researcher_result(state, turn, prior, response, start)
+
+async def Researcher_agent_async(state: HomeworkState) -> HomeworkState:
+    """Async version of Researcher_agent (used by agent_graph.astream in the API)."""
+    print("--- RESEARCHER_agent WORKING ---")
+
+    start = time.perf_counter()
+    prior = await asyncio.to_thread(_prior_research, state)
+    message, turn, stop = _researcher_turn(state, prior)
+    if stop:
+        response = AIMessage(content=f"Research stopped: {stop} limit reached.")
+        return _researcher_result(state, turn, prior, response, start, stop)
+
+    response = await llm_with_tools.ainvoke(message)
+
+    print("--- REASEARCHER FINISHED DRAFT ---")
+    return _researcher_result(state, turn, prior, response, start)
+
+def _remember_research(state: HomeworkState, topic: str, sources: list, trace: list):
+    """Stores the passages this run's tools found in the research memory (the research is final here,
+    even if a later node fails) and records how many tool calls the run needed."""
+    if not RESEARCH_MEMORY_ENABLED:
+        return
+    tools_of = {t['id']: t['tool'] for t in trace}
+    found = [p for p in map(parse_source, sources) if p and tools_of.get(p['id']) != 'memory']
+    tool_calls = sum(t['tool_calls'] for t in state.get('research_turns') or [])
+    try:
+        memory = registry.get('research_memory')
+        stored = memory.store(topic, state.get('run_id'), found)
+        memory.record_run(state.get('run_id'), topic, len(state.get('prior_research') or []), tool_calls)
+    except Exception as e:
+        print(f"⚠️ Research memory unavailable: {type(e).__name__}: {e}")
+        return
+    print(f"--- RESEARCH MEMORY: {stored} passages stored, {tool_calls} tool calls this run ---")
 
 def compile_research_node(state: HomeworkState) -> HomeworkState:
     """Runs after the search cycle completes.
     Finds all ToolMessages in the 'messages' list, collects their contents, and writes them to
-    the 'researcher_result' key. """
+    the 'researcher_result' key.
+
+    Duplicate / near-duplicate passages are dropped and the rest is ranked against the topic and
+    packed under RESEARCH_TOKEN_BUDGET (research_compaction.py); 'research_trace' records what happened
+    to every passage. RESEARCH_COMPACTION=0 keeps the raw tool outputs.
+    Passages from the research memory ('prior_research') are packed together with the tool results."""
 
     print("--- compile_research_node WORKING ---")
 
-    
-    compaile_results = []
     messages = state['messages']
+    prior = state.get('prior_research') or []
+    if RESEARCH_COMPACTION:
+        topic = _topic(messages)
+        compaile_results, trace = compact_research(messages, topic, prior=prior)
+        raw_tokens = sum(t['tokens'] for t in trace)
+        kept_tokens = sum(t['tokens'] for t in trace if t['status'] == 'kept')
+        print(f"--- COMPACTION: {len(compaile_results)}/{len(trace)} passages kept, "
+              f"~{kept_tokens}/{raw_tokens} tokens ---")
+        _remember_research(state, topic, compaile_results, trace)
+        print("--- COMPAILE FINISHED DRAFT ---")
+        return {'researcher_result': compaile_results, 'research_trace': trace}
+    
+    compaile_results = [f"{p['title']} ({p['source']})\n{p['text']}" for p in prior]
     for m in messages:
         if isinstance(m, ToolMessage):
             # The content returned by TavilySearch may already be a list,
@@ -61,14 +205,17 @@ def compile_research_node(state: HomeworkState) -> HomeworkState:
 
     return {'researcher_result': compaile_results}
 
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage
+from paper import split_paragraphs, split_sections, join_sections, paragraph_key, excerpt, estimate_tokens
 def writer_agent(state: HomeworkState) -> HomeworkState: #google use docstring like this:
     """
 Runs the Writer Agent to synthesize an academic draft in Markdown.
 
 This node retrieves sources from the 'researcher_result' key in the state, 
 prompts the LLM to write a formal draft based on those sources, and
-formats the output as Markdown.
+formats the output as Markdown. On a correction round only the sections
+the controller found mistakes in are regenerated and spliced back
+(WRITER_PATCH_MODE=0 rewrites the entire paper instead).
 
 Args:
     state (Homework_state): The current state of the graph. Must 
@@ -79,7 +226,161 @@ Returns:
           newly generated Markdown draft.
 """
     print("--- writer_agent WORKING ---")
-    
+    start = time.perf_counter()
+
+    patch = _writer_patch_plan(state)
+    if patch:
+        # only the sections with mistakes are regenerated (one call each, run concurrently)
+        responses = llm.batch([messages for _, messages in patch])
+        return _writer_patch_result(state, patch, responses, start)
+
+    response = llm.invoke(_writer_messages(state))
+        
+    markdown_draft = response.content
+        
+    print("--- WRITER FINISHED DRAFT ---")
+        
+    return {"writer_result" : markdown_draft, "writer_stats": _writer_stats(state, response, start)}
+
+async def writer_agent_async(state: HomeworkState) -> HomeworkState:
+    """Async version of writer_agent."""
+    print("--- writer_agent WORKING ---")
+    start = time.perf_counter()
+
+    patch = _writer_patch_plan(state)
+    if patch:
+        responses = await llm.abatch([messages for _, messages in patch])
+        return _writer_patch_result(state, patch, responses, start)
+
+    response = await llm.ainvoke(_writer_messages(state))
+
+    print("--- WRITER FINISHED DRAFT ---")
+
+    return {"writer_result" : response.content, "writer_stats": _writer_stats(state, response, start)}
+
+# WRITER_PATCH_MODE=0 always rewrites the entire paper on a correction round
+WRITER_PATCH_MODE = os.getenv("WRITER_PATCH_MODE", "1") != "0"
+
+def _output_tokens(response) -> int:
+    usage = getattr(response, 'usage_metadata', None) or {}
+    return usage.get('output_tokens') or estimate_tokens(response.content)
+
+def _writer_stats(state: HomeworkState, response, start: float) -> list:
+    stats = list(state.get('writer_stats') or [])
+    stats.append({
+        'mode': 'full_rewrite' if state.get('does_need_to_rewrite') else 'draft',
+        'output_tokens': _output_tokens(response),
+        'output_chars': len(response.content),
+        'seconds': round(time.perf_counter() - start, 3),
+    })
+    return stats
+
+def _writer_patch_plan(state: HomeworkState) -> list:
+    """[(section, messages)] for the sections the controller's mistakes point at, or [] for a full (re)write."""
+    if not WRITER_PATCH_MODE or not state.get('does_need_to_rewrite'):
+        return []
+    claim_mistakes = state.get('claim_mistakes') or []
+    if not claim_mistakes or any(m['section'] is None for m in claim_mistakes):
+        return []
+
+    sections = split_sections(state['writer_result'])
+    by_section = {}
+    for m in claim_mistakes:
+        by_section.setdefault(m['section'], []).append(m)
+    if any(index >= len(sections) for index in by_section):
+        return []
+
+    sources_text = "\n\n---\n\n".join(state['researcher_result'])
+    outline = "\n".join(f"- {section.title}" for section in sections if section.title)
+
+    system_prompt = """
+        You are an expert academic editor. 
+        Your task is to fix specific mistakes in ONE section of an academic paper.
+        You must use the <SOURCES> as the single source of truth.
+        Return ONLY the corrected section in Markdown, starting with its original heading line.
+        Keep everything that is not part of a mistake unchanged.
+        """
+    plan = []
+    for index in sorted(by_section):
+        section = sections[index]
+        mistakes = "\n".join(f"- \"{m['excerpt']}\": {m['mistake']}" for m in by_section[index])
+        user_prompt = f"""
+        Here are the original research sources:
+        
+        <SOURCES>
+        {sources_text}
+        </SOURCES>
+
+        The paper has these sections:
+        <OUTLINE>
+        {outline}
+        </OUTLINE>
+        
+        Here is the flawed section:
+        <SECTION>
+        {section.text}
+        </SECTION>
+
+        Here are the mistakes you MUST fix in it:
+        <MISTAKES>
+        {mistakes}
+        </MISTAKES>
+        
+        Please return the corrected section only.
+        """
+        plan.append((section, [SystemMessage(content = system_prompt), HumanMessage(content = user_prompt)]))
+    return plan
+
+def _patched_section_text(section, content: str) -> str:
+    text = content.strip()
+    fenced = re.match(r"^```(?:markdown|md)?\s*\n(.*)\n```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    heading_line = section.text.splitlines()[0] if section.title else ''
+    if heading_line and not text.startswith(heading_line.strip()):
+        text = heading_line.rstrip() + "\n\n" + text
+    return text + "\n"
+
+def _writer_patch_result(state: HomeworkState, plan: list, responses: list, start: float) -> HomeworkState:
+    sections = split_sections(state['writer_result'])
+    for (section, _), response in zip(plan, responses):
+        sections[section.index] = section._replace(text = _patched_section_text(section, response.content))
+    markdown_draft = join_sections(sections)
+
+    seconds = time.perf_counter() - start
+    output_tokens = sum(_output_tokens(response) for response in responses)
+
+    # what a full rewrite would have cost: the whole paper as output, at the tokens/char and speed of the first draft
+    stats = list(state.get('writer_stats') or [])
+    draft = next((s for s in stats if s['mode'] == 'draft'), None)
+    if draft and draft['output_chars'] and draft['output_tokens']:
+        full_tokens = round(draft['output_tokens'] * len(state['writer_result']) / draft['output_chars'])
+        full_seconds = draft['seconds'] * full_tokens / draft['output_tokens']
+    else:
+        full_tokens = estimate_tokens(state['writer_result'])
+        full_seconds = None
+    round_stats = {
+        'mode': 'patch',
+        'sections': len(plan),
+        'of_sections': sum(1 for section in sections if section.text.strip()),
+        'output_tokens': output_tokens,
+        'output_chars': sum(len(response.content) for response in responses),
+        'seconds': round(seconds, 3),
+        'full_rewrite_output_tokens': full_tokens,
+        'saved_output_tokens': full_tokens - output_tokens,
+        'saved_seconds': round(full_seconds - seconds, 3) if full_seconds is not None else None,
+    }
+    stats.append(round_stats)
+
+    print(f"--- WRITER PATCHED {round_stats['sections']}/{round_stats['of_sections']} SECTIONS: "
+          f"{output_tokens} output tokens (full rewrite ~{full_tokens}), {seconds:.1f}s"
+          + (f" (~{round_stats['saved_seconds']:.1f}s saved)" if full_seconds is not None else "") + " ---")
+    print("--- WRITER FINISHED DRAFT ---")
+
+    return {"writer_result" : markdown_draft, "writer_stats": stats}
+
+def _writer_messages(state: HomeworkState) -> list:
+    """Builds the writer prompt: a first draft, or a rewrite when the controller found mistakes."""
     research_results = state['researcher_result'] # if you give this to llm directly it may not understand so we will give it more readable shape.
     sources_text = "\n\n---\n\n".join(research_results)
     
@@ -145,17 +446,13 @@ Returns:
         SystemMessage(content = system_prompt),
         HumanMessage(content = user_prompt)
     ]
-    
-    response = llm.invoke(messages_for_llm)
-        
-    markdown_draft = response.content
-        
-    print("--- WRITER FINISHED DRAFT ---")
-        
-    return {"writer_result" : markdown_draft}
+    return messages_for_llm
 
 def controller_agent(state: HomeworkState) ->HomeworkState:
     """This agent controls the rewrite text and source text to detect if there is any hallucination on rewrited text writer_result
+
+    The paper is checked paragraph by paragraph. Verdicts are kept in 'claim_verdicts' (keyed by the
+    paragraph's content), so on a rewrite only the new or modified paragraphs are sent to the LLM.
     
     Args:
     state (Homework_state): The current state of the graph. Must 
@@ -170,92 +467,232 @@ def controller_agent(state: HomeworkState) ->HomeworkState:
     print(f"--- Current rewrite count: {current_count} ---")
     
     if current_count >= 3:
+        return _controller_accept()
+
+    plan = _controller_plan(state)
+    if plan['to_check']:
+        response = llm.invoke(_controller_messages(state, plan['to_check']))
+        response_content = response.content.strip()
+    else:
         response_content = "NONE"
+
+    return _controller_decision(state, plan, response_content)
+
+async def controller_agent_async(state: HomeworkState) -> HomeworkState:
+    """Async version of controller_agent."""
+    print('---CONTROLLER IS RUNNING---')
+    current_count = state.get('rewriter_counter', 0)
+    print(f"--- Current rewrite count: {current_count} ---")
+
+    if current_count >= 3:
+        return _controller_accept()
+
+    plan = _controller_plan(state)
+    if plan['to_check']:
+        response = await llm.ainvoke(_controller_messages(state, plan['to_check']))
+        response_content = response.content.strip()
     else:
-        researcher_result = state['researcher_result']
-        writer_result = state['writer_result']
-        
-        research_results = state['researcher_result'] # if you give this to llm directly it may not understand so we will give it more readable shape.
-        sources_text = "\n\n---\n\n".join(research_results)
-        
-        system_prompt = """You are an expert fact-checker and editor. Your task is to compare an academic paper
-        against its original sources. You must identify *any* statements in the paper that
-        are NOT supported by the sources (hallucinations) or contradict the sources.
+        response_content = "NONE"
+
+    return _controller_decision(state, plan, response_content)
+
+def _controller_plan(state: HomeworkState) -> dict:
+    """Splits the draft into paragraphs and finds the ones without a cached verdict."""
+    sources_text = "\n\n---\n\n".join(state['researcher_result'])
+    # verdicts only hold for the sources they were checked against
+    sources_digest = hashlib.sha256(sources_text.encode('utf-8')).hexdigest()
+
+    verdicts = state.get('claim_verdicts') or {}
+    paragraphs = []
+    to_check = []
+    for paragraph in split_paragraphs(state['writer_result']):
+        key = paragraph_key(paragraph.text, sources_digest)
+        paragraphs.append((paragraph, key))
+        if key not in verdicts:
+            to_check.append(paragraph)
+
+    checked_chars = sum(len(p.text) for p in to_check)
+    total_chars = sum(len(p.text) for p, _ in paragraphs) or 1
+    print(f"--- CONTROLLER: checking {len(to_check)}/{len(paragraphs)} paragraphs "
+          f"({checked_chars}/{total_chars} chars, {len(paragraphs) - len(to_check)} verdicts cached) ---")
+    return {'paragraphs': paragraphs, 'to_check': to_check}
+
+def _controller_messages(state: HomeworkState, to_check: list) -> list:
+    research_results = state['researcher_result'] # if you give this to llm directly it may not understand so we will give it more readable shape.
+    sources_text = "\n\n---\n\n".join(research_results)
     
-        If the paper is perfect and has NO hallucinations, you must respond with 
-        the single word: NONE
-        
-        If you find any hallucinations or unsupported claims, you MUST return a 
-        list of the specific mistakes."""
-        
+    system_prompt = """You are an expert fact-checker and editor. Your task is to compare paragraphs of an academic paper
+    against its original sources. You must identify *any* statements in the paragraphs that
+    are NOT supported by the sources (hallucinations) or contradict the sources.
+
+    Every paragraph is labelled [P<number>].
+
+    If the paragraphs have NO hallucinations, you must respond with 
+    the single word: NONE
     
-        user_prompt = f"""
-            Here are the research sources:
-            
-            <SOURCES>
-            {sources_text}
-            </SOURCES>
-            Here are the rewrited academic paper:
-            Here is the academic paper to check:
-            <PAPER>
-            {writer_result}
-            </PAPER>
-            
-            Remember: Respond with ONLY the word "NONE" if there are no errors. Otherwise, list the errors.
-            """
-        messages_for_llm = [
-                SystemMessage(content = system_prompt),
-                HumanMessage(content = user_prompt)
-            ]
+    If you find any hallucinations or unsupported claims, you MUST return one line per mistake
+    in the form:
+    P<number>: <the mistake>"""
+
+    paragraphs_text = "\n\n".join(
+        f"[P{p.number}]" + (f" (section: {p.heading})" if p.heading else "") + f"\n{p.text}"
+        for p in to_check
+    )
+
+    # the sources come first and are identical on every iteration (a stable prompt prefix),
+    # only the paragraphs part changes with the edit
+    user_prompt = f"""
+        Here are the research sources:
         
-        response = llm.invoke(messages_for_llm)
-        response_content = response.content.strip()
-    
-    if response_content == "NONE":
-        print('---THERE IS NO ERROR.')
-        print('---CONTROLLER IS FINISHED---')
-        return {'does_need_to_rewrite':False, 'mistakes': ""}
+        <SOURCES>
+        {sources_text}
+        </SOURCES>
+        Here are the paragraphs of the academic paper to check:
+        <PARAGRAPHS>
+        {paragraphs_text}
+        </PARAGRAPHS>
         
+        Remember: Respond with ONLY the word "NONE" if there are no errors. Otherwise, list the errors as "P<number>: <the mistake>".
+        """
+    messages_for_llm = [
+            SystemMessage(content = system_prompt),
+            HumanMessage(content = user_prompt)
+        ]
+    return messages_for_llm
+
+MISTAKE_LINE_RE = re.compile(r"^\W*P(\d+)\W*?[:\-\u2013]\s*(.+)$", re.IGNORECASE)
+
+def _parse_mistakes(response_content: str, numbers: set) -> dict:
+    """'P3: ...' lines -> {3: ['...']}. Lines for paragraphs that were not checked are ignored."""
+    found = {}
+    for line in response_content.splitlines():
+        match = MISTAKE_LINE_RE.match(line.strip())
+        if match and int(match.group(1)) in numbers:
+            found.setdefault(int(match.group(1)), []).append(match.group(2).strip())
+    return found
+
+def _controller_accept() -> HomeworkState:
+    print('---THERE IS NO ERROR.')
+    print('---CONTROLLER IS FINISHED---')
+    return {'does_need_to_rewrite':False, 'mistakes': "", 'claim_mistakes': []}
+
+def _controller_decision(state: HomeworkState, plan: dict, response_content: str) -> HomeworkState:
+    verdicts = dict(state.get('claim_verdicts') or {})
+    checked = {p.number for p in plan['to_check']}
+    unattributed = ""
+
+    if response_content == "NONE":
+        found = {}
     else:
-        print("\n\n################# HALLUCINATION DETECTED #################")
-        print("\n--- 1. ORIGINAL SOURCES (The Ground Truth) ---")
-        print(sources_text)
-        print("\n--- 2. FLAWED DRAFT (From Writer) ---")
-        print(writer_result)
-        print("\n--- 3. DETECTED MISTAKES (The Hallucination) ---")
-        print(response_content)
-        print("############################################################\n\n")
+        found = _parse_mistakes(response_content, checked)
+        if not found:
+            # the answer could not be attributed to paragraphs: nothing is cached, the text goes to the writer as is
+            unattributed = response_content
 
-        
-        print('---CONTROLLER FIND SOME ERROR:---')
-        print('---CONTROLLER IS FINISHED---')
-        
-        return {'does_need_to_rewrite':True, 'mistakes': response_content}
+    if not unattributed:
+        for paragraph, key in plan['paragraphs']:
+            if paragraph.number in checked:
+                verdicts[key] = {'ok': paragraph.number not in found, 'mistakes': found.get(paragraph.number, [])}
+
+    # unchanged paragraphs keep their cached verdict, so a mistake the rewrite did not touch is still reported
+    claim_mistakes = []
+    for paragraph, key in plan['paragraphs']:
+        verdict = verdicts.get(key)
+        if verdict and not verdict['ok']:
+            for mistake in verdict['mistakes']:
+                claim_mistakes.append({
+                    'paragraph': paragraph.number,
+                    'section': paragraph.section,
+                    'heading': paragraph.heading,
+                    'excerpt': excerpt(paragraph.text),
+                    'mistake': mistake,
+                })
+
+    if not claim_mistakes and not unattributed:
+        result = _controller_accept()
+        result['claim_verdicts'] = verdicts
+        return result
+
+    mistakes = "\n".join(
+        f"- [P{m['paragraph']}" + (f", section \"{m['heading']}\"" if m['heading'] else "") + f"] \"{m['excerpt']}\": {m['mistake']}"
+        for m in claim_mistakes
+    )
+    if unattributed:
+        mistakes = (mistakes + "\n" + unattributed).strip()
+        # not tied to a paragraph: the writer rewrites the whole paper for it
+        claim_mistakes.append({'paragraph': None, 'section': None, 'heading': '', 'excerpt': '', 'mistake': unattributed})
+
+    print("\n\n################# HALLUCINATION DETECTED #################")
+    print("\n--- 1. ORIGINAL SOURCES (The Ground Truth) ---")
+    print("\n\n---\n\n".join(state['researcher_result']))
+    print("\n--- 2. FLAWED DRAFT (From Writer) ---")
+    print(state['writer_result'])
+    print("\n--- 3. DETECTED MISTAKES (The Hallucination) ---")
+    print(mistakes)
+    print("############################################################\n\n")
+
+    
+    print('---CONTROLLER FIND SOME ERROR:---')
+    print('---CONTROLLER IS FINISHED---')
+    
+    return {'does_need_to_rewrite':True, 'mistakes': mistakes, 'claim_mistakes': claim_mistakes, 'claim_verdicts': verdicts}
 
 import pypandoc
+import uuid
+from artifacts import get_artifact_store
+
+REPORT_NAME = 'student_number_homeworkname.docx'
+
+# native: in-process python-docx renderer (docx_renderer.py), pandoc: one pandoc process per report
+DOCX_RENDERER = os.getenv("DOCX_RENDERER", "native")
+
+def render_docx(markdown: str, outputfile: str) -> None:
+    if DOCX_RENDERER == 'native':
+        try:
+            from docx_renderer import render_markdown_to_docx
+        except ImportError:
+            print("--- python-docx is not installed, falling back to pandoc ---")
+        else:
+            render_markdown_to_docx(markdown, outputfile)
+            return
+
+    pypandoc.convert_text(
+        markdown,
+        'docx',
+        format = 'md', #markdown
+        outputfile= outputfile
+    )
+
 def formatter(state: HomeworkState) -> HomeworkState:
-    """This is a formatter node. It creates a Word file from text written in Markdown format."""
+    """This is a formatter node. It creates a Word file from text written in Markdown format.
+
+    The file is stored under the run's own folder in the artifact store (artifacts/runs/<run_id>/),
+    so concurrent runs don't overwrite each other's report."""
     
     print('---FORMATTER NODE IS RUNNING ---')
 
-    outputfile = 'student_number_homeworkname.docx'
+    run_id = state.get('run_id') or uuid.uuid4().hex
+    store = get_artifact_store()
+    outputfile = store.new_temp_path(suffix='.docx')
     
     writer_result = state['writer_result']
     
     try:
-        pypandoc.convert_text(
-            writer_result,
-            'docx',
-            format = 'md', #markdown
-            outputfile= outputfile
-        )
-        print(f"The {outputfile} saved succesfully!.")
-        return {"document_path": outputfile}
+        render_docx(writer_result, outputfile)
+        document_path = store.put_file(run_id, REPORT_NAME, outputfile)
+        print(f"The {document_path} saved succesfully!.")
+        return {"document_path": document_path, "run_id": run_id}
         
     except Exception as e:
         print("---THERE IS SOMETHING WRONG THE WORD FILE COUND'T CREATE!---")
         print(e)
-        return {"document_path": None}
+        if os.path.exists(outputfile):
+            os.remove(outputfile)
+        return {"document_path": None, "run_id": run_id}
+
+async def formatter_async(state: HomeworkState) -> HomeworkState:
+    """Async version of formatter: rendering runs in a worker thread so the event loop is not blocked."""
+    return await asyncio.to_thread(formatter, state)
 
 def should_contunie(state: HomeworkState) -> str:
     """The researcher decides the flow after the agent."""
@@ -0,0 +1,118 @@
+# paper.py
+"""Addresses the writer's Markdown paper by section and by paragraph.
+
+    sections     every heading starts a section (section 0 is whatever comes before the first heading);
+                 the writer regenerates only the sections with mistakes and splices them back
+    paragraphs   blank-line separated blocks (a fenced code block is one block, even with blank lines
+                 inside), the unit the controller verifies. Every paragraph gets a content key, so the
+                 same text in the next draft is recognised as unchanged.
+
+split_sections + join_sections is lossless: join_sections(split_sections(md)) == md.
+"""
+
+import hashlib
+import re
+from typing import List, NamedTuple
+
+HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+
+class Section(NamedTuple):
+    index: int       # 0 is the part before the first heading (may be empty)
+    title: str       # heading text, '' for section 0
+    text: str        # the heading line and everything up to the next heading, verbatim
+
+
+class Paragraph(NamedTuple):
+    number: int      # 1-based position in the paper (what the LLM sees as [P<number>])
+    heading: str     # closest heading above it, '' before the first one
+    text: str
+    section: int     # index of the Section it belongs to
+
+
+def _scan(markdown):
+    """Yields (line with its line ending, heading text or None, inside a code fence)."""
+    fence = None
+    for line in (markdown or '').splitlines(keepends=True):
+        if fence:
+            if line.strip().startswith(fence):
+                fence = None
+            yield line, None, True
+            continue
+
+        fence_match = FENCE_RE.match(line)
+        if fence_match:
+            fence = fence_match.group(1)
+            yield line, None, True
+            continue
+
+        heading_match = HEADING_RE.match(line.rstrip('\r\n'))
+        yield line, heading_match.group(2) if heading_match else None, False
+
+
+def split_sections(markdown: str) -> List[Section]:
+    sections = [['', []]]
+    for line, heading, _ in _scan(markdown):
+        if heading is not None:
+            sections.append([heading, []])
+        sections[-1][1].append(line)
+    return [Section(i, title, "".join(lines)) for i, (title, lines) in enumerate(sections)]
+
+
+def join_sections(sections) -> str:
+    """Splices sections back together; a replaced section is separated from the next one by a blank line."""
+    parts = []
+    for i, section in enumerate(sections):
+        text = section.text
+        if i < len(sections) - 1 and text.strip():
+            text = text.rstrip('\n') + '\n\n'
+        parts.append(text)
+    return "".join(parts)
+
+
+def split_paragraphs(markdown: str) -> List[Paragraph]:
+    paragraphs = []
+    heading = ''
+    section = 0
+    block = []
+
+    def flush():
+        text = "\n".join(block).strip()
+        block.clear()
+        if text:
+            paragraphs.append(Paragraph(len(paragraphs) + 1, heading, text, section))
+
+    for line, line_heading, in_fence in _scan(markdown):
+        line = line.rstrip('\r\n')
+        if in_fence:
+            block.append(line)
+        elif line_heading is not None:
+            flush()
+            heading = line_heading
+            section += 1
+        elif not line.strip():
+            flush()
+        else:
+            block.append(line)
+    flush()
+    return paragraphs
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def paragraph_key(text: str, salt: str = '') -> str:
+    """Content key of a paragraph. Whitespace-only edits keep the key, `salt` scopes it (e.g. to the sources)."""
+    return hashlib.sha256(f"{salt}\0{normalize(text)}".encode('utf-8')).hexdigest()[:16]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), used where the provider reports no usage."""
+    return (len(text or '') + 3) // 4
+
+
+def excerpt(text: str, length: int = 80) -> str:
+    text = normalize(text)
+    return text if len(text) <= length else text[:length - 1] + "…"
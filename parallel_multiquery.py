@@ -0,0 +1,115 @@
+# parallel_multiquery.py
+"""MultiQueryRetriever over the BM25 + Chroma EnsembleRetriever that retrieves all variants at once.
+
+MultiQueryRetriever.retrieve_documents runs the ensemble once per query variant, one after the other,
+and every dense lookup embeds its query on its own. This version, for the same variants:
+
+    1. embeds all variants in one embed_documents() call
+    2. runs one Chroma query (or one DenseIndex matmul) with all variant vectors, concurrently with the
+       BM25 lookups of all variants
+    3. fuses every variant's lists with the ensemble's own weighted_reciprocal_rank, then unique_union
+
+Steps 2/3 reproduce EnsembleRetriever.rank_fusion per variant exactly (same k, same weights, same order),
+so the result set is identical to the sequential chain. Retrievers it does not know how to batch are
+simply invoked per variant (still concurrently).
+
+Per-call phase timings are printed and observed in metrics.retrieval_seconds (multiquery_<phase>).
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_classic.retrievers import EnsembleRetriever, MultiQueryRetriever
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from dense_index import DenseRetriever
+from metrics import metrics
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="multiquery")
+
+
+def _is_batchable_dense(retriever):
+    # a plain similarity search on a Chroma store: embeddings + one collection.query for all variants
+    return (
+        isinstance(retriever, VectorStoreRetriever)
+        and retriever.search_type == "similarity"
+        and set(retriever.search_kwargs) <= {"k"}
+        and hasattr(retriever.vectorstore, "_collection")
+        and retriever.vectorstore.embeddings is not None
+    )
+
+
+def _chroma_batch_search(vectorstore, vectors, k):
+    """One Chroma query for several vectors -> one Document list per vector (as Chroma.similarity_search builds them)."""
+    results = vectorstore._collection.query(query_embeddings=vectors, n_results=k)
+    return [
+        [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+        for texts, metadatas in zip(results["documents"], results["metadatas"])
+    ]
+
+
+class ParallelMultiQueryRetriever(MultiQueryRetriever):
+    """Drop-in MultiQueryRetriever (same from_llm) whose retriever is an EnsembleRetriever."""
+
+    def retrieve_documents(self, queries, run_manager):
+        return self._retrieve_all(queries, run_manager.get_child())
+
+    async def aretrieve_documents(self, queries, run_manager):
+        return await asyncio.to_thread(self._retrieve_all, queries, run_manager.get_child())
+
+    def _retrieve_all(self, queries, callbacks):
+        ensemble = self.retriever
+        if not isinstance(ensemble, EnsembleRetriever):
+            lists = list(_executor.map(lambda q: self.retriever.invoke(q, config={"callbacks": callbacks}), queries))
+            return [doc for docs in lists for doc in docs]
+
+        timings = {}
+        start = time.perf_counter()
+
+        # 1. one embedding call per dense retriever for all variants
+        vectors = {}
+        for i, retriever in enumerate(ensemble.retrievers):
+            if isinstance(retriever, DenseRetriever):
+                vectors[i] = retriever.embeddings.embed_documents(list(queries))
+            elif _is_batchable_dense(retriever):
+                vectors[i] = retriever.vectorstore.embeddings.embed_documents(list(queries))
+        timings["embed"] = time.perf_counter() - start
+
+        # 2. every (retriever, variant) lookup at the same time; the dense ones as one batch query
+        lookup_start = time.perf_counter()
+        futures = {}
+        for i, retriever in enumerate(ensemble.retrievers):
+            if i in vectors and isinstance(retriever, DenseRetriever):
+                futures[i] = _executor.submit(retriever.search_by_vectors, vectors[i])
+            elif i in vectors:
+                futures[i] = _executor.submit(
+                    _chroma_batch_search, retriever.vectorstore, vectors[i], retriever.search_kwargs.get("k", 4))
+            else:
+                futures[i] = [
+                    _executor.submit(retriever.invoke, query, {"callbacks": callbacks}) for query in queries
+                ]
+        results = {
+            i: future.result() if i in vectors else [f.result() for f in future]
+            for i, future in futures.items()
+        }
+        timings["lookup"] = time.perf_counter() - lookup_start
+
+        # 3. per-variant weighted RRF (exactly EnsembleRetriever.rank_fusion), in variant order
+        fuse_start = time.perf_counter()
+        documents = []
+        for q in range(len(queries)):
+            doc_lists = [
+                [Document(page_content=doc) if isinstance(doc, str) else doc for doc in results[i][q]]
+                for i in range(len(ensemble.retrievers))
+            ]
+            documents.extend(ensemble.weighted_reciprocal_rank(doc_lists))
+        timings["fuse"] = time.perf_counter() - fuse_start
+        timings["total"] = time.perf_counter() - start
+
+        for phase, seconds in timings.items():
+            metrics.retrieval_seconds.observe(seconds, retriever=f"multiquery_{phase}")
+        print(f"--- DocumentSearch retrieval: {len(queries)} variants, "
+              + ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items()) + " ---")
+        return documents
@@ -0,0 +1,620 @@
+# rate_limit.py
+"""One scheduler for the Gemini and Tavily calls of every run on this machine: token buckets per
+provider, priorities per graph node, and retries with jittered backoff.
+
+Concurrent runs (API streams, job workers, batch_research.py) used to call the APIs with no
+coordination, and a burst of researcher calls ended in 429s that failed whole graphs. Now every call
+that misses the caches (RateLimitedChatModel for the chat models, rate_limited_tool for Tavily)
+
+    1. waits for its provider's buckets: requests per second (RATE_LIMIT_<PROVIDER>_RPS) and tokens per
+       minute (RATE_LIMIT_<PROVIDER>_TPM); a chat call reserves its estimated prompt tokens plus
+       RATE_LIMIT_OUTPUT_TOKENS and is settled with the real usage afterwards
+    2. is served by the priority of the node it comes from while others wait as well: the controller
+       and formatter of a run that is nearly done first, then the writer, new researcher / tool calls
+       last (NODE_PRIORITY); every RATE_LIMIT_AGING_SECONDS of waiting moves a call up one level
+    3. on a quota error (429 / RESOURCE_EXHAUSTED) pauses the provider for a jittered exponential
+       backoff (or the retry delay the error asks for) and is retried, up to RATE_LIMIT_MAX_RETRIES
+       times; 5xx errors are retried the same way without pausing the provider
+
+Limits <= 0 mean unlimited. The bucket levels live in SQLite (RATE_LIMIT_PATH), so the API processes,
+job workers and batches of one machine share them; priorities order the waiters of one process.
+The chat models keep their SDK's own retries inside one scheduled call; what still fails after those
+is handled here. RATE_LIMIT_ENABLED=0 turns the scheduler off.
+
+    python -m pytest tests/test_rate_limit.py  # the scheduler against a local fake provider
+    python benchmarks/rate_limit_bench.py      # concurrent fake runs, with and without the scheduler
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tools import StructuredTool
+
+from metrics import metrics
+from research_compaction import message_tokens
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(base_dir, "cache", "rate_limit.sqlite"))
+# output tokens reserved per chat call until its real usage is known
+RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv("RATE_LIMIT_OUTPUT_TOKENS", "1024"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "2"))
+RATE_LIMIT_BACKOFF_MAX_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_MAX_SECONDS", "60"))
+RATE_LIMIT_AGING_SECONDS = float(os.getenv("RATE_LIMIT_AGING_SECONDS", "30"))
+
+# provider -> (requests per second, tokens per minute); overridden by RATE_LIMIT_<PROVIDER>_RPS / _TPM
+PROVIDER_LIMITS = {
+    "gemini": (4.0, 1_000_000),
+    "tavily": (1.5, 0),
+}
+
+# lower is served first; nodes not listed get DEFAULT_PRIORITY
+NODE_PRIORITY = {
+    "controller": 0,
+    "formatter": 0,
+    "writer": 1,
+    "compile_research": 2,
+    "researcher": 3,
+    "run_tools": 3,
+}
+DEFAULT_PRIORITY = 2
+
+# a waiter that is not first in line looks again after this long (aging can change the order)
+_POLL_SECONDS = 0.5
+
+
+def provider_limits(provider):
+    rps, tpm = PROVIDER_LIMITS.get(provider, (0, 0))
+    prefix = f"RATE_LIMIT_{provider.upper()}"
+    return float(os.getenv(f"{prefix}_RPS", rps)), float(os.getenv(f"{prefix}_TPM", tpm))
+
+
+def current_node():
+    """The graph node the current call runs in (LangGraph puts it in the config metadata), or None."""
+    config = var_child_runnable_config.get() or {}
+    return (config.get("metadata") or {}).get("langgraph_node")
+
+
+def node_priority(node=None):
+    return NODE_PRIORITY.get(node or current_node(), DEFAULT_PRIORITY)
+
+
+# --- errors ---
+
+QUOTA_NAMES = ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+QUOTA_MARKERS = ("resource_exhausted", "resource exhausted", "rate limit", "too many requests", "quota")
+TRANSIENT_NAMES = ("ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "Timeout", "ReadTimeout")
+TRANSIENT_MARKERS = ("unavailable", "overloaded", "deadline exceeded", "timed out")
+
+
+def _chain(error):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def _status(error):
+    """HTTP status of an SDK / requests error; Tavily only puts it in the message ("Error 429: ...")."""
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return int(value)
+    match = re.search(r"\b(?:error|status|code)\W{0,3}([45]\d\d)\b", str(error), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def is_quota_error(error):
+    return any(
+        _status(e) == 429 or type(e).__name__ in QUOTA_NAMES or any(m in str(e).lower() for m in QUOTA_MARKERS)
+        for e in _chain(error)
+    )
+
+
+def is_transient_error(error):
+    return any(
+        (_status(e) or 0) >= 500 or type(e).__name__ in TRANSIENT_NAMES
+        or any(m in str(e).lower() for m in TRANSIENT_MARKERS)
+        for e in _chain(error)
+    )
+
+
+def retry_after(error):
+    """Seconds the provider asks to wait (Retry-After header, Gemini's retryDelay), or None."""
+    for e in _chain(error):
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+        match = re.search(r"retry[_ ]?(?:delay|after)\W*(?:seconds\W*)?(\d+(?:\.\d+)?)", str(e), re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+# --- buckets ---
+
+class SharedBuckets:
+    """Request and token bucket levels per provider in SQLite, shared by the processes of one machine.
+
+    A row holds the levels at `updated_at`; every change refills them for the time passed first.
+    The request bucket holds one request (calls are spaced 1/rps apart, so a per-second window is never
+    exceeded); the token bucket holds a minute of tokens."""
+
+    def __init__(self, path=RATE_LIMIT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                provider TEXT PRIMARY KEY,
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                paused_until REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+
+    def _update(self, provider, limits, change):
+        """Runs `change(levels, now)` on the refilled levels in one write transaction; returns its result."""
+        rps, tpm = limits
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._db.execute(
+                    "SELECT requests, tokens, paused_until, updated_at FROM buckets WHERE provider = ?", (provider,)
+                ).fetchone()
+                if row is None:
+                    levels = {"requests": 1.0, "tokens": tpm, "paused_until": 0.0}
+                else:
+                    requests, tokens, paused_until, updated_at = row
+                    elapsed = max(0.0, now - updated_at)
+                    levels = {
+                        "requests": min(1.0, requests + elapsed * rps),
+                        "tokens": min(tpm, tokens + elapsed * tpm / 60),
+                        "paused_until": paused_until,
+                    }
+                result = change(levels, now)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (provider, requests, tokens, paused_until, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (provider, levels["requests"], levels["tokens"], levels["paused_until"], now),
+                )
+                self._db.execute("COMMIT")
+                return result
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def take(self, provider, limits, tokens):
+        """Takes one request and `tokens` when the buckets have them and returns 0; otherwise takes
+        nothing and returns the seconds until they will."""
+        rps, tpm = limits
+
+        def change(levels, now):
+            wait = levels["paused_until"] - now
+            if rps > 0 and levels["requests"] < 1:
+                wait = max(wait, (1 - levels["requests"]) / rps)
+            # a call larger than the whole bucket waits for a full one and leaves it in debt
+            needed = min(tokens, tpm)
+            if tpm > 0 and levels["tokens"] < needed:
+                wait = max(wait, (needed - levels["tokens"]) / (tpm / 60))
+            if wait > 0:
+                return wait
+            levels["requests"] -= 1
+            levels["tokens"] -= tokens
+            return 0.0
+
+        return self._update(provider, limits, change)
+
+    def adjust(self, provider, limits, tokens):
+        """Takes `tokens` more (or gives them back when negative), e.g. once the real usage is known."""
+        def change(levels, now):
+            levels["tokens"] = min(limits[1], levels["tokens"] - tokens)
+        self._update(provider, limits, change)
+
+    def pause(self, provider, limits, seconds):
+        """No call of `provider` is let through for `seconds` (after a quota error)."""
+        def change(levels, now):
+            levels["paused_until"] = max(levels["paused_until"], now + seconds)
+        self._update(provider, limits, change)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "since", "seq", "wake")
+
+    def __init__(self, priority, tokens, seq, wake):
+        self.priority = priority
+        self.tokens = tokens
+        self.since = time.monotonic()
+        self.seq = seq
+        self.wake = wake
+
+    def rank(self, now, aging_seconds):
+        return self.priority - (now - self.since) / aging_seconds, self.seq
+
+
+# --- scheduler ---
+
+class RateLimitScheduler:
+    """Lets calls through when their provider's buckets allow, in priority order, and retries failures."""
+
+    def __init__(self, path=RATE_LIMIT_PATH, enabled=RATE_LIMIT_ENABLED, limits=None,
+                 max_retries=RATE_LIMIT_MAX_RETRIES, backoff_seconds=RATE_LIMIT_BACKOFF_SECONDS,
+                 backoff_max_seconds=RATE_LIMIT_BACKOFF_MAX_SECONDS, aging_seconds=RATE_LIMIT_AGING_SECONDS):
+        self.enabled = enabled
+        self.buckets = SharedBuckets(path)
+        self._limits = dict(limits or {})
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.aging_seconds = aging_seconds
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting = defaultdict(list)
+        self._counters = defaultdict(lambda: {
+            "calls": 0, "waited_calls": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            "quota_errors": 0, "transient_errors": 0, "retries": 0, "failures": 0,
+        })
+
+    def limits(self, provider):
+        if provider not in self._limits:
+            self._limits[provider] = provider_limits(provider)
+        return self._limits[provider]
+
+    # --- waiting in line ---
+
+    def _enqueue(self, provider, priority, tokens, wake):
+        waiter = _Waiter(priority, tokens, next(self._seq), wake)
+        with self._lock:
+            self._waiting[provider].append(waiter)
+        return waiter
+
+    def _leave(self, provider, waiter):
+        with self._lock:
+            if waiter in self._waiting[provider]:
+                self._waiting[provider].remove(waiter)
+        self._wake_first(provider)
+
+    def _wake_first(self, provider):
+        with self._lock:
+            now = time.monotonic()
+            head = min(self._waiting[provider], key=lambda w: w.rank(now, self.aging_seconds), default=None)
+        if head is not None:
+            head.wake()
+
+    def _turn(self, provider, waiter):
+        """0 once `waiter` holds its request and tokens; otherwise the seconds to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            head = min(self._waiting[provider], key=lambda w: w.rank(now, self.aging_seconds))
+        if head is not waiter:
+            return _POLL_SECONDS  # woken earlier when the one in front is through
+        wait = self.buckets.take(provider, self.limits(provider), waiter.tokens)
+        if wait <= 0:
+            self._leave(provider, waiter)
+        return wait
+
+    def _waited(self, provider, priority, start):
+        seconds = time.monotonic() - start
+        with self._lock:
+            counters = self._counters[provider]
+            counters["calls"] += 1
+            if seconds >= 0.01:
+                counters["waited_calls"] += 1
+                counters["wait_seconds"] += seconds
+                counters["max_wait_seconds"] = max(counters["max_wait_seconds"], seconds)
+        metrics.rate_limit_wait_seconds.observe(seconds, provider=provider, priority=priority)
+        return seconds
+
+    def acquire(self, provider, tokens=0, priority=DEFAULT_PRIORITY):
+        """Blocks until `provider` may be called with `tokens`; returns the seconds waited."""
+        start = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue(provider, priority, tokens, event.set)
+        try:
+            while (wait := self._turn(provider, waiter)) > 0:
+                event.wait(wait)
+                event.clear()
+        except BaseException:
+            self._leave(provider, waiter)
+            raise
+        return self._waited(provider, priority, start)
+
+    async def aacquire(self, provider, tokens=0, priority=DEFAULT_PRIORITY):
+        """Async version of acquire; waits on the event loop, the SQLite update runs in a worker thread."""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # the loop of a cancelled waiter is gone
+                pass
+
+        waiter = self._enqueue(provider, priority, tokens, wake)
+        try:
+            while (wait := await asyncio.to_thread(self._turn, provider, waiter)) > 0:
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except BaseException:
+            self._leave(provider, waiter)
+            raise
+        return self._waited(provider, priority, start)
+
+    def settle(self, provider, reserved, used):
+        """Corrects a reservation of `reserved` tokens to the `used` ones."""
+        if used != reserved and self.limits(provider)[1] > 0:
+            self.buckets.adjust(provider, self.limits(provider), used - reserved)
+            if used < reserved:
+                self._wake_first(provider)  # the refund may be enough for it
+
+    # --- retries ---
+
+    def _retry_delay(self, provider, tokens, error, attempt):
+        """Seconds the caller sleeps before retrying after `error`, or None when the error is final.
+        A quota error pauses the whole provider instead (every caller waits in acquire)."""
+        self.settle(provider, tokens, 0)  # a failed call used no tokens
+        quota = is_quota_error(error)
+        transient = not quota and is_transient_error(error)
+        with self._lock:
+            counters = self._counters[provider]
+            counters["quota_errors"] += quota
+            counters["transient_errors"] += transient
+            if not (quota or transient) or attempt >= self.max_retries:
+                counters["failures"] += 1
+                return None
+            counters["retries"] += 1
+
+        ceiling = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** attempt)
+        delay = max(ceiling / 2 + random.uniform(0, ceiling / 2), retry_after(error) or 0)
+        reason = "quota" if quota else "transient"
+        metrics.rate_limit_retries.inc(provider=provider, reason=reason)
+        print(f"⚠️ {provider} {reason} error, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s: "
+              f"{type(error).__name__}: {str(error)[:120]}")
+        if quota:
+            self.buckets.pause(provider, self.limits(provider), delay)
+            return 0.0
+        return delay
+
+    def call(self, provider, fn, tokens=0, priority=DEFAULT_PRIORITY, used_tokens=None):
+        """fn() once `provider` allows it, retried on quota / transient errors.
+        `used_tokens(result)` is the real token count the reservation is settled with."""
+        if not self.enabled:
+            return fn()
+        for attempt in itertools.count():
+            self.acquire(provider, tokens, priority)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(provider, tokens, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.settle(provider, tokens, (used_tokens(result) or tokens) if used_tokens else tokens)
+            return result
+
+    async def acall(self, provider, afn, tokens=0, priority=DEFAULT_PRIORITY, used_tokens=None):
+        """Async version of call; `afn()` returns the awaitable to run."""
+        if not self.enabled:
+            return await afn()
+        for attempt in itertools.count():
+            await self.aacquire(provider, tokens, priority)
+            try:
+                result = await afn()
+            except Exception as e:
+                delay = await asyncio.to_thread(self._retry_delay, provider, tokens, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            await asyncio.to_thread(
+                self.settle, provider, tokens, (used_tokens(result) or tokens) if used_tokens else tokens)
+            return result
+
+    def stream(self, provider, open_stream, tokens=0, priority=DEFAULT_PRIORITY, chunk_tokens=None):
+        """Yields from `open_stream()` once `provider` allows it. Only a stream that fails before its
+        first chunk is retried (what was already yielded can't be taken back)."""
+        if not self.enabled:
+            yield from open_stream()
+            return
+        for attempt in itertools.count():
+            self.acquire(provider, tokens, priority)
+            used = 0
+            started = False
+            try:
+                for chunk in open_stream():
+                    started = True
+                    used += chunk_tokens(chunk) if chunk_tokens else 0
+                    yield chunk
+            except Exception as e:
+                if started:
+                    self.settle(provider, tokens, used or tokens)
+                    raise
+                delay = self._retry_delay(provider, tokens, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.settle(provider, tokens, used or tokens)
+            return
+
+    async def astream(self, provider, open_stream, tokens=0, priority=DEFAULT_PRIORITY, chunk_tokens=None):
+        """Async version of stream; `open_stream()` returns an async iterator."""
+        if not self.enabled:
+            async for chunk in open_stream():
+                yield chunk
+            return
+        for attempt in itertools.count():
+            await self.aacquire(provider, tokens, priority)
+            used = 0
+            started = False
+            try:
+                async for chunk in open_stream():
+                    started = True
+                    used += chunk_tokens(chunk) if chunk_tokens else 0
+                    yield chunk
+            except Exception as e:
+                if started:
+                    await asyncio.to_thread(self.settle, provider, tokens, used or tokens)
+                    raise
+                delay = await asyncio.to_thread(self._retry_delay, provider, tokens, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            await asyncio.to_thread(self.settle, provider, tokens, used or tokens)
+            return
+
+    def stats(self):
+        with self._lock:
+            stats = {provider: dict(counters) for provider, counters in self._counters.items()}
+            waiting = {provider: len(waiters) for provider, waiters in self._waiting.items()}
+        for provider, counters in stats.items():
+            counters["waiting"] = waiting.get(provider, 0)
+            counters["wait_seconds"] = round(counters["wait_seconds"], 3)
+            counters["max_wait_seconds"] = round(counters["max_wait_seconds"], 3)
+            counters["limits"] = dict(zip(("rps", "tpm"), self.limits(provider)))
+        return {"enabled": self.enabled, "providers": stats}
+
+
+scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """The process wide scheduler."""
+    global scheduler
+    with _scheduler_lock:
+        if scheduler is None:
+            scheduler = RateLimitScheduler()
+    return scheduler
+
+
+def rate_limit_stats():
+    return scheduler.stats() if scheduler is not None else None
+
+
+# --- integrations ---
+
+def _result_tokens(result):
+    """Total tokens a ChatResult reports (0 when the provider sent no usage)."""
+    return sum((getattr(g.message, "usage_metadata", None) or {}).get("total_tokens", 0) for g in result.generations)
+
+
+def _chunk_tokens(chunk):
+    return (getattr(chunk.message, "usage_metadata", None) or {}).get("total_tokens", 0)
+
+
+class RateLimitedChatModel:
+    """Mixin for a LangChain chat model class: every call that misses the LLM cache goes through the
+    scheduler, with its estimated tokens and the priority of the node it is made in.
+
+        class RateLimitedGemini(RateLimitedChatModel, ChatGoogleGenerativeAI):
+            rate_limit_provider: ClassVar[str] = "gemini"
+
+    invoke / batch / bind_tools / with_structured_output and token streaming are all covered, since
+    they end in _generate / _stream (or their async versions)."""
+
+    rate_limit_provider = "llm"
+
+    @classmethod
+    def _model_class(cls):
+        return next(base for base in cls.__mro__[1:] if not issubclass(base, RateLimitedChatModel))
+
+    # the id and name of the wrapped model class: the serialized model, and so the LLM cache keys
+    # (llm_cache.py) and the run names in metrics, stay what they were
+    @classmethod
+    def lc_id(cls):
+        return cls._model_class().lc_id()
+
+    def get_name(self, suffix=None, *, name=None):
+        return super().get_name(suffix, name=name or self.name or self._model_class().__name__)
+
+    @staticmethod
+    def _reservation(messages):
+        return sum(message_tokens(m) for m in messages) + RATE_LIMIT_OUTPUT_TOKENS
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        generate = super()._generate
+        return get_scheduler().call(
+            self.rate_limit_provider, lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._reservation(messages), priority=node_priority(), used_tokens=_result_tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        agenerate = super()._agenerate
+        return await get_scheduler().acall(
+            self.rate_limit_provider, lambda: agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._reservation(messages), priority=node_priority(), used_tokens=_result_tokens)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        stream = super()._stream
+        yield from get_scheduler().stream(
+            self.rate_limit_provider, lambda: stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._reservation(messages), priority=node_priority(), chunk_tokens=_chunk_tokens)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        astream = super()._astream
+        async for chunk in get_scheduler().astream(
+                self.rate_limit_provider, lambda: astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                tokens=self._reservation(messages), priority=node_priority(), chunk_tokens=_chunk_tokens):
+            yield chunk
+
+
+def _raise_returned_error(result):
+    # TavilySearch returns {"error": exception} instead of raising; raise it so it can be retried
+    if isinstance(result, dict) and isinstance(result.get("error"), BaseException):
+        raise result["error"]
+    return result
+
+
+def _error_result(error):
+    # what is left after the retries goes back to the agent as a tool result, like TavilySearch's own
+    # {"error": ...}, instead of failing the run ("No search results found" is never retried at all)
+    return {"error": f"{type(error).__name__}: {error}"}
+
+
+def rate_limited_tool(tool, provider):
+    """Wraps a tool (TavilySearch) into a tool with the same name/description/arguments whose calls
+    go through the scheduler as calls of `provider`. Errors that are final come back as {"error": ...}."""
+
+    def run(**kwargs):
+        try:
+            return get_scheduler().call(
+                provider, lambda: _raise_returned_error(tool.invoke(kwargs)), priority=node_priority())
+        except Exception as e:
+            return _error_result(e)
+
+    async def arun(**kwargs):
+        async def invoke():
+            return _raise_returned_error(await tool.ainvoke(kwargs))
+        try:
+            return await get_scheduler().acall(provider, invoke, priority=node_priority())
+        except Exception as e:
+            return _error_result(e)
+
+    return StructuredTool.from_function(
+        func = run,
+        coroutine = arun,
+        name = tool.name,
+        description = tool.description,
+        args_schema = tool.args_schema,
+    )
@@ -0,0 +1,231 @@
+# rerank.py
+"""Reranking and selection between the MultiQuery hybrid retriever and the RetrievalQA "stuff" prompt.
+
+The MultiQuery retriever returns the union of every variant's BM25 + dense results (often 20-40 chunks),
+and the stuff chain would paste all of them into one prompt. RerankingRetriever keeps a small,
+bounded context instead:
+
+    1. score every candidate against the original question in one batch
+         RERANK_MODEL unset   cosine of the (cached) MiniLM embeddings
+         RERANK_MODEL=<name>  a sentence-transformers CrossEncoder, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+    2. MMR: greedily take the chunk with the best  lambda * relevance - (1 - lambda) * max similarity
+       to the chunks already taken, so near-duplicates from overlapping variants are skipped
+    3. stop at RERANK_MAX_DOCS chunks or RERANK_TOKEN_BUDGET estimated tokens, whichever comes first
+
+Scores are cached per (scorer, question, chunk text) in memory and in SQLite (RERANK_CACHE_PATH),
+so the same chunks coming back for a repeated or related question are not scored twice.
+RERANK_ENABLED=0 gives the chain the full MultiQuery result again.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from metrics import metrics
+from paper import estimate_tokens
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "1") != "0"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_CACHE_PATH = os.getenv("RERANK_CACHE_PATH", os.path.join(base_dir, "cache", "rerank.sqlite"))
+RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "2000"))
+RERANK_MAX_DOCS = int(os.getenv("RERANK_MAX_DOCS", "8"))
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+RERANK_CACHE_MEMORY_ITEMS = int(os.getenv("RERANK_CACHE_MEMORY_ITEMS", "20000"))
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingScorer:
+    """Relevance = cosine(question, chunk) with the retrieval embeddings; chunk vectors come from their cache."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.name = f"embedding:{getattr(embeddings, 'model_name', type(embeddings).__name__)}"
+
+    def score(self, query, texts):
+        vectors = _unit_rows(self.embeddings.embed_documents([query] + list(texts)))
+        return vectors[1:] @ vectors[0]
+
+
+class CrossEncoderScorer:
+    """Relevance = a sentence-transformers CrossEncoder run over (question, chunk) pairs on the CPU."""
+
+    def __init__(self, model_name, batch_size=32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.name = f"cross-encoder:{model_name}"
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def score(self, query, texts):
+        return np.asarray(
+            self.model.predict([(query, text) for text in texts], batch_size=self.batch_size), dtype=np.float32)
+
+
+class ScoreCache:
+    """(scorer, question, chunk) -> score, in an LRU in front of a SQLite table shared by all workers."""
+
+    def __init__(self, path=RERANK_CACHE_PATH, memory_items=RERANK_CACHE_MEMORY_ITEMS):
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL, created_at REAL NOT NULL)")
+        self._db.commit()
+
+    @staticmethod
+    def key(scorer_name, query, text):
+        return hashlib.sha256(f"{scorer_name}\0{query}\0{text}".encode('utf-8')).hexdigest()
+
+    def _remember(self, key, score):
+        self._memory[key] = score
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def scores(self, scorer, query, texts):
+        """Scores for `texts`; only the ones never seen with this question go through the scorer."""
+        keys = [self.key(scorer.name, query, text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(part))})", part).fetchall()
+                for key, score in rows:
+                    found[key] = score
+                    self._remember(key, score)
+
+        to_score = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                to_score.setdefault(key, text)
+        if to_score:
+            new_scores = scorer.score(query, list(to_score.values()))
+            now = time.time()
+            with self._lock:
+                rows = []
+                for key, score in zip(to_score, new_scores):
+                    found[key] = float(score)
+                    self._remember(key, float(score))
+                    rows.append((key, float(score), now))
+                self._db.executemany("INSERT OR REPLACE INTO scores (key, score, created_at) VALUES (?, ?, ?)", rows)
+                self._db.commit()
+
+        with self._lock:
+            self._counters["misses"] += len(to_score)
+            self._counters["hits"] += len(keys) - len(to_score)
+        return np.asarray([found[key] for key in keys], dtype=np.float32)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_items"] = len(self._memory)
+        return counters
+
+
+class Reranker:
+    """Scores, diversifies and budgets the candidate chunks of one question."""
+
+    def __init__(self, embeddings, scorer=None, cache=None, token_budget=RERANK_TOKEN_BUDGET,
+                 max_docs=RERANK_MAX_DOCS, mmr_lambda=RERANK_MMR_LAMBDA):
+        self.embeddings = embeddings  # also used for the redundancy term of MMR
+        self.scorer = scorer or EmbeddingScorer(embeddings)
+        self.cache = cache or ScoreCache()
+        self.token_budget = token_budget
+        self.max_docs = max_docs
+        self.mmr_lambda = mmr_lambda
+
+    def select(self, query, docs: List[Document]) -> List[Document]:
+        start = time.perf_counter()
+        unique = {}
+        for doc in docs:  # the same chunk can come back from several variants / both retrievers
+            unique.setdefault(doc.page_content, doc)
+        candidates = list(unique.values())
+        if not candidates:
+            return []
+        texts = [doc.page_content for doc in candidates]
+
+        relevance = self.cache.scores(self.scorer, query, texts)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+        vectors = _unit_rows(self.embeddings.embed_documents(texts))
+        tokens = [estimate_tokens(text) for text in texts]
+
+        selected = []
+        redundancy = np.zeros(len(candidates), dtype=np.float32)  # max similarity to anything selected
+        open_ = np.ones(len(candidates), dtype=bool)
+        used = 0
+        while open_.any() and len(selected) < self.max_docs:
+            mmr = np.where(open_, self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy, -np.inf)
+            best = int(np.argmax(mmr))
+            open_[best] = False
+            if used + tokens[best] > self.token_budget:
+                continue  # too long for what is left; a shorter one may still fit
+            selected.append(best)
+            used += tokens[best]
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+
+        seconds = time.perf_counter() - start
+        metrics.retrieval_seconds.observe(seconds, retriever="rerank")
+        print(f"--- DocumentSearch rerank: {len(candidates)} candidates -> {len(selected)} chunks, "
+              f"~{used} tokens, {seconds * 1000:.1f} ms ---")
+        return [candidates[i] for i in selected]
+
+    def stats(self):
+        counters = self.cache.stats()
+        counters["scorer"] = self.scorer.name
+        return counters
+
+
+class RerankingRetriever(BaseRetriever):
+    """Wraps a retriever (the MultiQuery ensemble) and returns only what `reranker` selects."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base: BaseRetriever
+    reranker: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.base.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self.reranker.select(query, docs)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        docs = await self.base.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return await asyncio.to_thread(self.reranker.select, query, docs)
@@ -0,0 +1,241 @@
+# research_compaction.py
+"""Turns the researcher's tool outputs into a compact, deduplicated source list for the writer/controller.
+
+    1. split   every ToolMessage into passages (one per Tavily hit, one per DocumentSearch answer)
+    2. dedupe  exact duplicates and near duplicates (SimHash over word 3-shingles)
+    3. rank    passages by relevance to the topic (BM25 over the passages themselves)
+    4. pack    the most relevant passages under RESEARCH_TOKEN_BUDGET
+
+Every passage gets an id (S1, S2, ...) and a trace entry saying where it came from and what happened to
+it (kept / duplicate_of / over_budget), so nothing disappears silently.
+
+`researcher_view` is the in-loop counterpart: the prompt the researcher sees on each turn, with the tool
+results of older rounds replaced by short digests (the state keeps the full text for compile_research).
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from langchain_core.messages import AIMessage, ToolMessage
+
+from paper import estimate_tokens, normalize
+
+RESEARCH_TOKEN_BUDGET = int(os.getenv("RESEARCH_TOKEN_BUDGET", "6000"))
+# two passages whose 64-bit SimHash fingerprints differ in at most this many bits are near duplicates
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+SHINGLE_SIZE = 3
+# researcher loop: the last RESEARCH_KEEP_ROUNDS tool rounds are shown in full, older ones as digests
+RESEARCH_KEEP_ROUNDS = int(os.getenv("RESEARCH_KEEP_ROUNDS", "1"))
+DIGEST_PASSAGES = int(os.getenv("RESEARCH_DIGEST_PASSAGES", "5"))
+DIGEST_CHARS = int(os.getenv("RESEARCH_DIGEST_CHARS", "200"))
+
+WORD_RE = re.compile(r"\w+")
+STOPWORDS = frozenset("""a an and are as at be by for from has have how in is it its of on or that the this
+to was were what when where which who why will with about into than then there these those their""".split())
+
+
+def _words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def _terms(text):
+    # crude plural folding, enough for "agent" to match "agents"
+    return [w[:-1] if len(w) > 3 and w.endswith('s') and not w.endswith('ss') else w
+            for w in _words(text) if w not in STOPWORDS]
+
+
+def _passages_from_content(content, tool, query):
+    """Splits one ToolMessage content into [{'source', 'title', 'text'}]."""
+    if isinstance(content, list):
+        passages = []
+        for item in content:
+            if isinstance(item, dict):
+                item = item.get('text') or json.dumps(item, ensure_ascii=False)
+            passages.extend(_passages_from_content(item, tool, query))
+        return passages
+
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        data = None
+
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        # TavilySearch: {"query": ..., "results": [{"url", "title", "content", "score"}, ...]}
+        return [
+            {
+                'source': result.get('url') or tool,
+                'title': result.get('title') or '',
+                'text': result.get('content') or '',
+            }
+            for result in data['results'] if isinstance(result, dict)
+        ]
+    return [{'source': f"{tool}: {query}" if query else tool, 'title': '', 'text': str(content)}]
+
+
+def simhash(text):
+    words = _words(text)
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little') for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0).astype(np.int64) * 2 - len(hashes)
+    return sum(1 << int(i) for i in np.nonzero(votes > 0)[0])
+
+
+def _relevance(passages, topic, k1=1.5, b=0.75):
+    """BM25 score of each passage for the topic's words, with the passages as the corpus."""
+    query = set(_terms(topic))
+    docs = [Counter(_terms(p['text'] + " " + p['title'])) for p in passages]
+    if not docs or not query:
+        return [0.0] * len(passages)
+    avgdl = sum(sum(d.values()) for d in docs) / len(docs) or 1
+    scores = []
+    for doc in docs:
+        length = sum(doc.values())
+        score = 0.0
+        for word in query:
+            tf = doc.get(word, 0)
+            if tf:
+                df = sum(1 for d in docs if word in d)
+                idf = math.log((len(docs) - df + 0.5) / (df + 0.5) + 1)
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avgdl))
+        scores.append(round(score, 4))
+    return scores
+
+
+SOURCE_HEADER_RE = re.compile(r"^\[(S\d+)\] (?:(.*) )?\(([^()]*)\)(?: \[also in: .*\])?$")
+
+
+def parse_source(source):
+    """Splits a packed source string back into {'id', 'title', 'source', 'text'} (None if it isn't one)."""
+    header, _, text = source.partition("\n")
+    match = SOURCE_HEADER_RE.match(header)
+    if not match:
+        return None
+    return {'id': match.group(1), 'title': match.group(2) or '', 'source': match.group(3), 'text': text}
+
+
+def compact_research(messages, topic, token_budget=RESEARCH_TOKEN_BUDGET, prior=()):
+    """Returns (sources, trace): the packed source strings for 'researcher_result' and one trace entry
+    per passage found in the ToolMessages of `messages`.
+
+    `prior` are passages from earlier runs ({'source', 'title', 'text'}, see research_memory.py); they
+    compete with this run's tool results (tool 'memory'), which win over them when they are duplicates."""
+    queries = {}
+    passages = []
+    for m in messages:
+        for call in getattr(m, 'tool_calls', None) or []:
+            args = call.get('args') or {}
+            queries[call.get('id')] = args.get('query') or args.get('__arg1') or json.dumps(args, ensure_ascii=False)
+        if not isinstance(m, ToolMessage):
+            continue
+        tool = m.name or 'tool'
+        query = queries.get(m.tool_call_id, '')
+        for passage in _passages_from_content(m.content, tool, query):
+            if passage['text'].strip():
+                passage['id'] = f"S{len(passages) + 1}"
+                passage['tool'] = tool
+                passage['tokens'] = estimate_tokens(passage['text'])
+                passages.append(passage)
+    for item in prior:
+        if item['text'].strip():
+            passages.append({
+                'id': f"S{len(passages) + 1}", 'source': item['source'], 'title': item.get('title') or '',
+                'text': item['text'], 'tool': 'memory', 'tokens': estimate_tokens(item['text']),
+            })
+
+    for passage, score in zip(passages, _relevance(passages, topic)):
+        passage['relevance'] = score
+
+    # most relevant first, so the copy that survives deduplication is the best ranked one
+    ranked = sorted(passages, key=lambda p: (-p['relevance'], -p['tokens']))
+    trace = {p['id']: {k: p[k] for k in ('id', 'source', 'title', 'tool', 'tokens', 'relevance')} for p in passages}
+
+    kept = []
+    seen_exact = {}
+    for passage in ranked:
+        exact = hashlib.sha256(normalize(passage['text']).lower().encode('utf-8')).hexdigest()
+        duplicate_of = seen_exact.get(exact)
+        if duplicate_of is None:
+            fingerprint = simhash(passage['text'])
+            duplicate_of = next(
+                (k for k in kept if bin(k['simhash'] ^ fingerprint).count('1') <= SIMHASH_MAX_DISTANCE), None)
+            passage['simhash'] = fingerprint
+        if duplicate_of is not None:
+            duplicate_of.setdefault('also_from', []).append(passage['source'])
+            trace[passage['id']]['status'] = f"duplicate_of:{duplicate_of['id']}"
+            continue
+        seen_exact[exact] = passage
+        kept.append(passage)
+
+    used = 0
+    sources = []
+    for passage in kept:
+        if used + passage['tokens'] > token_budget and sources:
+            trace[passage['id']]['status'] = 'over_budget'
+            continue
+        used += passage['tokens']
+        trace[passage['id']]['status'] = 'kept'
+        header = f"[{passage['id']}] {passage['title']} ({passage['source']})" if passage['title'] else f"[{passage['id']}] ({passage['source']})"
+        if passage.get('also_from'):
+            trace[passage['id']]['also_from'] = passage['also_from']
+            header += f" [also in: {', '.join(dict.fromkeys(passage['also_from']))}]"
+        sources.append(f"{header}\n{passage['text'].strip()}")
+
+    return sources, [trace[p['id']] for p in passages]
+
+
+def message_tokens(message):
+    """Estimated prompt tokens of one message (content + tool call arguments)."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    calls = getattr(message, 'tool_calls', None)
+    return estimate_tokens(content) + (estimate_tokens(json.dumps(calls, ensure_ascii=False)) if calls else 0)
+
+
+def digest(message, query=''):
+    """A few lines standing in for an already-read tool result: title, source and the first words of each passage."""
+    passages = [p for p in _passages_from_content(message.content, message.name or 'tool', query) if p['text'].strip()]
+    lines = [f"[digest of an earlier {message.name or 'tool'} result, {len(passages)} passages; "
+             f"the full text is kept for the writer]"]
+    for passage in passages[:DIGEST_PASSAGES]:
+        text = normalize(passage['text'])
+        if len(text) > DIGEST_CHARS:
+            text = text[:DIGEST_CHARS].rsplit(' ', 1)[0] + " ..."
+        lines.append(f"- {passage['title'] + ' ' if passage['title'] else ''}({passage['source']}): {text}")
+    if len(passages) > DIGEST_PASSAGES:
+        lines.append(f"- ... {len(passages) - DIGEST_PASSAGES} more")
+    return "\n".join(lines)
+
+
+def researcher_view(messages, keep_rounds=RESEARCH_KEEP_ROUNDS):
+    """Returns (prompt messages, number of digested ToolMessages) for the researcher's next turn.
+
+    A round is one AIMessage with tool_calls and the ToolMessages answering it. The tool results of all
+    but the last `keep_rounds` rounds are replaced by `digest`s (same tool_call_id, so every call stays
+    answered); everything else is passed through unchanged.
+    """
+    round_starts = [i for i, m in enumerate(messages) if isinstance(m, AIMessage) and m.tool_calls]
+    if len(round_starts) <= keep_rounds:
+        return list(messages), 0
+    cutoff = round_starts[len(round_starts) - keep_rounds] if keep_rounds > 0 else len(messages)
+
+    queries = {}
+    view = []
+    digested = 0
+    for i, m in enumerate(messages):
+        for call in getattr(m, 'tool_calls', None) or []:
+            args = call.get('args') or {}
+            queries[call.get('id')] = args.get('query') or args.get('__arg1') or ''
+        if i < cutoff and isinstance(m, ToolMessage):
+            m = ToolMessage(content=digest(m, queries.get(m.tool_call_id, '')), tool_call_id=m.tool_call_id,
+                            name=m.name, id=m.id, status=m.status)
+            digested += 1
+        view.append(m)
+    return view, digested
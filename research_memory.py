@@ -0,0 +1,221 @@
+# research_memory.py
+"""Cross-run research memory: the compiled research passages of earlier runs, searchable by topic.
+
+Users submit many overlapping topics ("memory in LLM agents", "agent memory mechanisms", ...), and every
+run used to search the web from scratch. Now:
+
+    1. compile_research stores the passages this run's tools found (title, source, text, embedding, time)
+    2. on the next run the researcher's first turn looks up the passages closest to the new topic
+       (cosine >= RESEARCH_MEMORY_THRESHOLD, younger than RESEARCH_MEMORY_MAX_AGE_DAYS, at most
+       RESEARCH_MEMORY_TOP_K), shows them in its prompt so it only searches for what is missing, and
+       compile_research packs them together with the new tool results
+
+Passages are deduplicated by content hash (a passage found again just gets a new timestamp), and the
+index is bounded (RESEARCH_MEMORY_MAX_PASSAGES, oldest first). Every run is recorded with the number of
+memory passages it got and the tool calls it made, so stats() can report the hit rate and an estimate
+of the tool calls avoided (average tool calls of runs without hits minus those of runs with hits).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from paper import estimate_tokens, normalize
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+RESEARCH_MEMORY_ENABLED = os.getenv("RESEARCH_MEMORY_ENABLED", "1") != "0"
+RESEARCH_MEMORY_PATH = os.getenv("RESEARCH_MEMORY_PATH", os.path.join(base_dir, "cache", "research_memory.sqlite"))
+RESEARCH_MEMORY_THRESHOLD = float(os.getenv("RESEARCH_MEMORY_THRESHOLD", "0.45"))
+RESEARCH_MEMORY_TOP_K = int(os.getenv("RESEARCH_MEMORY_TOP_K", "8"))
+RESEARCH_MEMORY_MAX_AGE_DAYS = float(os.getenv("RESEARCH_MEMORY_MAX_AGE_DAYS", "30"))
+RESEARCH_MEMORY_MAX_PASSAGES = int(os.getenv("RESEARCH_MEMORY_MAX_PASSAGES", "20000"))
+# prior passages shown to the researcher are cut to this many estimated tokens
+RESEARCH_MEMORY_TOKEN_BUDGET = int(os.getenv("RESEARCH_MEMORY_TOKEN_BUDGET", "2500"))
+
+
+class ResearchMemory:
+    """Passages of earlier runs in SQLite, with an in-memory matrix of their embeddings."""
+
+    def __init__(self, embeddings, path=RESEARCH_MEMORY_PATH, threshold=RESEARCH_MEMORY_THRESHOLD,
+                 top_k=RESEARCH_MEMORY_TOP_K, max_age_days=RESEARCH_MEMORY_MAX_AGE_DAYS,
+                 max_passages=RESEARCH_MEMORY_MAX_PASSAGES):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.top_k = top_k
+        self.max_age_days = max_age_days
+        self.max_passages = max_passages
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "hits": 0, "passages_served": 0, "passages_stored": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS passages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT NOT NULL UNIQUE,
+                topic TEXT NOT NULL,
+                run_id TEXT,
+                source TEXT NOT NULL,
+                title TEXT NOT NULL,
+                text TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                memory_passages INTEGER NOT NULL,
+                tool_calls INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+        # id -> row of the matrix; rebuilt from SQLite when other workers add passages
+        self._ids = []
+        self._created = np.zeros(0, dtype=np.float64)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._last_id = 0
+
+    def _embed(self, texts):
+        vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _sync(self):
+        """Pulls passages added since the last sync (possibly by other workers) into the matrix."""
+        rows = self._db.execute(
+            "SELECT id, embedding, created_at FROM passages WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+        if not rows:
+            return
+        vectors = np.stack([np.frombuffer(blob, dtype=np.float16).astype(np.float32) for _, blob, _ in rows])
+        self._matrix = vectors if self._matrix.size == 0 else np.vstack([self._matrix, vectors])
+        self._created = np.concatenate([self._created, [created for _, _, created in rows]])
+        self._ids.extend(row_id for row_id, _, _ in rows)
+        self._last_id = rows[-1][0]
+
+    def lookup(self, topic):
+        """The stored passages closest to `topic`: [{'source', 'title', 'text', 'score', 'age_days', 'topic'}]."""
+        with self._lock:
+            self._sync()
+            self._counters["lookups"] += 1
+        if not self._ids:
+            return []
+
+        query = self._embed([topic])[0]
+        with self._lock:
+            scores = self._matrix @ query
+            fresh = self._created >= time.time() - self.max_age_days * 86400
+            candidates = [i for i in np.argsort(-scores) if fresh[i] and scores[i] >= self.threshold]
+            passages = []
+            for position in candidates:
+                row = self._db.execute(
+                    "SELECT topic, source, title, text, created_at FROM passages WHERE id = ?", (self._ids[position],)
+                ).fetchone()
+                if row is None:  # replaced or evicted since the last rebuild
+                    continue
+                topic_of, source, title, text, created_at = row
+                passages.append({
+                    'source': source, 'title': title, 'text': text, 'topic': topic_of,
+                    'score': round(float(scores[position]), 4),
+                    'age_days': round((time.time() - created_at) / 86400, 2),
+                })
+                if len(passages) >= self.top_k:
+                    break
+            if passages:
+                self._counters["hits"] += 1
+                self._counters["passages_served"] += len(passages)
+        return passages
+
+    def store(self, topic, run_id, passages):
+        """Adds this run's passages ({'source', 'title', 'text'}); known ones only get a new timestamp."""
+        passages = [p for p in passages if p['text'].strip()]
+        if not passages:
+            return 0
+        vectors = self._embed([f"{p['title']}\n{p['text']}" for p in passages]).astype(np.float16)
+        now = time.time()
+        with self._lock:
+            for passage, vector in zip(passages, vectors):
+                content_hash = hashlib.sha256(normalize(passage['text']).lower().encode('utf-8')).hexdigest()
+                # delete + insert: the refreshed passage gets a new id, so the matrix picks up its new timestamp
+                self._db.execute("DELETE FROM passages WHERE content_hash = ?", (content_hash,))
+                self._db.execute(
+                    """INSERT INTO passages (content_hash, topic, run_id, source, title, text, embedding, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (content_hash, topic, run_id, passage['source'], passage['title'], passage['text'],
+                     vector.tobytes(), now),
+                )
+            self._evict()
+            self._db.commit()
+            self._counters["passages_stored"] += len(passages)
+            self._rebuild_if_needed()
+        return len(passages)
+
+    def record_run(self, run_id, topic, memory_passages, tool_calls):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs (run_id, topic, memory_passages, tool_calls, created_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id or f"anonymous-{time.time()}", topic, memory_passages, tool_calls, time.time()),
+            )
+            self._db.commit()
+
+    def _evict(self):
+        self._db.execute("DELETE FROM passages WHERE created_at < ?", (time.time() - self.max_age_days * 86400,))
+        count = self._db.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+        if count > self.max_passages:
+            self._db.execute(
+                "DELETE FROM passages WHERE id IN (SELECT id FROM passages ORDER BY created_at LIMIT ?)",
+                (count - self.max_passages,),
+            )
+
+    def _rebuild_if_needed(self):
+        # refreshed / evicted passages leave dead rows in the matrix; rebuild when they pile up
+        live = self._db.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+        if len(self._ids) > 2 * max(live, 16):
+            self._ids, self._matrix, self._last_id = [], np.zeros((0, 0), dtype=np.float32), 0
+            self._created = np.zeros(0, dtype=np.float64)
+        self._sync()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["passages"] = self._db.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+            runs, hit_runs, hit_calls, miss_calls = self._db.execute(
+                """SELECT COUNT(*), SUM(memory_passages > 0),
+                          AVG(CASE WHEN memory_passages > 0 THEN tool_calls END),
+                          AVG(CASE WHEN memory_passages = 0 THEN tool_calls END) FROM runs"""
+            ).fetchone()
+        counters["lookup_hit_rate"] = round(counters["hits"] / counters["lookups"], 4) if counters["lookups"] else None
+        counters["runs"] = runs
+        counters["run_hit_rate"] = round(hit_runs / runs, 4) if runs else None
+        counters["avg_tool_calls_with_memory"] = round(hit_calls, 2) if hit_calls is not None else None
+        counters["avg_tool_calls_without_memory"] = round(miss_calls, 2) if miss_calls is not None else None
+        if hit_calls is not None and miss_calls is not None:
+            counters["tool_calls_avoided_estimate"] = round((miss_calls - hit_calls) * hit_runs, 1)
+        return counters
+
+
+def prior_research_message(passages, token_budget=RESEARCH_MEMORY_TOKEN_BUDGET):
+    """The text shown to the researcher on top of its prompt (None without passages)."""
+    lines = []
+    used = 0
+    for number, passage in enumerate(passages, 1):
+        block = f"[M{number}] {passage['title'] + ' ' if passage['title'] else ''}({passage['source']}, " \
+                f"{passage['age_days']:.0f} days old)\n{passage['text'].strip()}"
+        if used + estimate_tokens(block) > token_budget and lines:
+            break
+        used += estimate_tokens(block)
+        lines.append(block)
+    if not lines:
+        return None
+    return ("Research from earlier runs on similar topics (it will be given to the writer as well). "
+            "Use it instead of searching again; only search for what it does not cover or what must be more recent.\n\n"
+            + "\n\n".join(lines))
@@ -0,0 +1,99 @@
+# resources.py
+"""Lazy registry for the heavy objects the agent needs (embedding model, vector db, retrievers, chains).
+
+Nothing is built at import time. Each resource is created the first time somebody asks for it
+(or all at once through `warmup()`), then shared by every request running in the same worker.
+"""
+
+import threading
+import time
+
+
+class ResourceRegistry:
+    """Builds named resources on first use and remembers how long each one took."""
+
+    def __init__(self):
+        self._factories = {}
+        self._order = []
+        self._instances = {}
+        self._timings = {}
+        self._errors = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        self._local = threading.local()
+
+    def register(self, name, factory):
+        """Registers a zero-argument factory. The factory may call `get()` for its own dependencies."""
+        with self._registry_lock:
+            if name not in self._factories:
+                self._order.append(name)
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.RLock())
+
+    def get(self, name):
+        """Returns the resource, building it (once per process) if it is not ready yet."""
+        if name in self._instances:
+            return self._instances[name]
+
+        if name not in self._factories:
+            raise KeyError(f"Unknown resource: {name}")
+
+        # one lock per resource so two requests don't both load the embedding model,
+        # while unrelated resources can still be built in parallel.
+        with self._locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+
+            # timings are exclusive: a factory that pulls in its dependencies is not charged for them.
+            stack = self._local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self._errors[name] = repr(e)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+            self._timings[name] = elapsed - child_time
+            self._errors.pop(name, None)
+            self._instances[name] = instance
+            print(f"--- RESOURCE READY: {name} ({self._timings[name]:.2f}s) ---")
+            return instance
+
+    def peek(self, name):
+        """Returns the resource if it is already built, None otherwise (never triggers a build)."""
+        return self._instances.get(name)
+
+    def warmup(self, names=None):
+        """Eagerly builds the given resources (all registered ones by default) and returns the timings."""
+        for name in names or list(self._order):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"❌ Warmup failed for {name}: {e}")
+        return self.status()
+
+    def is_ready(self, names=None):
+        return all(name in self._instances for name in (names or self._order))
+
+    def status(self):
+        """Readiness snapshot: which resources are loaded, how long each startup phase took, and errors."""
+        return {
+            "ready": self.is_ready(),
+            "resources": {
+                name: {
+                    "loaded": name in self._instances,
+                    "seconds": round(self._timings[name], 4) if name in self._timings else None,
+                    "error": self._errors.get(name),
+                }
+                for name in self._order
+            },
+            "total_seconds": round(sum(self._timings.values()), 4),
+        }
+
+
+registry = ResourceRegistry()
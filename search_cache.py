@@ -0,0 +1,175 @@
+# search_cache.py
+"""Persistent cache + single-flight deduplication for the Tavily web search tool.
+
+SEARCH_CACHE_MODE
+    online   (default) serve from the cache, call Tavily on a miss and store the result
+    offline  serve only from the cache; a miss raises SearchCacheMiss (replay a graph without network)
+    off      always call Tavily
+
+Identical queries that are in flight at the same time (e.g. two concurrent research runs on similar
+topics) share a single outbound call: the first caller fetches, the others wait for its result.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+
+from langchain_core.tools import StructuredTool
+
+from kv_store import SqliteKV
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(base_dir, "cache", "search.sqlite"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(24 * 3600)))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+SEARCH_CACHE_MODE = os.getenv("SEARCH_CACHE_MODE", "online")
+
+
+class SearchCacheMiss(LookupError):
+    """Raised in offline mode when a query was never recorded."""
+
+
+def is_error_result(result):
+    """TavilySearch returns its failures ({"error": ...}) instead of raising them."""
+    return isinstance(result, dict) and "error" in result
+
+
+def search_key(tool_name, args):
+    canonical = json.dumps({"tool": tool_name, "args": args}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SearchCache:
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl_seconds=SEARCH_CACHE_TTL_SECONDS,
+                 max_bytes=SEARCH_CACHE_MAX_BYTES, mode=SEARCH_CACHE_MODE):
+        if mode not in ("online", "offline", "off"):
+            raise ValueError(f"SEARCH_CACHE_MODE must be online, offline or off, got {mode!r}")
+        self.mode = mode
+        self.ttl_seconds = ttl_seconds
+        self.store = SqliteKV(path, max_bytes=max_bytes, default_ttl=ttl_seconds)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "deduplicated": 0, "fetches": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """Returns the cached result for `key`, or runs `fetch()` once (even for concurrent callers)."""
+        if self.mode == "off":
+            self._count("fetches")
+            return fetch()
+
+        cached = self.store.get(key)
+        if cached is not None:
+            self._count("hits")
+            return json.loads(cached)
+
+        if self.mode == "offline":
+            self._count("misses")
+            raise SearchCacheMiss(f"Search result not in cache (offline mode): {key}")
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._counters["misses"] += 1
+            else:
+                self._counters["deduplicated"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            self._count("fetches")
+            result = fetch()
+            # a returned error goes to the waiting callers as well, but the next call tries again
+            if not is_error_result(result):
+                self.store.set(key, json.dumps(result, ensure_ascii=False, default=str), ttl=ttl)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            # errors are handed to the waiting callers but never cached
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_fetch(self, key, afetch, ttl=None):
+        """Async version of get_or_fetch. In-flight calls are shared with sync callers too
+        (both wait on the same concurrent.futures.Future)."""
+        if self.mode == "off":
+            self._count("fetches")
+            return await afetch()
+
+        cached = await asyncio.to_thread(self.store.get, key)
+        if cached is not None:
+            self._count("hits")
+            return json.loads(cached)
+
+        if self.mode == "offline":
+            self._count("misses")
+            raise SearchCacheMiss(f"Search result not in cache (offline mode): {key}")
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._counters["misses"] += 1
+            else:
+                self._counters["deduplicated"] += 1
+
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            self._count("fetches")
+            result = await afetch()
+            if not is_error_result(result):
+                await asyncio.to_thread(self.store.set, key, json.dumps(result, ensure_ascii=False, default=str), ttl)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["inflight"] = len(self._inflight)
+        counters.update(self.store.stats())
+        counters["mode"] = self.mode
+        return counters
+
+
+def cached_search_tool(search_tool, get_cache):
+    """Wraps a search tool (TavilySearch) into a tool with the same name/description/arguments
+    whose calls go through the cache returned by `get_cache()` (resolved lazily, on the first call)."""
+
+    def search(**kwargs):
+        return get_cache().get_or_fetch(search_key(search_tool.name, kwargs), lambda: search_tool.invoke(kwargs))
+
+    async def asearch(**kwargs):
+        return await get_cache().aget_or_fetch(search_key(search_tool.name, kwargs), lambda: search_tool.ainvoke(kwargs))
+
+    return StructuredTool.from_function(
+        func = search,
+        coroutine = asearch,
+        name = search_tool.name,
+        description = search_tool.description,
+        args_schema = search_tool.args_schema,
+    )
@@ -0,0 +1,68 @@
+# tests/fake_provider.py
+"""A local stand-in for Gemini with a hard quota, for tests/test_rate_limit.py and
+benchmarks/rate_limit_bench.py."""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, ClassVar
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from rate_limit import RateLimitedChatModel
+from research_compaction import message_tokens
+
+OUTPUT_TOKENS = 300
+
+
+class QuotaExceeded(Exception):
+    status_code = 429
+
+
+class FakeProvider:
+    """Sliding-window quota like the real APIs: over the limit -> 429."""
+
+    def __init__(self, rps, tpm, latency, retry_delay=1):
+        self.rps = rps
+        self.tpm = tpm
+        self.latency = latency
+        self.retry_delay = retry_delay
+        self._calls = deque()  # (time, tokens) of the last minute
+        self.served = 0
+        self.rejected = 0
+
+    async def call(self, tokens):
+        now = time.monotonic()
+        while self._calls and self._calls[0][0] < now - 60:
+            self._calls.popleft()
+        last_second = sum(1 for at, _ in self._calls if at >= now - 1)
+        if last_second >= self.rps or sum(t for _, t in self._calls) + tokens > self.tpm:
+            self.rejected += 1
+            raise QuotaExceeded(f"429 RESOURCE_EXHAUSTED: quota exceeded, retryDelay {self.retry_delay}s")
+        self._calls.append((now, tokens))
+        self.served += 1
+        await asyncio.sleep(self.latency)
+
+
+class FakeGemini(BaseChatModel):
+    provider: Any
+
+    @property
+    def _llm_type(self):
+        return "fake-gemini"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError("the fake provider is async")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        input_tokens = sum(message_tokens(m) for m in messages)
+        await self.provider.call(input_tokens + OUTPUT_TOKENS)
+        usage = {"input_tokens": input_tokens, "output_tokens": OUTPUT_TOKENS,
+                 "total_tokens": input_tokens + OUTPUT_TOKENS}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok", usage_metadata=usage))])
+
+
+class ScheduledFakeGemini(RateLimitedChatModel, FakeGemini):
+    rate_limit_provider: ClassVar[str] = "fake"
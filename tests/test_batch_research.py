@@ -0,0 +1,50 @@
+# tests/test_batch_research.py
+import asyncio
+from typing import Annotated, Sequence, TypedDict
+
+from langchain_core.messages import BaseMessage
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+
+from batch_research import BatchSummary, run_topic
+from checkpoints import CheckpointStore
+
+
+class State(TypedDict, total=False):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+    run_id: str
+    rewriter_counter: int
+    document_path: str
+
+
+def no_report_graph(store, seen):
+    """Reaches END without a report, like a run whose formatter failed."""
+
+    def writer(state):
+        seen.append((len(state["messages"]), state.get("rewriter_counter", 0)))
+        return {"rewriter_counter": state.get("rewriter_counter", 0) + 1}
+
+    graph = StateGraph(State)
+    graph.add_node("writer", writer)
+    graph.set_entry_point("writer")
+    graph.add_edge("writer", END)
+    return graph.compile(checkpointer=store.saver)
+
+
+def test_rerun_of_a_finished_failed_topic_starts_fresh(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    seen = []
+    graph = no_report_graph(store, seen)
+    summary = BatchSummary(str(tmp_path))
+    summary.entries["run-1"] = {"run_id": "run-1", "index": 1, "topic": "topic"}
+
+    async def run():
+        await run_topic(graph, store, summary, str(tmp_path), 1, "topic", "run-1", asyncio.Semaphore(1))
+
+    asyncio.run(run())
+    assert summary.entries["run-1"]["status"] == "failed"
+    asyncio.run(run())
+
+    # the second attempt sees one topic message and an unused rewrite budget, not the old thread
+    assert seen == [(1, 0), (1, 0)]
+    assert store.get("run-1")["status"] == "failed"
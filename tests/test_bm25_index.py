@@ -0,0 +1,110 @@
+# tests/test_bm25_index.py
+import random
+
+import pytest
+from langchain_community.retrievers import BM25Retriever
+from langchain_core.documents import Document
+
+from bm25_index import MmapBM25Retriever, build_bm25_index, load_bm25_retriever
+
+WORDS = ["bm25", "index", "ranking", "query", "token", "corpus", "term", "score", "retrieval", "search",
+         "memory", "paper", "agent", "graph", "node", "writer", "research", "chunk", "vector", "dense"]
+
+QUERIES = [
+    "bm25 ranking",
+    "query query token",        # repeated query terms count twice
+    "retrieval search corpus",
+    "graph",
+    "unknown words only",       # every score is 0: the order is pure tie breaking
+    "agent unknown writer",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def docs():
+    rng = random.Random(7)
+    texts = [" ".join(rng.choices(WORDS, k=rng.randint(3, 30))) for _ in range(200)]
+    # identical documents and documents of the same length with the same terms tie exactly
+    texts += ["bm25 ranking query"] * 5 + ["ranking bm25 query", "query ranking bm25"]
+    texts += ["graph node"] * 4 + [""]
+    return [Document(page_content=text, metadata={"row": i}) for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def index_dir(tmp_path, docs):
+    path = tmp_path / "bm25_index"
+    build_bm25_index([doc.page_content for doc in docs], str(path))
+    return str(path)
+
+
+def rows(documents):
+    return [doc.metadata["row"] for doc in documents]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_same_top_k_as_bm25_retriever(docs, index_dir, query):
+    expected = BM25Retriever.from_documents(docs, k=7)
+    retriever = MmapBM25Retriever.load(index_dir, docs=docs, k=7)
+    assert rows(retriever.invoke(query)) == rows(expected.invoke(query))
+
+
+def test_same_scores_as_bm25_okapi(docs, index_dir):
+    expected = BM25Retriever.from_documents(docs).vectorizer
+    index = MmapBM25Retriever.load(index_dir, docs=docs).index
+    for query in QUERIES:
+        assert index.get_scores(query.split()).tolist() == expected.get_scores(query.split()).tolist()
+
+
+def test_load_uses_the_index(docs, index_dir):
+    retriever = load_bm25_retriever(index_dir, docs, k=7)
+    assert isinstance(retriever, MmapBM25Retriever) and retriever.k == 7
+
+
+def test_missing_index_falls_back_to_bm25_retriever(docs, tmp_path):
+    retriever = load_bm25_retriever(str(tmp_path / "missing"), docs, k=7)
+    assert isinstance(retriever, BM25Retriever) and retriever.k == 7
+
+
+def test_stale_index_falls_back_to_bm25_retriever(docs, index_dir, capsys):
+    # chunks were added after the index was built
+    more_docs = docs + [Document(page_content="bm25 ranking bm25 ranking", metadata={"row": len(docs)})]
+    retriever = load_bm25_retriever(index_dir, more_docs, k=7)
+
+    assert isinstance(retriever, BM25Retriever) and retriever.k == 7
+    assert "stale" in capsys.readouterr().out
+    expected = BM25Retriever.from_documents(more_docs, k=7)
+    for query in QUERIES:
+        assert rows(retriever.invoke(query)) == rows(expected.invoke(query))
+    assert len(retriever.docs) == len(more_docs)
+
+
+class VersionedChunks(list):
+    """A list of documents with the chunk store's corpus_version."""
+
+    def __init__(self, docs, corpus_version):
+        super().__init__(docs)
+        self.corpus_version = corpus_version
+
+
+def test_index_of_the_same_corpus_version_is_used(docs, tmp_path):
+    index_dir = str(tmp_path / "bm25_index")
+    build_bm25_index([doc.page_content for doc in docs], index_dir, corpus_version="v1")
+    retriever = load_bm25_retriever(index_dir, VersionedChunks(docs, "v1"), k=7)
+    assert isinstance(retriever, MmapBM25Retriever)
+
+
+def test_index_of_another_corpus_version_falls_back(docs, tmp_path, capsys):
+    index_dir = str(tmp_path / "bm25_index")
+    build_bm25_index([doc.page_content for doc in docs], index_dir, corpus_version="v1")
+
+    # re-ingested: one chunk has new text, the chunk count is the same
+    changed = VersionedChunks(docs[:-1] + [Document(page_content="bm25 ranking", metadata={"row": len(docs) - 1})],
+                              "v2")
+    retriever = load_bm25_retriever(index_dir, changed, k=7)
+
+    assert isinstance(retriever, BM25Retriever)
+    assert "stale" in capsys.readouterr().out
+    expected = BM25Retriever.from_documents(changed, k=7)
+    for query in QUERIES:
+        assert rows(retriever.invoke(query)) == rows(expected.invoke(query))
@@ -0,0 +1,52 @@
+# tests/test_checkpoints.py
+import functools
+import os
+import subprocess
+import sys
+
+import pytest
+
+import checkpoints
+from checkpoints import CheckpointStore, get_checkpoint_store, prune_old_runs
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoints.sqlite")
+    monkeypatch.setattr(checkpoints, "checkpoint_store", None)
+    monkeypatch.setattr(checkpoints, "CheckpointStore", functools.partial(CheckpointStore, path=path))
+    return path
+
+
+def add_old_run(path, run_id, hours):
+    store = CheckpointStore(path)
+    store.start(run_id, "topic")
+    store.finish(run_id, "failed", error="boom")
+    store._db.execute("UPDATE runs SET updated_at = updated_at - ? WHERE run_id = ?", (hours * 3600, run_id))
+    store._db.commit()
+
+
+def test_opening_the_store_does_not_prune(store_path):
+    add_old_run(store_path, "old", 1000)
+    assert get_checkpoint_store().get("old")["status"] == "failed"
+
+
+def test_prune_old_runs(store_path):
+    add_old_run(store_path, "old", 1000)
+    add_old_run(store_path, "recent", 1)
+    assert prune_old_runs() == 1
+    store = get_checkpoint_store()
+    assert store.get("old") is None and store.get("recent")
+
+
+def test_importing_workflow_does_not_touch_the_checkpoints(tmp_path):
+    pytest.importorskip("langchain_google_genai")
+    pytest.importorskip("langchain_tavily")
+    path = tmp_path / "checkpoints.sqlite"
+    env = dict(os.environ, CHECKPOINT_PATH=str(path))
+    subprocess.run([sys.executable, "-c", "import workflow"], cwd=repo_dir, env=env, check=True)
+    assert not path.exists()
+    subprocess.run([sys.executable, "-c", "import workflow; workflow.durable_app"], cwd=repo_dir, env=env, check=True)
+    assert path.exists()
@@ -0,0 +1,60 @@
+# tests/test_endpoint.py
+import asyncio
+import json
+import threading
+from typing import TypedDict
+
+import pytest
+from langgraph.graph import END, StateGraph
+
+from app import endpoint
+from checkpoints import CheckpointStore
+
+
+class State(TypedDict, total=False):
+    messages: list
+    run_id: str
+    document_path: str
+
+
+class RecordingStore(CheckpointStore):
+    """Remembers the thread every finish() ran on."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.finish_threads = []
+
+    def finish(self, run_id, status, error=None):
+        self.finish_threads.append(threading.current_thread())
+        super().finish(run_id, status, error)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = RecordingStore(str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(endpoint, "get_checkpoint_store", lambda: store, raising=False)
+    return store
+
+
+def use_graph(monkeypatch, store, document_path):
+    graph = StateGraph(State)
+    graph.add_node("formatter", lambda state: {"document_path": document_path})
+    graph.set_entry_point("formatter")
+    graph.add_edge("formatter", END)
+    monkeypatch.setattr(endpoint, "get_durable_app", lambda: graph.compile(checkpointer=store.saver))
+
+
+def stream(topic):
+    async def collect():
+        return [json.loads(line) async for line in endpoint.research_stream_generator(topic)]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("document_path, status", [("/tmp/report.docx", "completed"), (None, "failed")])
+def test_finish_runs_off_the_event_loop(monkeypatch, store, document_path, status):
+    use_graph(monkeypatch, store, document_path)
+    events = stream("topic")
+
+    assert events[-1]["status"] == status
+    assert store.get(events[0]["run_id"])["status"] == status
+    assert store.finish_threads and threading.main_thread() not in store.finish_threads
@@ -0,0 +1,188 @@
+# tests/test_job_queue.py
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Annotated, Sequence, TypedDict
+
+import pytest
+from langchain_core.messages import BaseMessage
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+
+import checkpoints
+from checkpoints import CheckpointStore
+from job_queue import Heartbeat, JobLost, JobQueue, run_job
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite"))
+
+
+@pytest.fixture
+def checkpoint_store(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(checkpoints, "checkpoint_store", store)
+    return store
+
+
+def age_heartbeat(queue, job_id, seconds):
+    queue._db.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?", (seconds, job_id))
+
+
+class State(TypedDict, total=False):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+    run_id: str
+    document_path: str
+
+
+def slow_graph(store, seconds):
+    def write(state):
+        time.sleep(seconds)
+        return {"document_path": "/tmp/report.docx"}
+
+    graph = StateGraph(State)
+    graph.add_node("writer", write)
+    graph.set_entry_point("writer")
+    graph.add_edge("writer", END)
+    return graph.compile(checkpointer=store.saver)
+
+
+def test_heartbeat_only_for_the_owning_worker(queue):
+    job_id = queue.submit("topic")
+    queue.claim("w1")
+    assert queue.heartbeat(job_id, "w1")
+    assert not queue.heartbeat(job_id, "w2")
+
+
+def test_finish_only_by_the_owning_worker(queue):
+    job_id = queue.submit("topic")
+    queue.claim("w1")
+    age_heartbeat(queue, job_id, 3600)
+    queue.requeue_stale(stale_seconds=60)
+    queue.claim("w2")
+
+    # the first worker comes back after its job was taken over
+    assert not queue.finish(job_id, "failed", error="late", worker="w1")
+    assert queue.get(job_id)["status"] == "running"
+    assert queue.finish(job_id, "completed", result={"run_id": job_id}, worker="w2")
+    assert queue.get(job_id)["status"] == "completed"
+    assert [e["status"] for e in queue.events(job_id) if "status" in e] == ["queued", "completed"]
+
+
+def test_stale_jobs_fail_after_max_attempts(queue):
+    job_id = queue.submit("topic")
+    for attempt in range(1, 4):
+        job = queue.claim(f"w{attempt}")
+        assert job["id"] == job_id and job["attempts"] == attempt
+        age_heartbeat(queue, job_id, 3600)
+        queue.requeue_stale(stale_seconds=60, max_attempts=3)
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["finished_at"]
+    assert queue.claim("w4") is None
+
+    # a manual retry starts counting again
+    assert queue.retry(job_id)
+    assert queue.claim("w4")["attempts"] == 1
+
+
+def test_heartbeat_keeps_a_long_node_from_being_requeued(queue, checkpoint_store):
+    job_id = queue.submit("topic")
+    job = queue.claim("w1")
+    graph = slow_graph(checkpoint_store, 0.6)
+    done = threading.Event()
+
+    def requeue_loop():
+        while not done.is_set():
+            JobQueue(queue.path).requeue_stale(stale_seconds=0.2)
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=requeue_loop)
+    thread.start()
+    try:
+        with Heartbeat(queue.path, job_id, "w1", interval=0.05) as heartbeat:
+            result = run_job(queue, job, graph, heartbeat)
+    finally:
+        done.set()
+        thread.join()
+
+    assert not heartbeat.lost.is_set()
+    assert result["document_path"] == "/tmp/report.docx"
+    assert queue.finish(job_id, "completed", result=result, worker="w1")
+
+
+def test_run_job_stops_when_the_job_was_taken_over(queue, checkpoint_store):
+    job_id = queue.submit("topic")
+    job = queue.claim("w1")
+    graph = slow_graph(checkpoint_store, 0.3)
+
+    # another worker claimed the job, e.g. after a heartbeat was missed
+    queue._db.execute("UPDATE jobs SET worker = 'w2' WHERE id = ?", (job_id,))
+    with pytest.raises(JobLost):
+        with Heartbeat(queue.path, job_id, "w1", interval=0.05) as heartbeat:
+            run_job(queue, job, graph, heartbeat)
+
+    assert heartbeat.lost.is_set()
+    assert queue.get(job_id)["worker"] == "w2"
+    # the run is not marked failed in the checkpoint store: it belongs to w2 now
+    assert checkpoint_store.get(job_id)["status"] != "failed"
+
+
+def test_retried_job_that_reached_end_starts_fresh(queue, checkpoint_store):
+    seen = []
+
+    def write(state):
+        seen.append(len(state["messages"]))
+        return {}
+
+    graph = StateGraph(State)
+    graph.add_node("writer", write)
+    graph.set_entry_point("writer")
+    graph.add_edge("writer", END)
+    graph = graph.compile(checkpointer=checkpoint_store.saver)
+
+    job_id = queue.submit("topic")
+    for _ in range(2):
+        job = queue.claim("w1")
+        with pytest.raises(RuntimeError, match="could not be created"):
+            run_job(queue, job, graph)
+        queue.finish(job_id, "failed", error="The report could not be created.", worker="w1")
+        queue.retry(job_id)
+
+    assert seen == [1, 1]
+
+
+def test_one_queue_shared_by_many_threads(queue):
+    # the API's threadpool requests all go through the same JobQueue (and connection)
+    errors = []
+
+    def client():
+        try:
+            for _ in range(20):
+                job_id = queue.submit("topic")
+                assert queue.get(job_id)["status"] == "queued"
+                assert queue.cancel(job_id) == "cancelled"
+                assert [e["status"] for e in queue.events(job_id)] == ["queued", "cancelled"]
+                queue.stats()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert queue.stats()["counts"]["cancelled"] == 160
+
+
+def test_importing_the_jobs_api_does_not_open_the_queue(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, JOB_DB_PATH=str(path))
+    subprocess.run([sys.executable, "-c", "import app.jobs_endpoint"], cwd=repo_dir, env=env, check=True)
+    assert not path.exists()
@@ -0,0 +1,213 @@
+# tests/test_rate_limit.py
+import asyncio
+import threading
+import time
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langgraph.graph import END, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+from pydantic import BaseModel
+
+import rate_limit
+from rate_limit import RateLimitScheduler, node_priority, rate_limited_tool
+from tests.fake_provider import FakeGemini, FakeProvider, QuotaExceeded, ScheduledFakeGemini
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    scheduler = RateLimitScheduler(path=str(tmp_path / "rate_limit.sqlite"), enabled=True, max_retries=2,
+                                   backoff_seconds=0.01, limits={"tavily": (0, 0)})
+    monkeypatch.setattr(rate_limit, "scheduler", scheduler)
+    return scheduler
+
+
+class SearchArgs(BaseModel):
+    query: str
+
+
+class FakeTavily(BaseTool):
+    """Returns errors the way TavilySearch does: {"error": exception}, never raised."""
+
+    name: str = "tavily_search"
+    description: str = "web search"
+    args_schema: Any = SearchArgs
+    errors: list = []
+
+    def _run(self, query):
+        if self.errors:
+            return {"error": self.errors.pop(0)}
+        return {"results": [{"title": "t", "url": "https://example.org", "content": query}]}
+
+
+def tool_graph(tool):
+    def agent(state):
+        return {"messages": [AIMessage(content="", tool_calls=[
+            {"name": tool.name, "args": {"query": "x"}, "id": "call-1", "type": "tool_call"}])]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("researcher", agent)
+    graph.add_node("run_tools", ToolNode([tool]))
+    graph.set_entry_point("researcher")
+    graph.add_edge("researcher", "run_tools")
+    graph.add_edge("run_tools", END)
+    return graph.compile()
+
+
+def tool_message(state):
+    return next(m for m in state["messages"] if isinstance(m, ToolMessage))
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_final_tool_error_is_returned_to_the_agent(scheduler, use_async):
+    tool = rate_limited_tool(FakeTavily(errors=[ValueError("No search results found for 'x'")]), "tavily")
+    graph = tool_graph(tool)
+
+    state = asyncio.run(graph.ainvoke({"messages": []})) if use_async else graph.invoke({"messages": []})
+
+    message = tool_message(state)
+    assert "No search results found" in message.content
+    assert scheduler.stats()["providers"]["tavily"]["retries"] == 0  # not a quota error: no retry
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_exhausted_retries_are_returned_to_the_agent(scheduler, use_async):
+    errors = [ValueError("Error 429: too many requests") for _ in range(3)]
+    tool = rate_limited_tool(FakeTavily(errors=errors), "tavily")
+    graph = tool_graph(tool)
+
+    state = asyncio.run(graph.ainvoke({"messages": []})) if use_async else graph.invoke({"messages": []})
+
+    assert "Error 429" in tool_message(state).content
+    counters = scheduler.stats()["providers"]["tavily"]
+    assert counters["retries"] == 2
+    assert counters["failures"] == 1
+
+
+def test_quota_error_is_retried_until_results(scheduler):
+    tool = rate_limited_tool(FakeTavily(errors=[ValueError("Error 429: too many requests")]), "tavily")
+
+    result = tool.invoke({"query": "agents"})
+
+    assert result["results"][0]["content"] == "agents"
+    assert scheduler.stats()["providers"]["tavily"]["retries"] == 1
+
+
+# --- the scheduler against the fake provider ---
+
+def fake_scheduler(tmp_path, monkeypatch, rps, tpm=1_000_000, **kwargs):
+    kwargs.setdefault("backoff_seconds", 0.05)
+    scheduler = RateLimitScheduler(path=str(tmp_path / "rate_limit.sqlite"), enabled=True,
+                                   limits={"fake": (rps, tpm)}, **kwargs)
+    monkeypatch.setattr(rate_limit, "scheduler", scheduler)
+    return scheduler
+
+
+async def burst(model, calls):
+    return await asyncio.gather(*(model.ainvoke("hello") for _ in range(calls)))
+
+
+def test_no_quota_error_gets_past_the_scheduler(tmp_path, monkeypatch):
+    scheduler = fake_scheduler(tmp_path, monkeypatch, rps=18)
+    provider = FakeProvider(rps=20, tpm=1_000_000, latency=0.01, retry_delay=0)
+
+    results = asyncio.run(burst(ScheduledFakeGemini(provider=provider), 15))
+
+    assert [r.content for r in results] == ["ok"] * 15
+    assert provider.rejected == 0
+    counters = scheduler.stats()["providers"]["fake"]
+    assert counters["calls"] == 15 and counters["quota_errors"] == 0 and counters["waited_calls"] > 0
+
+
+def test_without_the_scheduler_the_burst_fails(tmp_path):
+    provider = FakeProvider(rps=20, tpm=1_000_000, latency=0.01, retry_delay=0)
+
+    with pytest.raises(QuotaExceeded):
+        asyncio.run(burst(FakeGemini(provider=provider), 25))
+
+
+def test_higher_priority_is_served_first(tmp_path, monkeypatch):
+    scheduler = fake_scheduler(tmp_path, monkeypatch, rps=20)
+    scheduler.acquire("fake")  # empties the request bucket: everyone below has to wait in line
+    served = []
+
+    def call(priority, name):
+        scheduler.acquire("fake", priority=priority)
+        served.append(name)
+
+    threads = [threading.Thread(target=call, args=(3, f"researcher-{i}")) for i in range(3)]
+    threads += [threading.Thread(target=call, args=(0, f"controller-{i}")) for i in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)  # enqueue in this order: researchers first
+    for thread in threads:
+        thread.join()
+
+    assert [name.split("-")[0] for name in served] == ["controller"] * 2 + ["researcher"] * 3
+
+
+def test_priority_comes_from_the_graph_node():
+    seen = {}
+
+    def node(name):
+        def run(state):
+            seen[name] = node_priority()
+            return {}
+        return run
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("controller", node("controller"))
+    graph.add_node("researcher", node("researcher"))
+    graph.set_entry_point("researcher")
+    graph.add_edge("researcher", "controller")
+    graph.add_edge("controller", END)
+    graph.compile().invoke({"messages": []})
+
+    assert seen["controller"] < seen["researcher"]
+
+
+def test_quota_errors_are_retried_and_counted(tmp_path, monkeypatch):
+    # limits above the quota: the provider answers some calls with 429, the retries get them through
+    scheduler = fake_scheduler(tmp_path, monkeypatch, rps=100, max_retries=8)
+    provider = FakeProvider(rps=5, tpm=1_000_000, latency=0.01, retry_delay=0)
+
+    results = asyncio.run(burst(ScheduledFakeGemini(provider=provider), 8))
+
+    assert len(results) == 8
+    counters = scheduler.stats()["providers"]["fake"]
+    assert provider.rejected > 0
+    assert counters["quota_errors"] == counters["retries"] == provider.rejected
+    assert counters["failures"] == 0
+    assert counters["calls"] == 8 + provider.rejected
+
+
+def test_retries_give_up_after_max_retries(tmp_path, monkeypatch):
+    scheduler = fake_scheduler(tmp_path, monkeypatch, rps=0, max_retries=2)
+    calls = []
+
+    def always_429():
+        calls.append(1)
+        raise QuotaExceeded("429 RESOURCE_EXHAUSTED")
+
+    with pytest.raises(QuotaExceeded):
+        scheduler.call("fake", always_429)
+
+    assert len(calls) == 3
+    counters = scheduler.stats()["providers"]["fake"]
+    assert counters["retries"] == 2 and counters["failures"] == 1
+
+
+def test_backoff_grows_with_jitter_and_honours_retry_after(tmp_path, monkeypatch):
+    scheduler = fake_scheduler(tmp_path, monkeypatch, rps=0, backoff_seconds=1, backoff_max_seconds=8,
+                               max_retries=10)
+    transient = ValueError("Error 503: the model is overloaded")
+    for attempt, ceiling in enumerate([1, 2, 4, 8, 8]):
+        delays = [scheduler._retry_delay("fake", 0, transient, attempt) for _ in range(20)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+
+    # a quota error pauses the provider for every caller instead of sleeping in one
+    assert scheduler._retry_delay("fake", 0, QuotaExceeded("429, retryDelay 30s"), 0) == 0
+    assert scheduler.buckets.take("fake", (10, 0), 0) >= 29
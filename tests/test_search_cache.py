@@ -0,0 +1,57 @@
+# tests/test_search_cache.py
+import asyncio
+
+import pytest
+from langchain_core.tools import tool
+
+from search_cache import SearchCache, cached_search_tool
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SearchCache(path=str(tmp_path / "search.sqlite"), mode="online")
+
+
+def fake_search(responses):
+    """A search tool that answers like TavilySearch, one response per call."""
+    calls = []
+
+    @tool
+    def tavily_search(query: str) -> dict:
+        """web search"""
+        calls.append(query)
+        return responses.pop(0)
+
+    return tavily_search, calls
+
+
+RESULTS = {"results": [{"title": "t", "url": "https://example.org", "content": "c"}]}
+
+
+def test_results_are_cached(cache):
+    search, calls = fake_search([RESULTS])
+    cached = cached_search_tool(search, lambda: cache)
+    assert cached.invoke({"query": "q"}) == RESULTS
+    assert cached.invoke({"query": "q"}) == RESULTS
+    assert calls == ["q"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_error_results_are_not_cached(cache):
+    search, calls = fake_search([{"error": "429 Too Many Requests"}, RESULTS])
+    cached = cached_search_tool(search, lambda: cache)
+    assert cached.invoke({"query": "q"}) == {"error": "429 Too Many Requests"}
+    assert cached.invoke({"query": "q"}) == RESULTS
+    assert cached.invoke({"query": "q"}) == RESULTS
+    assert calls == ["q", "q"]
+
+
+def test_error_results_are_not_cached_async(cache):
+    search, calls = fake_search([{"error": "No search results found"}, RESULTS])
+    cached = cached_search_tool(search, lambda: cache)
+
+    async def run():
+        return [await cached.ainvoke({"query": "q"}) for _ in range(3)]
+
+    assert asyncio.run(run()) == [{"error": "No search results found"}, RESULTS, RESULTS]
+    assert calls == ["q", "q"]
@@ -7,48 +7,48 @@ load_dotenv()
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_classic.chains import RetrievalQA
 from langchain_core.prompts import PromptTemplate
-from langchain_community.retrievers import BM25Retriever
 from langchain_classic.retrievers import EnsembleRetriever,MultiQueryRetriever
 
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-import pickle
 from langchain_core.tools import Tool
 import os
 import sys
+import asyncio
+from typing import ClassVar
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+from resources import registry
+from bm25_index import load_bm25_retriever
+from dense_index import DenseRetriever
+from chunk_store import load_chunks
+from embeddings import CachedEmbeddings
+from answer_cache import SemanticAnswerCache
+from search_cache import SearchCache, cached_search_tool
+from llm_cache import get_llm_cache
+from parallel_multiquery import ParallelMultiQueryRetriever
+from rate_limit import RateLimitedChatModel, rate_limited_tool
+from research_memory import ResearchMemory
+from rerank import RERANK_ENABLED, RERANK_MODEL, CrossEncoderScorer, Reranker, RerankingRetriever
 
+# Nothing heavy is built while importing this file anymore. Every resource below is registered
+# as a factory and created on first use (or eagerly through registry.warmup()).
+# The old module level names (tools.vector_db, tools.bm25_retriver, ...) still work, see __getattr__.
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 
 file_path = os.path.join(base_dir, 'all_chunk_data.pkl')
+chunk_store_path = os.path.join(base_dir, "chunk_store")  # built by `python chunk_store.py` / ingestion
 db_path = os.path.join(base_dir, "rag_db")
+bm25_index_path = os.path.join(base_dir, "bm25_index")  # built by `python bm25_index.py`
+dense_index_path = os.path.join(base_dir, "dense_index")  # built by `python dense_index.py`
 
-all_chunk = []
-
-try:
-    with open(file_path, 'rb') as file:
-        all_chunk = pickle.load(file)
-    print(f"✅ File uploaded successfully: {file_path}")
-except FileNotFoundError:
-    
-    error_msg = f"❌ CRITICAL ERROR: Pickle file not found! Searched location: {file_path}"
-    print(error_msg)
-    raise FileNotFoundError(error_msg)
-    
-
+# chroma: Chroma HNSW over rag_db; numpy: brute-force search over the memory-mapped dense_index
+DENSE_BACKEND = os.getenv("DENSE_BACKEND", "chroma")
 
 DB_path = "rag_db"
-vector_db = Chroma(
-    persist_directory = DB_path,
-    embedding_function = embedding_model
-)
 
 prompt_template_string = """
 CONTEXT:
@@ -69,42 +69,192 @@ custom_prompt = PromptTemplate(
     input_variables = ['context', 'question']
 )
 
-bm25_retriver = BM25Retriever.from_documents(
-    documents=all_chunk
-)
 
-bm25_retriver.k = 7
+class RateLimitedGemini(RateLimitedChatModel, ChatGoogleGenerativeAI):
+    """ChatGoogleGenerativeAI whose calls wait for the shared Gemini limits (rate_limit.py)."""
 
-similarity_retriever = vector_db.as_retriever(
-    search_type = "similarity",
-    search_kwargs = {'k':7}
-)
+    rate_limit_provider: ClassVar[str] = "gemini"
 
-ensemble_retriver = EnsembleRetriever(
-    retrievers = [bm25_retriver,similarity_retriever],
-    weights = [0.3,0.7]
-)
-multiquery_esemble_retriever = MultiQueryRetriever.from_llm(
-    llm = llm, 
-    retriever = ensemble_retriver
-)
 
+def _build_llm():
+    return RateLimitedGemini(model="gemini-2.5-flash", temperature=0, cache=get_llm_cache())
+
+def _build_embedding_model():
+    # HuggingFaceEmbeddings("all-MiniLM-L6-v2") behind a memory + disk cache, so repeated
+    # queries (and MultiQuery variants) are not re-encoded. Counters: embedding_model.stats()
+    return CachedEmbeddings()
+
+def _load_all_chunk():
+    # The memory-mapped chunk store is list-like: all_chunk[i] builds the Document lazily,
+    # so the corpus is not deserialized into every worker. The pickle is only a fallback.
+    try:
+        chunks = load_chunks(chunk_store_path, file_path)
+        print(f"✅ Chunks loaded successfully: {type(chunks).__name__} with {len(chunks)} chunks")
+        return chunks
+    except FileNotFoundError:
+        
+        error_msg = f"❌ CRITICAL ERROR: Neither the chunk store nor the pickle file was found! Searched locations: {chunk_store_path}, {file_path}"
+        print(error_msg)
+        raise FileNotFoundError(error_msg)
+
+def _build_vector_db():
+    return Chroma(
+        persist_directory = DB_path,
+        embedding_function = registry.get('embedding_model')
+    )
+
+def _build_bm25_retriver():
+    # Prefer the ingestion-time index (memory-mapped, shared between workers); a missing or stale
+    # index falls back to BM25Retriever.from_documents.
+    return load_bm25_retriever(bm25_index_path, registry.get('all_chunk'), k=7)
+
+def _build_similarity_retriever():
+    if DENSE_BACKEND == "numpy":
+        if os.path.exists(os.path.join(dense_index_path, 'meta.json')):
+            all_chunk = registry.get('all_chunk')
+            dense_retriever = DenseRetriever.load(
+                dense_index_path, docs=all_chunk, embeddings=registry.get('embedding_model'), k=7)
+            if dense_retriever.index.corpus_version == getattr(all_chunk, 'corpus_version', None):
+                return dense_retriever
+            print(f"⚠️ Dense index at {dense_index_path} is stale, using Chroma.")
+        else:
+            print(f"⚠️ DENSE_BACKEND=numpy but there is no index at {dense_index_path} (run `python dense_index.py`), using Chroma.")
+
+    return registry.get('vector_db').as_retriever(
+        search_type = "similarity",
+        search_kwargs = {'k':7}
+    )
+
+def _build_ensemble_retriver():
+    return EnsembleRetriever(
+        retrievers = [registry.get('bm25_retriver'), registry.get('similarity_retriever')],
+        weights = [0.3,0.7]
+    )
+
+# MULTIQUERY_PARALLEL=0 goes back to langchain's MultiQueryRetriever (one ensemble run per variant, in turn)
+MULTIQUERY_PARALLEL = os.getenv("MULTIQUERY_PARALLEL", "1") != "0"
+
+def _build_multiquery_esemble_retriever():
+    # same variants, same documents: all variants are embedded in one batch and their BM25 / Chroma
+    # lookups run concurrently (see parallel_multiquery.py)
+    retriever_cls = ParallelMultiQueryRetriever if MULTIQUERY_PARALLEL else MultiQueryRetriever
+    return retriever_cls.from_llm(
+        llm = registry.get('llm'), 
+        retriever = registry.get('ensemble_retriver')
+    )
+
+def _build_reranker():
+    return Reranker(
+        embeddings = registry.get('embedding_model'),
+        scorer = CrossEncoderScorer(RERANK_MODEL) if RERANK_MODEL else None
+    )
+
+def _build_rag_chain():
+    # the stuff prompt only gets the reranked, token-budgeted selection (see rerank.py)
+    retriever = registry.get('multiquery_esemble_retriever')
+    if RERANK_ENABLED:
+        retriever = RerankingRetriever(base = retriever, reranker = registry.get('reranker'))
+    return RetrievalQA.from_chain_type(
+        llm = registry.get('llm'),
+        chain_type = 'stuff',
+        retriever = retriever,
+        chain_type_kwargs = {"prompt": custom_prompt},
+        return_source_documents = True
+    )
+
+def corpus_version():
+    """Content hash of the chunk corpus; changes whenever ingestion adds/removes/changes chunks."""
+    all_chunk = registry.get('all_chunk')
+    version = getattr(all_chunk, 'corpus_version', None)
+    if version is None:  # old pickle: fall back to the file itself
+        stat = os.stat(file_path)
+        version = f"pickle-{stat.st_size}-{int(stat.st_mtime)}"
+    return version
+
+def _build_answer_cache():
+    return SemanticAnswerCache(
+        embeddings = registry.get('embedding_model'),
+        corpus_version = corpus_version()
+    )
+
+def _build_research_memory():
+    return ResearchMemory(embeddings = registry.get('embedding_model'))
+
+# registration order = warmup order
+registry.register('llm', _build_llm)
+registry.register('embedding_model', _build_embedding_model)
+registry.register('all_chunk', _load_all_chunk)
+registry.register('vector_db', _build_vector_db)
+registry.register('bm25_retriver', _build_bm25_retriver)
+registry.register('similarity_retriever', _build_similarity_retriever)
+registry.register('ensemble_retriver', _build_ensemble_retriver)
+registry.register('multiquery_esemble_retriever', _build_multiquery_esemble_retriever)
+registry.register('reranker', _build_reranker)
+registry.register('rag_chain', _build_rag_chain)
+registry.register('answer_cache', _build_answer_cache)
+registry.register('search_cache', SearchCache)
+registry.register('research_memory', _build_research_memory)
+
+
+def __getattr__(name):
+    # lazy module attributes: `from tools import vector_db` builds it on first access.
+    if name in registry._factories:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+
+def rag_search(question):
+    """Runs the RAG chain. The chain (and everything under it) is built on the first call.
+
+    Near-identical questions are answered from the semantic answer cache (see answer_cache.py)
+    without any LLM call or retrieval.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return registry.get('rag_chain').invoke(question)
+
+    answer_cache = registry.get('answer_cache')
+    cached = answer_cache.lookup(question)
+    if cached is not None:
+        print("--- DocumentSearch: answer cache hit ---")
+        return cached
+
+    result = registry.get('rag_chain').invoke(question)
+    answer_cache.store(question, result)
+    return result
+
+async def arag_search(question):
+    """Async version of rag_search: the chain runs with ainvoke, the blocking parts
+    (first-time resource loading, the SQLite answer cache) run in worker threads."""
+    rag_chain = await asyncio.to_thread(registry.get, 'rag_chain')
+    if not ANSWER_CACHE_ENABLED:
+        return await rag_chain.ainvoke(question)
+
+    answer_cache = await asyncio.to_thread(registry.get, 'answer_cache')
+    cached = await asyncio.to_thread(answer_cache.lookup, question)
+    if cached is not None:
+        print("--- DocumentSearch: answer cache hit ---")
+        return cached
+
+    result = await rag_chain.ainvoke(question)
+    await asyncio.to_thread(answer_cache.store, question, result)
+    return result
 
-rag_chain = RetrievalQA.from_chain_type(
-    llm = llm,
-    chain_type = 'stuff',
-    retriever = multiquery_esemble_retriever,
-    chain_type_kwargs = {"prompt": custom_prompt},
-    return_source_documents = True
-)
 
 rag_tool = Tool(
     name = "DocumentSearch",
-    func = rag_chain.invoke,
+    func = rag_search,
+    coroutine = arag_search,
     description = "Use this tool to answer questions about Large Language Model (LLM) agents. It searches a collection of academic papers on topics like tool use, RAG, planning, memory, and feedback learning."
 )
 
 
-search_runnable = TavilySearch(max_results = 5)
+# Tavily calls wait for the shared Tavily limit and are retried on quota errors (rate_limit.py)
+search_runnable = rate_limited_tool(TavilySearch(max_results = 5), "tavily")
+
+# Same name/arguments as TavilySearch, but results are cached on disk (with a TTL), identical
+# concurrent queries share one request, and SEARCH_CACHE_MODE=offline replays without network.
+search_tool = cached_search_tool(search_runnable, lambda: registry.get('search_cache'))
 
-tools = [search_runnable, rag_tool]
\ No newline at end of file
+tools = [search_tool, rag_tool]
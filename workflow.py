@@ -1,7 +1,10 @@
+import threading
+
 from langgraph.graph import StateGraph, END, START
 from typing import TypedDict,List,Annotated, Sequence
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
+from langchain_core.runnables import RunnableLambda
 from tools import tools
 
 class HomeworkState(TypedDict):
@@ -12,21 +15,31 @@ class HomeworkState(TypedDict):
     messages : Annotated[Sequence[BaseMessage],add_messages]
     document_path: str
     rewriter_counter: int
+    run_id: str
+    claim_verdicts: dict # paragraph key -> {'ok', 'mistakes'} (controller cache across rewrites)
+    claim_mistakes: List[dict] # the current draft's mistakes, per paragraph / section (None: whole paper)
+    research_trace: List[dict] # one entry per research passage: source, tokens, relevance, status (kept / duplicate_of / over_budget)
+    writer_stats: List[dict] # one entry per writer round: mode, output tokens, seconds (and savings of patch rounds)
+    research_turns: List[dict] # one entry per researcher turn: prompt tokens (with / without digests), output tokens, tool calls
+    prior_research: List[dict] # passages of earlier runs on similar topics (research_memory.py), looked up on the first turn
 
 from nodes import Researcher_agent, compile_research_node, writer_agent, controller_agent, formatter, update_counter_node, tool_node,should_contunie,decide_to_rewrite
+from nodes import Researcher_agent_async, writer_agent_async, controller_agent_async, formatter_async
 
 
 workflow = StateGraph(HomeworkState)
 
 
 
-workflow.add_node('researcher', Researcher_agent)
+# Nodes that call the LLM / pandoc have a sync and an async implementation:
+# app.invoke/app.stream (notebook) use the sync one, app.ainvoke/app.astream (API) the async one.
+workflow.add_node('researcher', RunnableLambda(Researcher_agent, afunc=Researcher_agent_async))
 workflow.add_node('compile_research',compile_research_node)
 workflow.add_node('run_tools', tool_node)
-workflow.add_node('writer', writer_agent)
+workflow.add_node('writer', RunnableLambda(writer_agent, afunc=writer_agent_async))
 workflow.add_node("update_counter", update_counter_node)
-workflow.add_node('controller',controller_agent)
-workflow.add_node('formatter',formatter)
+workflow.add_node('controller',RunnableLambda(controller_agent, afunc=controller_agent_async))
+workflow.add_node('formatter',RunnableLambda(formatter, afunc=formatter_async))
 
 workflow.add_edge(START,'researcher')
 
@@ -53,4 +66,25 @@ workflow.add_conditional_edges('controller',
                               )
 
 workflow.add_edge('formatter', END)
-app = workflow.compile()
\ No newline at end of file
+app = workflow.compile()
+
+# The same graph with per-node checkpoints in checkpoints.sqlite (run it with
+# CheckpointStore.config(run_id)), used by the API and the job workers so failed runs can be resumed.
+# Compiled on first use: importing workflow must not open (or create) the checkpoint file.
+_durable_app = None
+_durable_app_lock = threading.Lock()
+
+def get_durable_app():
+    global _durable_app
+    with _durable_app_lock:
+        if _durable_app is None:
+            from checkpoints import get_checkpoint_store
+            _durable_app = workflow.compile(checkpointer=get_checkpoint_store().saver)
+    return _durable_app
+
+
+def __getattr__(name):
+    # `from workflow import durable_app` still works and compiles it on first access.
+    if name == "durable_app":
+        return get_durable_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")